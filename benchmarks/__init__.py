@@ -0,0 +1,6 @@
+"""
+Load-testing benchmarks for the polls views.
+
+Run them with `python manage.py benchmark`; see
+polls/management/commands/benchmark.py for the options.
+"""
@@ -0,0 +1,117 @@
+"""
+Synthetic polls datasets for the benchmarks.
+
+The rows have the same shape as the data/*.json fixtures
+(auth.user, polls.question, polls.choice, polls.vote) and are written
+with bulk_create in batches, so millions of votes fit in memory.
+"""
+
+import datetime
+import json
+import random
+from io import StringIO
+from itertools import islice
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.utils import timezone
+
+from polls.models import Question, Choice, Vote
+
+BATCH_SIZE = 10000
+PASSWORD = "benchmark"
+
+
+def batched(iterable, size=BATCH_SIZE):
+    """Yield lists of at most size items."""
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def generate(questions=100, choices=4, users=1000, votes=10000, seed=0):
+    """
+    Create a dataset and return a summary of what was created.
+    Every user shares the password PASSWORD (hashed once) and votes
+    at most once per question, so votes is capped at users * questions.
+    """
+    rng = random.Random(seed)
+    now = timezone.now()
+    password = make_password(PASSWORD)
+    for batch in batched(User(username=f"bench{n}", password=password)
+                         for n in range(users)):
+        User.objects.bulk_create(batch)
+    for batch in batched(Question(question_text=f"Benchmark question {n}",
+                                  pub_date=now - datetime.timedelta(minutes=n))
+                         for n in range(questions)):
+        Question.objects.bulk_create(batch)
+
+    question_ids = list(Question.objects.order_by("id").values_list("id", flat=True))
+    for batch in batched(Choice(question_id=question_id, choice_text=f"Choice {n}")
+                         for question_id in question_ids for n in range(choices)):
+        Choice.objects.bulk_create(batch)
+
+    user_ids = list(User.objects.filter(username__startswith="bench")
+                    .order_by("id").values_list("id", flat=True))
+    choice_ids = {}
+    for choice_id, question_id in Choice.objects.values_list("id", "question_id"):
+        choice_ids.setdefault(question_id, []).append(choice_id)
+    votes = min(votes, len(user_ids) * len(question_ids))
+
+    def vote_rows():
+        # vote n is cast by user n % users on question n // users,
+        # so no (user, question) pair repeats
+        for n in range(votes):
+            question_id = question_ids[n // len(user_ids)]
+            yield Vote(user_id=user_ids[n % len(user_ids)], question_id=question_id,
+                       choice_id=rng.choice(choice_ids[question_id]))
+
+    for batch in batched(vote_rows()):
+        Vote.objects.bulk_create(batch)
+    call_command("reconcile_votes", stdout=StringIO())
+    return {"questions": len(question_ids), "choices": len(question_ids) * choices,
+            "users": len(user_ids), "votes": votes, "seed": seed}
+
+
+def dump_fixtures(directory):
+    """
+    Write the current polls data as loaddata fixtures
+    (polls.json, votes.json, users.json) into directory, streaming rows.
+    """
+    def write(path, rows):
+        with open(path, "w", encoding="utf-8") as fixture:
+            fixture.write("[\n")
+            for n, row in enumerate(rows):
+                fixture.write((",\n" if n else "") + json.dumps(row))
+            fixture.write("\n]\n")
+
+    def polls_rows():
+        for question in Question.objects.order_by("id").iterator(chunk_size=BATCH_SIZE):
+            yield {"model": "polls.question", "pk": question.pk,
+                   "fields": {"question_text": question.question_text,
+                              "pub_date": question.pub_date.isoformat(),
+                              "end_date": question.end_date and question.end_date.isoformat()}}
+        for choice in Choice.objects.order_by("id").iterator(chunk_size=BATCH_SIZE):
+            yield {"model": "polls.choice", "pk": choice.pk,
+                   "fields": {"question": choice.question_id,
+                              "choice_text": choice.choice_text}}
+
+    def vote_rows():
+        for pk, choice_id, question_id, user_id in (
+                Vote.objects.order_by("id")
+                .values_list("id", "choice_id", "question_id", "user_id")
+                .iterator(chunk_size=BATCH_SIZE)):
+            yield {"model": "polls.vote", "pk": pk,
+                   "fields": {"choice": choice_id, "question": question_id, "user": user_id}}
+
+    def user_rows():
+        for user in User.objects.order_by("id").iterator(chunk_size=BATCH_SIZE):
+            yield {"model": "auth.user", "pk": user.pk,
+                   "fields": {"password": user.password, "username": user.username,
+                              "is_staff": user.is_staff, "is_active": user.is_active,
+                              "date_joined": user.date_joined.isoformat()}}
+
+    write(f"{directory}/polls.json", polls_rows())
+    write(f"{directory}/votes.json", vote_rows())
+    write(f"{directory}/users.json", user_rows())
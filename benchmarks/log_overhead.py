@@ -0,0 +1,97 @@
+"""
+Microbenchmark of what logging a vote costs the request thread.
+
+"before" is the previous setup: an f-string message written by a
+logging.FileHandler with the verbose format. "after" is log_event() with
+a QueuedFileHandler and JSON lines. Both write to a file whose write()
+sleeps, standing in for a slow or contended disk.
+"""
+
+import logging
+import os
+import tempfile
+import time
+
+from django.http import HttpRequest
+
+from polls.log import JsonLineFormatter, QueuedFileHandler, log_event
+
+from .runner import percentile
+
+VERBOSE = "{name} {levelname} {asctime} {module} {process:d} {thread:d} {message}"
+
+
+class SlowStream:
+    """File wrapper whose write() takes at least delay seconds."""
+
+    def __init__(self, stream, delay):
+        self.stream = stream
+        self.delay = delay
+
+    def write(self, data):
+        time.sleep(self.delay)
+        return self.stream.write(data)
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+
+def before(logger, request, user_id, question_id, choice_id):
+    """Log a vote like views.vote did: formatted eagerly."""
+    logger.info(f"User {user_id} voted for choice id:{choice_id} in polls {question_id}"
+                f" from IP address {request.META['REMOTE_ADDR']}")
+
+
+def after(logger, request, user_id, question_id, choice_id):
+    """Log a vote like views.vote does: a lazily formatted event."""
+    log_event(logger, logging.INFO, "vote", "User %s voted for choice id:%s in polls %s",
+              user_id, choice_id, question_id, request=request, user=user_id,
+              question=question_id, choice=choice_id)
+
+
+def measure(setup, records, delay):
+    """
+    Log `records` votes with setup "before" or "after" and return the
+    latency of the logging calls and the time to drain what is queued.
+    """
+    directory = tempfile.TemporaryDirectory()
+    path = os.path.join(directory.name, "polls.log")
+    if setup == "before":
+        handler = logging.FileHandler(path, delay=True)
+        handler.setFormatter(logging.Formatter(VERBOSE, style="{"))
+        handler.stream = SlowStream(open(path, "a", encoding="utf-8"), delay)
+        log = before
+    else:
+        handler = QueuedFileHandler(path)
+        handler.setFormatter(JsonLineFormatter())
+        handler.target.stream = SlowStream(open(path, "a", encoding="utf-8"), delay)
+        log = after
+    logger = logging.getLogger(f"benchmarks.log_overhead.{setup}")
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    logger.addHandler(handler)
+    request = HttpRequest()
+    request.META["REMOTE_ADDR"] = "127.0.0.1"
+    latencies = []
+    start = time.perf_counter()
+    try:
+        for n in range(records):
+            call_start = time.perf_counter()
+            log(logger, request, n % 1000, n % 100, n % 400)
+            latencies.append(time.perf_counter() - call_start)
+        logged = time.perf_counter() - start
+        drain_start = time.perf_counter()
+        handler.close()
+        drained = time.perf_counter() - drain_start
+    finally:
+        logger.removeHandler(handler)
+        directory.cleanup()
+    ordered = sorted(latencies)
+    return {
+        "records": records,
+        "seconds": round(logged, 4),
+        "mean_us": round(sum(ordered) / len(ordered) * 1e6, 1) if ordered else 0.0,
+        "p50_us": round(percentile(ordered, 0.50) * 1e6, 1),
+        "p99_us": round(percentile(ordered, 0.99) * 1e6, 1),
+        "drain_seconds": round(drained, 4),
+    }
@@ -0,0 +1,51 @@
+"""
+Simulated credential attacks on the login, with and without throttling.
+
+"brute_force" guesses the password of one user from ever-changing IPs;
+"stuffing" tries a different username with every guess from one IP.
+Every guess runs django.contrib.auth.authenticate(); the report gives the
+CPU time the process spent, which is what the password hashing costs.
+"""
+
+import time
+
+from django.conf import settings
+from django.contrib.auth import authenticate
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.test import RequestFactory, override_settings
+
+ATTACKS = ("brute_force", "stuffing")
+
+
+def guesses(attack, attempts, username):
+    """(username, ip) of every guess of an attack."""
+    for n in range(attempts):
+        if attack == "brute_force":
+            yield username, f"10.{n // 65536 % 256}.{n // 256 % 256}.{n % 256}"
+        else:
+            yield f"{username}{n}", "10.0.0.1"
+
+
+def run(attack, attempts, throttle):
+    """Make `attempts` wrong guesses and return the CPU they cost."""
+    user = User.objects.filter(username__startswith="bench").order_by("id").first()
+    factory = RequestFactory()
+    caches[settings.POLLS_LOGIN_THROTTLE_CACHE_ALIAS].clear()
+    refused = 0
+    with override_settings(POLLS_LOGIN_THROTTLE=throttle):
+        cpu_start = time.process_time()
+        start = time.perf_counter()
+        for username, ip in guesses(attack, attempts, user.username):
+            request = factory.post("/accounts/login/", REMOTE_ADDR=ip)
+            authenticate(request, username=username, password="wrong-password")
+            refused += getattr(request, "polls_login_throttled", False)
+        cpu = time.process_time() - cpu_start
+        elapsed = time.perf_counter() - start
+    return {
+        "attempts": attempts,
+        "refused_unhashed": refused,
+        "cpu_seconds": round(cpu, 4),
+        "cpu_ms_per_attempt": round(cpu / attempts * 1000, 3) if attempts else 0.0,
+        "seconds": round(elapsed, 4),
+    }
@@ -0,0 +1,159 @@
+"""
+Drive benchmark scenarios with concurrent workers and report
+latency percentiles, throughput and queries per request.
+"""
+
+import asyncio
+import random
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+
+from django.contrib.auth.models import User
+from django.db import connections
+from django.test import Client, override_settings
+
+from polls.cache import results_cache
+from polls.instrumentation import QueryTimer
+from polls.models import Choice
+
+from .scenarios import SCENARIOS
+
+
+class Worker:
+    """One simulated client: a logged-in test client and its own random source."""
+
+    def __init__(self, user, choices, seed, client_class=Client):
+        self.client = client_class()
+        self.client.force_login(user)
+        self.user = user
+        self.choices = choices
+        self.question_ids = list(choices)
+        self.rng = random.Random(seed)
+
+    def random_question(self):
+        """Return the id of a random question."""
+        return self.rng.choice(self.question_ids)
+
+    def random_choice(self, question_id):
+        """Return the id of a random choice of a question."""
+        return self.rng.choice(self.choices[question_id])
+
+
+def make_workers(count, seed=0, client_class=Client):
+    """
+    Create count workers logged in as different benchmark users.
+    With AsyncClient the requests go through the ASGI handler.
+    """
+    choices = {}
+    for choice_id, question_id in Choice.objects.values_list("id", "question_id"):
+        choices.setdefault(question_id, []).append(choice_id)
+    users = User.objects.filter(username__startswith="bench").order_by("id")[:count]
+    return [Worker(user, choices, seed + n, client_class) for n, user in enumerate(users)]
+
+
+def percentile(ordered, fraction):
+    """Return the value at fraction (0..1) of an ordered list (nearest rank)."""
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def summarize(latencies, queries, errors, elapsed):
+    """Return the report of one scenario run; latencies are in seconds."""
+    ordered = sorted(latencies)
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "error_rate": round(errors / len(latencies), 4) if latencies else 0.0,
+        "seconds": round(elapsed, 4),
+        "requests_per_second": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "mean_ms": round(statistics.fmean(ordered) * 1000, 3) if ordered else 0.0,
+        "p50_ms": round(percentile(ordered, 0.50) * 1000, 3),
+        "p95_ms": round(percentile(ordered, 0.95) * 1000, 3),
+        "p99_ms": round(percentile(ordered, 0.99) * 1000, 3),
+        "queries_per_request": round(sum(queries) / len(queries), 2) if queries else None,
+    }
+
+
+def run(name, workers, requests, reconnect=False):
+    """
+    Make `requests` requests of scenario `name` spread over the workers,
+    one thread per worker, and return the summary. With reconnect, the
+    database connection is closed after every request like with
+    CONN_MAX_AGE = 0 (or handed back to the pool, if one is configured),
+    so each request pays for getting a connection.
+    """
+    function = SCENARIOS[name]
+    results_cache.clear()
+    share, extra = divmod(requests, len(workers))
+
+    def work(worker, count):
+        latencies, queries, errors = [], [], 0
+        try:
+            for _ in range(count):
+                timer = QueryTimer()
+                start = time.perf_counter()
+                with ExitStack() as stack:
+                    for connection in connections.all():
+                        stack.enter_context(connection.execute_wrapper(timer))
+                    try:
+                        response = function(worker)
+                        errors += response.status_code >= 400
+                    except Exception:  # a failed request still counts
+                        errors += 1
+                latencies.append(time.perf_counter() - start)
+                queries.append(timer.queries)
+                if reconnect:
+                    connections.close_all()
+        finally:
+            if len(workers) > 1:
+                connections.close_all()
+        return latencies, queries, errors
+
+    counts = [share + (n < extra) for n in range(len(workers))]
+    start = time.perf_counter()
+    if len(workers) == 1:
+        outcomes = [work(workers[0], counts[0])]
+    else:
+        with ThreadPoolExecutor(max_workers=len(workers)) as pool:
+            outcomes = list(pool.map(work, workers, counts))
+    elapsed = time.perf_counter() - start
+    return summarize([latency for outcome in outcomes for latency in outcome[0]],
+                     [count for outcome in outcomes for count in outcome[1]],
+                     sum(outcome[2] for outcome in outcomes), elapsed)
+
+
+def run_async(name, workers, requests):
+    """
+    Like run(), but every worker is an AsyncClient coroutine on one event
+    loop, served by the async views (the ASGI profile URLconf).
+    Queries run in the async ORM's worker thread, so they are not counted.
+    """
+    function = SCENARIOS[name]
+    results_cache.clear()
+    share, extra = divmod(requests, len(workers))
+
+    async def work(worker, count):
+        latencies, errors = [], 0
+        for _ in range(count):
+            start = time.perf_counter()
+            try:
+                response = await function(worker)
+                errors += response.status_code >= 400
+            except Exception:  # a failed request still counts
+                errors += 1
+            latencies.append(time.perf_counter() - start)
+        return latencies, errors
+
+    async def main():
+        return await asyncio.gather(*[work(worker, share + (n < extra))
+                                      for n, worker in enumerate(workers)])
+
+    with override_settings(ROOT_URLCONF="mysite.async_urls"):
+        start = time.perf_counter()
+        outcomes = asyncio.run(main())
+        elapsed = time.perf_counter() - start
+    return summarize([latency for outcome in outcomes for latency in outcome[0]], [],
+                     sum(outcome[1] for outcome in outcomes), elapsed)
@@ -0,0 +1,75 @@
+"""
+Request scenarios for the benchmarks.
+
+A scenario is a function taking a Worker and making one request
+with its client; it returns the response, or with an AsyncClient the
+awaitable response.
+"""
+
+from django.test import AsyncClient
+from django.urls import reverse
+
+SCENARIOS = {}
+
+
+def scenario(name):
+    """Register a scenario function under a name."""
+    def register(function):
+        SCENARIOS[name] = function
+        return function
+    return register
+
+
+@scenario("index")
+def index(worker):
+    """First page of the poll index."""
+    return worker.client.get(reverse("polls:index"))
+
+
+@scenario("detail")
+def detail(worker):
+    """Voting form of a random question."""
+    return worker.client.get(reverse("polls:detail", args=(worker.random_question(),)))
+
+
+@scenario("results")
+def results(worker):
+    """Results page of a random question."""
+    return worker.client.get(reverse("polls:results", args=(worker.random_question(),)))
+
+
+@scenario("results_json")
+def results_json(worker):
+    """JSON results of a random question."""
+    return worker.client.get(reverse("polls:results_json",
+                                     args=(worker.random_question(),)))
+
+
+@scenario("vote")
+def vote(worker):
+    """Vote (or change vote) for a random choice of a random question."""
+    question_id = worker.random_question()
+    return worker.client.post(reverse("polls:vote", args=(question_id,)),
+                              {"choice": worker.random_choice(question_id)})
+
+
+@scenario("vote_flow")
+def vote_flow(worker):
+    """
+    Voting form, vote and the results page it redirects to, like a voter
+    (three requests, so its queries per request are per flow).
+    """
+    question_id = worker.random_question()
+    detail_url = reverse("polls:detail", args=(question_id,))
+    vote_url = reverse("polls:vote", args=(question_id,))
+    data = {"choice": worker.random_choice(question_id)}
+    if isinstance(worker.client, AsyncClient):
+        return _async_vote_flow(worker.client, detail_url, vote_url, data)
+    worker.client.get(detail_url)
+    return worker.client.post(vote_url, data, follow=True)
+
+
+async def _async_vote_flow(client, detail_url, vote_url, data):
+    """vote_flow with an AsyncClient, awaiting the form before voting."""
+    await client.get(detail_url)
+    return await client.post(vote_url, data, follow=True)
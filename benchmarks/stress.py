@@ -0,0 +1,116 @@
+"""
+Multi-process vote stress test for the SQLite profiles.
+
+Every voter is a forked process with its own database connection and a
+logged-in test client posting votes through the vote view as fast as it
+can, so the writers really contend for the lock of the SQLite file
+(threads in one process would mostly queue on the GIL instead).
+"""
+
+import logging
+import multiprocessing
+import random
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import OperationalError, connections
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from polls.models import Choice
+
+from .runner import percentile
+
+PROFILES = ("default", "production")
+
+
+class RetryCounter(logging.Handler):
+    """Count the retries polls.voting logs."""
+
+    def __init__(self):
+        super().__init__(logging.DEBUG)
+        self.count = 0
+
+    def emit(self, record):
+        self.count += 1
+
+
+def vote_process(session_key, choices, votes, seed, start_at):
+    """
+    Post votes from one process, starting at start_at (a time.time()),
+    and return its latencies, lock errors, other errors and retries.
+    """
+    client = Client()
+    client.cookies[settings.SESSION_COOKIE_NAME] = session_key
+    retries = RetryCounter()
+    voting_logger = logging.getLogger("polls.voting")
+    voting_logger.addHandler(retries)
+    voting_logger.setLevel(logging.DEBUG)
+    rng = random.Random(seed)
+    question_ids = list(choices)
+    latencies, lock_errors, errors = [], 0, 0
+    time.sleep(max(0.0, start_at - time.time()))
+    for _ in range(votes):
+        question_id = rng.choice(question_ids)
+        start = time.perf_counter()
+        try:
+            response = client.post(reverse("polls:vote", args=(question_id,)),
+                                   {"choice": rng.choice(choices[question_id])})
+            errors += response.status_code != 302
+        except OperationalError as error:
+            if "locked" not in str(error):
+                raise
+            lock_errors += 1
+        latencies.append(time.perf_counter() - start)
+    connections.close_all()
+    return latencies, lock_errors, errors, retries.count, time.time()
+
+
+def run(profile, processes, votes, seed=0):
+    """
+    Run `processes` voters casting `votes` votes each against the current
+    (file) database with the SQLite options of a profile, and return a
+    summary with the lock errors and the throughput.
+    "default" is plain SQLite with no retries; "production" applies
+    settings.SQLITE_PRODUCTION_OPTIONS and POLLS_VOTE_RETRIES.
+    """
+    connection = connections["default"]
+    connection.close()
+    production = profile == "production"
+    connection.settings_dict["OPTIONS"] = (dict(settings.SQLITE_PRODUCTION_OPTIONS)
+                                           if production else {})
+    with connection.cursor() as cursor:
+        # the journal mode is stored in the file, so set it either way
+        cursor.execute(f"PRAGMA journal_mode={'WAL' if production else 'DELETE'}")
+    choices = {}
+    for choice_id, question_id in Choice.objects.values_list("id", "question_id"):
+        choices.setdefault(question_id, []).append(choice_id)
+    users = list(User.objects.filter(username__startswith="bench").order_by("id")[:processes])
+    sessions = []
+    for user in users:
+        client = Client()
+        client.force_login(user)
+        sessions.append(client.session.session_key)
+    # the voters must not share the parent's connection
+    connections.close_all()
+    retries = settings.POLLS_VOTE_RETRIES if production else 0
+    start_at = time.time() + 0.5
+    with override_settings(POLLS_VOTE_RETRIES=retries), \
+            multiprocessing.get_context("fork").Pool(len(sessions)) as pool:
+        outcomes = pool.starmap(vote_process, [(session, choices, votes, seed + n, start_at)
+                                               for n, session in enumerate(sessions)])
+    elapsed = max(outcome[4] for outcome in outcomes) - start_at
+    ordered = sorted(latency for outcome in outcomes for latency in outcome[0])
+    return {
+        "processes": len(sessions),
+        "votes": len(ordered),
+        "lock_errors": sum(outcome[1] for outcome in outcomes),
+        "errors": sum(outcome[2] for outcome in outcomes),
+        "retries": sum(outcome[3] for outcome in outcomes),
+        "seconds": round(elapsed, 4),
+        "votes_per_second": round(len(ordered) / elapsed, 2) if elapsed else 0.0,
+        "p50_ms": round(percentile(ordered, 0.50) * 1000, 3),
+        "p95_ms": round(percentile(ordered, 0.95) * 1000, 3),
+        "p99_ms": round(percentile(ordered, 0.99) * 1000, 3),
+    }
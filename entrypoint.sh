@@ -5,4 +5,12 @@ until pg_isready -h db -p 5432 -U ${DATABASE_USER} -d ${DATABASE_NAME}; do
 done
 
 python ./manage.py migrate
+if [ "${POLLS_STATIC_MANIFEST}" = "True" ]; then
+  # hashed and precompressed static files (see polls/storage.py)
+  python ./manage.py collectstatic --noinput
+fi
+if [ "${POLLS_ASYNC_VIEWS}" = "True" ]; then
+  # ASGI profile: async views served by uvicorn workers
+  exec uvicorn mysite.asgi:application --host 0.0.0.0 --port 8000 --workers ${WEB_CONCURRENCY:-2}
+fi
 python ./manage.py runserver 0.0.0.0:8000
\ No newline at end of file
@@ -0,0 +1,15 @@
+"""
+URL configuration of the ASGI profile (POLLS_ASYNC_VIEWS = True).
+
+Same as mysite/urls.py, except that the polls pages
+are served by their native async views.
+"""
+from django.urls import include, path
+
+from . import urls
+
+urlpatterns = [
+    path("polls/", include("polls.async_urls")),
+    *[pattern for pattern in urls.urlpatterns
+      if getattr(pattern, "namespace", None) != "polls"],
+]
@@ -11,7 +11,7 @@ https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
 from pathlib import Path
-from decouple import config
+from decouple import config, Csv
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -40,16 +40,29 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # first, so it times everything below it (see polls/instrumentation.py)
+    "polls.instrumentation.InstrumentationMiddleware",
     "django.middleware.security.SecurityMiddleware",
+    # answers /static/ requests before sessions and auth when POLLS_SERVE_STATIC is on
+    "polls.assets.StaticFilesMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
+    # pins the reads of clients that just wrote to the primary database
+    "polls.routers.ReadYourWritesMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
 
-ROOT_URLCONF = "mysite.urls"
+# Serve the polls pages with their native async views (ASGI profile)
+POLLS_ASYNC_VIEWS = config("POLLS_ASYNC_VIEWS", cast=bool, default=False)
+
+ROOT_URLCONF = "mysite.async_urls" if POLLS_ASYNC_VIEWS else "mysite.urls"
+
+# Worker processes serving the app; entrypoint.sh starts WEB_CONCURRENCY
+# uvicorn workers (2 by default) in the ASGI profile
+POLLS_WORKERS = config("WEB_CONCURRENCY", cast=int, default=2 if POLLS_ASYNC_VIEWS else 1)
 
 TEMPLATES = [
     {
@@ -72,22 +85,127 @@ WSGI_APPLICATION = "mysite.wsgi.application"
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
-# DATABASES = {
-#     "default": {
-#         "ENGINE": "django.db.backends.postgresql",
-#         "NAME": config("DATABASE_NAME", default="pollsdb"),
-#         "USER": config("DATABASE_USER", default="pollsapp"),
-#         "PASSWORD": config("DATABASE_PASSWORD", default="password"),
-#         "HOST": config("DATABASE_HOST", default="localhost"),
-#         "PORT": config("DATABASE_PORT", default="5432")
-#     }
-# }
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / "db.sqlite3",
+# SQLite by default. Set DATABASE_ENGINE=postgresql for the production profile:
+# connections come from a psycopg 3 pool (DATABASE_POOL_*), or with
+# DATABASE_POOL=False stay open for DATABASE_CONN_MAX_AGE seconds.
+# Either way a connection is health-checked before it is reused.
+DATABASE_ENGINE = config("DATABASE_ENGINE", default="sqlite3")
+
+# SQLite production profile (DATABASE_SQLITE_PRODUCTION=True): WAL lets readers
+# run alongside the writer, synchronous=NORMAL only fsyncs at checkpoints
+# (safe with WAL), a 64 MB page cache and 256 MB memory map keep reads off
+# the disk, and transactions take the write lock when they begin, so
+# concurrent writers wait for it (up to "timeout" seconds) instead of
+# failing with "database is locked" when upgrading a read lock.
+SQLITE_PRODUCTION_OPTIONS = {
+    "init_command": ("PRAGMA journal_mode=WAL; PRAGMA synchronous=NORMAL;"
+                     " PRAGMA cache_size=-64000; PRAGMA mmap_size=268435456;"
+                     " PRAGMA temp_store=MEMORY"),
+    "transaction_mode": "IMMEDIATE",
+    "timeout": config("DATABASE_SQLITE_TIMEOUT", cast=float, default=20.0),
+}
+
+if DATABASE_ENGINE == "postgresql":
+    DATABASES = {
+        "default": {
+            "ENGINE": "django.db.backends.postgresql",
+            "NAME": config("DATABASE_NAME", default="polls"),
+            "USER": config("DATABASE_USERNAME", default="polls"),
+            "PASSWORD": config("DATABASE_PASSWORD", default=""),
+            "HOST": config("DATABASE_HOST", default="localhost"),
+            "PORT": config("DATABASE_PORT", default="5432"),
+            "CONN_HEALTH_CHECKS": True,
+            "OPTIONS": {},
+        }
+    }
+    if config("DATABASE_POOL", cast=bool, default=True):
+        DATABASES["default"]["OPTIONS"]["pool"] = {
+            "min_size": config("DATABASE_POOL_MIN_SIZE", cast=int, default=2),
+            "max_size": config("DATABASE_POOL_MAX_SIZE", cast=int, default=10),
+            # seconds a request waits for a free connection before failing
+            "timeout": config("DATABASE_POOL_TIMEOUT", cast=float, default=10.0),
+            # seconds before idle connections above min_size are closed
+            "max_idle": config("DATABASE_POOL_MAX_IDLE", cast=float, default=600.0),
+            # seconds before a connection is replaced by a fresh one
+            "max_lifetime": config("DATABASE_POOL_MAX_LIFETIME", cast=float, default=3600.0),
+        }
+    else:
+        DATABASES["default"]["CONN_MAX_AGE"] = config("DATABASE_CONN_MAX_AGE", cast=int,
+                                                      default=60)
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': BASE_DIR / "db.sqlite3",
+        }
     }
+    if config("DATABASE_SQLITE_PRODUCTION", cast=bool, default=False):
+        DATABASES["default"]["OPTIONS"] = SQLITE_PRODUCTION_OPTIONS
+
+# Read replicas: comma-separated database NAMEs holding copies of the primary
+# (SQLite files, or Postgres databases, "host[:port]/name" on another server).
+# Polls pages read from them, writes and anything else use the primary, and
+# a client that wrote reads from the primary for POLLS_REPLICA_STICKY_SECONDS
+# (see polls/routers.py).
+DATABASE_REPLICAS = config("DATABASE_REPLICAS", cast=Csv(), default="")
+POLLS_READ_REPLICAS = []
+for number, name in enumerate(DATABASE_REPLICAS, 1):
+    replica = dict(DATABASES["default"], NAME=name, TEST={"MIRROR": "default"})
+    if DATABASE_ENGINE == "postgresql" and "/" in name:
+        address, replica["NAME"] = name.split("/", 1)
+        replica["HOST"], _, port = address.partition(":")
+        replica["PORT"] = port or replica["PORT"]
+    DATABASES[f"replica{number}"] = replica
+    POLLS_READ_REPLICAS.append(f"replica{number}")
+DATABASE_ROUTERS = ["polls.routers.ReadReplicaRouter"]
+POLLS_REPLICA_STICKY_SECONDS = config("POLLS_REPLICA_STICKY_SECONDS", cast=float, default=5.0)
+
+# Cache
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+# "results" holds poll results between votes (see polls/cache.py), "default"
+# the catalog version and cached users, "throttle" the login throttle
+# counters (see polls/throttle.py). Every worker process must see the same
+# versions and counters, so with more than one worker (POLLS_WORKERS) they
+# default to FileBasedCache directories under CACHE_DIR shared by the workers
+# of the host; a per-process LocMemCache would let each worker serve stale
+# results until it takes a vote itself.
+LOCAL_CACHE = "django.core.cache.backends.locmem.LocMemCache"
+SHARED_CACHE = "django.core.cache.backends.filebased.FileBasedCache"
+CACHE_DIR = Path(config("CACHE_DIR", default=str(BASE_DIR / "cache")))
+MULTI_PROCESS = POLLS_WORKERS > 1
+
+CACHES = {
+    "default": {
+        "BACKEND": config("CACHE_BACKEND",
+                          default=SHARED_CACHE if MULTI_PROCESS else LOCAL_CACHE),
+        "LOCATION": config("CACHE_LOCATION",
+                           default=str(CACHE_DIR / "default") if MULTI_PROCESS else ""),
+    },
+    "results": {
+        "BACKEND": config("RESULTS_CACHE_BACKEND",
+                          default=SHARED_CACHE if MULTI_PROCESS else LOCAL_CACHE),
+        "LOCATION": config("RESULTS_CACHE_LOCATION",
+                           default=str(CACHE_DIR / "results") if MULTI_PROCESS
+                           else "polls-results"),
+        "TIMEOUT": None,
+    },
+    # login throttle counters only, so nothing a client can fill at will
+    # (paged listings, sessions) evicts them; a username or IP holds at most
+    # 11 counters. Across processes incr() must be atomic, as with
+    # LockedFileBasedCache (the default for several workers) or Redis.
+    "throttle": {
+        "BACKEND": config("THROTTLE_CACHE_BACKEND",
+                          default="polls.cache_backends.LockedFileBasedCache"
+                          if MULTI_PROCESS else LOCAL_CACHE),
+        "LOCATION": config("THROTTLE_CACHE_LOCATION",
+                           default=str(CACHE_DIR / "throttle") if MULTI_PROCESS
+                           else "polls-throttle"),
+        "OPTIONS": {"MAX_ENTRIES": config("THROTTLE_CACHE_MAX_ENTRIES", cast=int,
+                                          default=100000)},
+    },
 }
+POLLS_RESULTS_CACHE_ALIAS = "results"
+POLLS_RESULTS_CACHE_SIZE = config("RESULTS_CACHE_SIZE", cast=int, default=1000)
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -106,10 +224,92 @@ AUTH_PASSWORD_VALIDATORS = [
         "NAME": "django.contrib.auth.password_validation.NumericPasswordValidator",
     },
 ]
-AUTHENTICATION_BACKENDS = [
-    # username & password authentication
-    'django.contrib.auth.backends.ModelBackend',
-]
+
+# Session and message storage profiles. "db" keeps sessions in the database
+# (one django_session read per request, a write when it changes).
+# "cached_db" reads sessions from the cache and "signed_cookies" keeps them
+# in a signed cookie; both keep messages in a cookie and serve the user
+# lookup of every request from the cache (see polls/backends.py).
+# ModelBackend stays listed so sessions logged in under it remain valid.
+POLLS_SESSION_PROFILES = {
+    "db": {
+        "SESSION_ENGINE": "django.contrib.sessions.backends.db",
+        "MESSAGE_STORAGE": "django.contrib.messages.storage.fallback.FallbackStorage",
+        # username & password authentication
+        "AUTHENTICATION_BACKENDS": ["polls.backends.LoginThrottleBackend",
+                                    "django.contrib.auth.backends.ModelBackend"],
+    },
+    "cached_db": {
+        "SESSION_ENGINE": "django.contrib.sessions.backends.cached_db",
+        "MESSAGE_STORAGE": "django.contrib.messages.storage.cookie.CookieStorage",
+        "AUTHENTICATION_BACKENDS": ["polls.backends.LoginThrottleBackend",
+                                    "polls.backends.CachedModelBackend",
+                                    "django.contrib.auth.backends.ModelBackend"],
+    },
+    "signed_cookies": {
+        "SESSION_ENGINE": "django.contrib.sessions.backends.signed_cookies",
+        "MESSAGE_STORAGE": "django.contrib.messages.storage.cookie.CookieStorage",
+        "AUTHENTICATION_BACKENDS": ["polls.backends.LoginThrottleBackend",
+                                    "polls.backends.CachedModelBackend",
+                                    "django.contrib.auth.backends.ModelBackend"],
+    },
+}
+POLLS_SESSION_PROFILE = config("POLLS_SESSION_PROFILE", default="db")
+SESSION_ENGINE = POLLS_SESSION_PROFILES[POLLS_SESSION_PROFILE]["SESSION_ENGINE"]
+MESSAGE_STORAGE = POLLS_SESSION_PROFILES[POLLS_SESSION_PROFILE]["MESSAGE_STORAGE"]
+AUTHENTICATION_BACKENDS = POLLS_SESSION_PROFILES[POLLS_SESSION_PROFILE][
+    "AUTHENTICATION_BACKENDS"]
+# Failed logins per username and per client IP within the window (seconds)
+# after which logins are refused before checking the password
+POLLS_LOGIN_THROTTLE = config("POLLS_LOGIN_THROTTLE", cast=bool, default=True)
+POLLS_LOGIN_THROTTLE_WINDOW = config("POLLS_LOGIN_THROTTLE_WINDOW", cast=int, default=300)
+POLLS_LOGIN_FAILURES_PER_USERNAME = config("POLLS_LOGIN_FAILURES_PER_USERNAME", cast=int,
+                                           default=5)
+POLLS_LOGIN_FAILURES_PER_IP = config("POLLS_LOGIN_FAILURES_PER_IP", cast=int, default=50)
+# Reverse proxies in front of the site appending to X-Forwarded-For; the
+# throttle counts the address the outermost one saw (0: REMOTE_ADDR)
+POLLS_TRUSTED_PROXIES = config("POLLS_TRUSTED_PROXIES", cast=int, default=0)
+POLLS_LOGIN_THROTTLE_CACHE_ALIAS = "throttle"
+# cache and seconds for sessions (cached_db) and users (CachedModelBackend)
+SESSION_CACHE_ALIAS = "default"
+POLLS_USER_CACHE_ALIAS = "default"
+POLLS_USER_CACHE_TIMEOUT = config("POLLS_USER_CACHE_TIMEOUT", cast=int, default=300)
+
+# Per-view query/latency histograms at /polls/metrics/ (staff only)
+POLLS_INSTRUMENTATION = config("POLLS_INSTRUMENTATION", cast=bool, default=False)
+
+# Live results stream: seconds between recomputes, and between heartbeats
+POLLS_LIVE_TICK = config("POLLS_LIVE_TICK", cast=float, default=1.0)
+POLLS_LIVE_HEARTBEAT = config("POLLS_LIVE_HEARTBEAT", cast=float, default=15.0)
+
+# Write-behind voting: acknowledge votes from a journal file and commit them
+# in batches every INTERVAL_MS or BATCH votes (see polls/buffer.py).
+# Each worker process journals to POLLS_WRITE_BEHIND_JOURNAL.<pid>.
+POLLS_WRITE_BEHIND = config("POLLS_WRITE_BEHIND", cast=bool, default=False)
+POLLS_WRITE_BEHIND_JOURNAL = config("POLLS_WRITE_BEHIND_JOURNAL",
+                                    default=str(BASE_DIR / "votes.journal"))
+POLLS_WRITE_BEHIND_INTERVAL_MS = config("POLLS_WRITE_BEHIND_INTERVAL_MS", cast=int,
+                                        default=200)
+POLLS_WRITE_BEHIND_BATCH = config("POLLS_WRITE_BEHIND_BATCH", cast=int, default=500)
+POLLS_WRITE_BEHIND_FSYNC = config("POLLS_WRITE_BEHIND_FSYNC", cast=bool, default=True)
+
+# Vote writes that still find the database locked are retried this many
+# times, after POLLS_VOTE_RETRY_BACKOFF_MS, then twice as long, ... (jittered)
+POLLS_VOTE_RETRIES = config("POLLS_VOTE_RETRIES", cast=int, default=3)
+POLLS_VOTE_RETRY_BACKOFF_MS = config("POLLS_VOTE_RETRY_BACKOFF_MS", cast=int, default=20)
+
+# Cache the poll list (and whole index pages for anonymous visitors) until
+# a question is edited, opens or closes
+POLLS_PAGE_CACHE = config("POLLS_PAGE_CACHE", cast=bool, default=True)
+POLLS_PAGE_CACHE_ALIAS = "default"
+
+# Tag the index and results pages with ETags computed from the cache
+# versions of what they show, and answer If-None-Match with 304
+POLLS_CONDITIONAL_GET = config("POLLS_CONDITIONAL_GET", cast=bool, default=True)
+
+# Number of polls per page of the index
+POLLS_INDEX_PAGE_SIZE = config("POLLS_INDEX_PAGE_SIZE", cast=int, default=20)
+
 LOGIN_REDIRECT_URL = 'polls:index'  # after login, show list of polls
 LOGOUT_REDIRECT_URL = 'login'  # after logout, return to login page
 # Internationalization
@@ -125,27 +325,47 @@ USE_TZ = True
 # https://docs.djangoproject.com/en/5.1/howto/static-files/
 
 STATIC_URL = "static/"
+STATIC_ROOT = config("STATIC_ROOT", default=str(BASE_DIR / "staticfiles"))
+
+# Production static pipeline: collectstatic writes content-hashed copies of
+# the files plus .gz (and, with the brotli package, .br) variants
+# (see polls/storage.py). Templates then need the manifest, so run
+# collectstatic before serving with it on.
+if config("POLLS_STATIC_MANIFEST", cast=bool, default=False):
+    STORAGES = {
+        "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+        "staticfiles": {"BACKEND": "polls.storage.CompressedManifestStaticFilesStorage"},
+    }
+
+# Serve STATIC_ROOT from the app itself, with far-future caching of hashed
+# files, for deployments without a front proxy (see polls/assets.py)
+POLLS_SERVE_STATIC = config("POLLS_SERVE_STATIC", cast=bool, default=False)
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
+# Polls events are written as JSON lines by a background thread
+# (see polls/log.py); the log rotates at POLLS_LOG_MAX_BYTES, or at
+# POLLS_LOG_ROTATE_WHEN (e.g. "midnight") if set.
 LOGGING = {
     "version": 1,  # the dictConfig format version
     "disable_existing_loggers": False,  # retain the default loggers
     "handlers": {
         "file": {
-            "class": "logging.FileHandler",
-            "filename": "polls.log",
+            "class": "polls.log.QueuedFileHandler",
+            "filename": config("POLLS_LOG_FILE", default="polls.log"),
+            "max_bytes": config("POLLS_LOG_MAX_BYTES", cast=int, default=10 * 1024 * 1024),
+            "backup_count": config("POLLS_LOG_BACKUPS", cast=int, default=5),
+            "when": config("POLLS_LOG_ROTATE_WHEN", default="") or None,
             "level": "INFO",
-            "formatter": "verbose",
+            "formatter": "json",
         },
     },
     "formatters": {
-        "verbose": {
-            "format": "{name} {levelname} {asctime} {module} {process:d} {thread:d} {message}",
-            "style": "{",
+        "json": {
+            "()": "polls.log.JsonLineFormatter",
         },
         "simple": {
             "format": "{levelname} {message}",
@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class PollsConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "polls"
+
+    def ready(self):
+        # connect the results cache and user cache invalidation receivers
+        # and register the system checks
+        from . import backends, cache, checks  # noqa: F401
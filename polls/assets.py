@@ -0,0 +1,103 @@
+"""
+This module serves the collected static files from the application, for
+deployments without a web server or CDN in front of it.
+
+StaticFilesMiddleware answers requests under STATIC_URL before sessions,
+authentication or URL resolving run. Files are read from STATIC_ROOT,
+their precompressed variant is sent when the client accepts it, hashed
+file names (see polls/storage.py) are cached for a year as immutable and
+anything else is revalidated with its ETag.
+"""
+
+import mimetypes
+import os
+import re
+from urllib.parse import urlsplit
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed, SuspiciousFileOperation
+from django.http import FileResponse, Http404
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+from .storage import ENCODINGS
+
+# name.0123456789ab.css, as ManifestStaticFilesStorage names them
+HASHED_NAME = re.compile(r"\.[0-9a-f]{12}\.[^/]+$")
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "public, no-cache"
+
+
+def serve(request, path, root):
+    """Response for a static file at path under root, or 304 if unchanged."""
+    try:
+        fullpath = safe_join(root, path)
+    except SuspiciousFileOperation:
+        raise Http404("Static file not found")
+    if not os.path.isfile(fullpath):
+        raise Http404("Static file not found")
+    served, encoding = fullpath, None
+    accepted = request.headers.get("Accept-Encoding", "")
+    for candidate, suffix in ENCODINGS.items():
+        if candidate in accepted and os.path.isfile(fullpath + suffix):
+            served, encoding = fullpath + suffix, candidate
+            break
+    stat = os.stat(served)
+    # each encoding is a representation of its own
+    etag = f'"{stat.st_size:x}-{stat.st_mtime_ns:x}{"-" + encoding if encoding else ""}"'
+    headers = {"ETag": etag,
+               "Last-Modified": http_date(stat.st_mtime),
+               "Cache-Control": IMMUTABLE if HASHED_NAME.search(path) else REVALIDATE,
+               "Vary": "Accept-Encoding"}
+    response = get_conditional_response(request, etag=etag, last_modified=int(stat.st_mtime))
+    if response is None:
+        content_type = mimetypes.guess_type(fullpath)[0] or "application/octet-stream"
+        response = FileResponse(open(served, "rb"), content_type=content_type)
+        if encoding:
+            response["Content-Encoding"] = encoding
+    for header, value in headers.items():
+        response[header] = value
+    return response
+
+
+class StaticFilesMiddleware:
+    """
+    Serve STATIC_ROOT at STATIC_URL when POLLS_SERVE_STATIC is on. In front
+    of async views it is async itself and reads the files in a thread.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, "POLLS_SERVE_STATIC", False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.prefix = urlsplit(settings.STATIC_URL).path
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if self.is_static(request):
+            return serve(request, self.static_path(request), settings.STATIC_ROOT)
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        if self.is_static(request):
+            return await sync_to_async(serve)(request, self.static_path(request),
+                                              settings.STATIC_ROOT)
+        return await self.get_response(request)
+
+    def is_static(self, request):
+        """Whether the request is for a static file."""
+        return request.method in ("GET", "HEAD") and request.path_info.startswith(self.prefix)
+
+    def static_path(self, request):
+        """Path of the requested file under STATIC_ROOT."""
+        return request.path_info[len(self.prefix):]
@@ -0,0 +1,31 @@
+"""
+URLs of the polls app with the async view variants,
+used instead of polls/urls.py when POLLS_ASYNC_VIEWS is on.
+"""
+
+from django.urls import path
+
+from . import async_views, views
+
+app_name = "polls"
+
+urlpatterns = [
+    # ex: /polls/
+    path("", async_views.index, name="index"),
+    # ex: /polls/5/
+    path("<int:pk>/", async_views.detail, name="detail"),
+    # ex: /polls/5/results/
+    path("<int:pk>/results/", async_views.results, name="results"),
+    # ex: /polls/5/results/stream (server-sent events, needs ASGI)
+    path("<int:pk>/results/stream", async_views.results_stream, name="results_stream"),
+    # ex: /polls/5/results.json
+    path("<int:pk>/results.json", views.results_json, name="results_json"),
+    # ex: /polls/5/vote/
+    path("<int:question_id>/vote/", async_views.vote, name="vote"),
+    # ex: /polls/votes/bulk/ (JSON, needs polls.add_vote)
+    path("votes/bulk/", views.bulk_vote, name="bulk_vote"),
+    # ex: /polls/export/votes.csv?gzip=1 (staff only, streamed)
+    path("export/<str:kind>.<str:fmt>", views.export_results, name="export_results"),
+    # ex: /polls/metrics/ (staff only)
+    path("metrics/", views.metrics, name="metrics"),
+]
@@ -0,0 +1,185 @@
+"""
+This module contains native async variants of the polls views.
+
+They use the async ORM so an ASGI worker is not blocked on the database.
+They are routed by polls/async_urls.py when POLLS_ASYNC_VIEWS is on.
+"""
+
+import json
+import logging
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib import messages
+from django.contrib.auth.decorators import login_required
+from django.core.handlers.asgi import ASGIRequest
+from django.http import Http404, HttpResponse, HttpResponseRedirect, StreamingHttpResponse
+from django.shortcuts import redirect, render
+from django.template.loader import render_to_string
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.safestring import mark_safe
+
+from . import conditional
+from .cache import results_cache
+from .live import live_results
+from .log import log_event
+from .models import Question, Choice
+from .pagination import akeyset_page
+from .views import IndexView, published_questions, questions_with_vote
+from .voting import cast_vote, pending_choice, pending_results
+
+logger = logging.getLogger(__name__)
+
+
+async def index(request):
+    """Async variant of IndexView."""
+    now = timezone.now()
+    status = request.GET.get("status")
+    if status not in IndexView.statuses:
+        status = None
+    cursor = request.GET.get("cursor")
+    # resolve the user now so the templates never load it synchronously
+    # (this loads the session the pending messages are read from, too)
+    request.user = await request.auser()
+    tag = None
+    if conditional.enabled() and not messages.get_messages(request):
+        tag = conditional.page_etag(
+            request, await sync_to_async(conditional.index_version)(now), status, cursor)
+        response = conditional.not_modified(request, tag)
+        if response is not None:
+            return response
+    try:
+        page, next_cursor = await akeyset_page(published_questions(now, status), cursor,
+                                               settings.POLLS_INDEX_PAGE_SIZE)
+    except ValueError:
+        raise Http404("Invalid page cursor.")
+    context = {
+        IndexView.context_object_name: page,
+        "cursor": cursor,
+        "next_cursor": next_cursor,
+        "status": status,
+        "statuses": IndexView.statuses,
+    }
+    context["question_list"] = mark_safe(render_to_string(IndexView.list_template_name,
+                                                          context))
+    response = render(request, IndexView.template_name, context)
+    return conditional.revalidated(response, tag) if tag else response
+
+
+async def detail(request, pk):
+    """Async variant of DetailView."""
+    request.user = user = await request.auser()
+    if not user.is_authenticated:
+        return redirect(reverse("login"))
+    question = await questions_with_vote(user.pk, timezone.now()).filter(pk=pk).afirst()
+    if question is None:
+        messages.warning(request, "This poll is not available")
+        log_event(logger, logging.WARNING, "poll_unavailable",
+                  "%s tried to access unavailable poll ID %s", user.get_username(), pk,
+                  request=request, user=user, question=pk)
+        return redirect(reverse("polls:index"))
+    if not question.can_vote():
+        messages.warning(request, "This poll is already closed.")
+        log_event(logger, logging.WARNING, "poll_closed",
+                  "%s tried to access closed poll ID %s", user.get_username(), question.pk,
+                  request=request, user=user, question=question.pk)
+        return redirect(reverse("polls:index"))
+    choices = [choice async for choice in
+               question.choice_set.only("id", "choice_text", "question_id")]
+    context = {"question": question, "choices": choices}
+    voted_choice = pending_choice(user.pk, question.pk, question.voted_choice)
+    if voted_choice is not None:
+        context["voted_choice"] = voted_choice
+    return render(request, "polls/detail.html", context)
+
+
+async def results(request, pk):
+    """Async variant of ResultsView."""
+    request.user = await request.auser()
+    tag = None
+    if conditional.enabled() and not messages.get_messages(request):
+        tag = conditional.page_etag(request, await conditional.aresults_version(pk))
+        response = conditional.not_modified(request, tag)
+        if response is not None:
+            return response
+    try:
+        question = pending_results(await results_cache.aget(pk))
+    except Question.DoesNotExist:
+        raise Http404("No poll matches the given query.")
+    response = render(request, "polls/results.html", {"question": question})
+    return conditional.revalidated(response, tag) if tag else response
+
+
+async def results_stream(request, pk):
+    """
+    Stream live results as server-sent events: a "snapshot" event with the
+    full results, then a "delta" event with the changed tallies
+    ({"total_votes": n, "<choice id>": votes}) whenever they change.
+    Needs an ASGI server: under WSGI the never-ending stream would be read
+    to the end into memory, so it answers 501. A comment line is sent as
+    heartbeat.
+    """
+    if not isinstance(request, ASGIRequest):
+        return HttpResponse("Live results need an ASGI server.", status=501,
+                            content_type="text/plain")
+    try:
+        watcher, results = await live_results.subscribe(pk)
+    except Question.DoesNotExist:
+        raise Http404("No poll matches the given query.")
+
+    async def events():
+        try:
+            yield f"event: snapshot\ndata: {json.dumps(results)}\n\n"
+            while True:
+                delta = await watcher.next_delta(timeout=settings.POLLS_LIVE_HEARTBEAT)
+                if delta is None:
+                    yield ": heartbeat\n\n"
+                else:
+                    yield f"event: delta\ndata: {json.dumps(delta)}\n\n"
+        finally:
+            # the client went away
+            live_results.unsubscribe(pk, watcher)
+
+    response = StreamingHttpResponse(events(), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+
+@login_required
+async def vote(request, question_id):
+    """Async variant of views.vote."""
+    user = await request.auser()
+    try:
+        selected_choice = await (Choice.objects.only("id", "choice_text", "question_id")
+                                 .aget(pk=request.POST['choice'], question_id=question_id))
+        log_event(logger, logging.INFO, "vote", "User %s voted for choice id:%s in polls %s",
+                  user.get_username(), selected_choice.pk, question_id, request=request,
+                  user=user, question=question_id, choice=selected_choice.pk)
+    except (KeyError, ValueError, Choice.DoesNotExist):
+        try:
+            question = await Question.objects.aget(pk=question_id)
+        except Question.DoesNotExist:
+            raise Http404("No poll matches the given query.")
+        log_event(logger, logging.ERROR, "invalid_vote",
+                  "Invalid question id:%s or choice not selected for user: %s",
+                  question_id, user.get_username(), request=request, user=user,
+                  question=question_id, exc_info=True)
+        request.user = user
+        return render(request, "polls/detail.html", {
+            "question": question,
+            "choices": [choice async for choice in question.choice_set.all()],
+            "error_message": "You didn't select a choice.",
+        })
+
+    # transactions are not supported by the async ORM yet,
+    # so the write itself runs in a worker thread
+    previous_choice_id = await sync_to_async(cast_vote)(user.pk, question_id,
+                                                        selected_choice.pk)
+    if previous_choice_id is None:
+        messages.success(request, f"You voted for {selected_choice.choice_text}.")
+    elif previous_choice_id != selected_choice.pk:
+        messages.success(request,
+                         f"You changed your vote to {selected_choice.choice_text}.")
+    return HttpResponseRedirect(reverse("polls:results", args=(question_id,)))
@@ -0,0 +1,98 @@
+"""
+This module holds the authentication backends of the polls site.
+
+LoginThrottleBackend comes first and turns a login away, before any
+password is hashed, once its username or client IP failed too often
+recently (see polls/throttle.py).
+
+CachedModelBackend is Django's ModelBackend with the per-request user
+lookup of AuthenticationMiddleware served from the cache: the user is
+cached by id and dropped whenever it is saved or deleted (a changed
+password, a login updating last_login, an admin edit).
+"""
+
+import logging
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.contrib.auth.signals import user_logged_in, user_login_failed
+from django.core.cache import caches
+from django.core.exceptions import PermissionDenied
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .log import log_event
+from .throttle import login_throttle, throttle_ip
+
+logger = logging.getLogger(__name__)
+
+
+class LoginThrottleBackend:
+    """
+    Refuse throttled logins; authenticates nobody itself. It has no
+    get_user(), so sessions are never attached to it.
+    """
+
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        if not getattr(settings, "POLLS_LOGIN_THROTTLE", True):
+            return None
+        if username is None:
+            username = kwargs.get(get_user_model().USERNAME_FIELD)
+        ip = throttle_ip(request) if request is not None else None
+        if login_throttle.is_throttled(username, ip):
+            if request is not None:
+                request.polls_login_throttled = True
+            log_event(logger, logging.WARNING, "login_throttled",
+                      "Throttled login attempt for user: %s", username, request=request)
+            # stops authenticate() from trying the other backends
+            raise PermissionDenied
+        return None
+
+
+@receiver(user_login_failed)
+def count_failed_login(sender, credentials, request=None, **kwargs):
+    """Count a failed login, unless it was refused by the throttle itself."""
+    if not getattr(settings, "POLLS_LOGIN_THROTTLE", True):
+        return
+    if getattr(request, "polls_login_throttled", False):
+        return
+    username = credentials.get(get_user_model().USERNAME_FIELD)
+    login_throttle.failed(username, throttle_ip(request) if request is not None else None)
+
+
+@receiver(user_logged_in)
+def clear_failed_logins(sender, request, user, **kwargs):
+    """A successful login clears the failures of its username."""
+    login_throttle.succeeded(user.get_username())
+
+
+def user_key(user_id):
+    """Cache key of a user."""
+    return f"polls:user:{user_id}"
+
+
+def user_cache():
+    """The Django cache users are kept in."""
+    return caches[getattr(settings, "POLLS_USER_CACHE_ALIAS", "default")]
+
+
+class CachedModelBackend(ModelBackend):
+    """ModelBackend whose get_user() reads the cache first."""
+
+    def get_user(self, user_id):
+        key = user_key(user_id)
+        user = user_cache().get(key)
+        if user is None:
+            user = super().get_user(user_id)
+            if user is not None:
+                user_cache().set(key, user,
+                                 timeout=getattr(settings, "POLLS_USER_CACHE_TIMEOUT", 300))
+        return user
+
+
+@receiver(post_save, sender=get_user_model())
+@receiver(post_delete, sender=get_user_model())
+def invalidate_cached_user(sender, instance, **kwargs):
+    """A saved or deleted user must not be served from the cache."""
+    user_cache().delete(user_key(instance.pk))
@@ -0,0 +1,305 @@
+"""
+This module takes vote writes off the request path (write-behind mode).
+
+With POLLS_WRITE_BEHIND on, a vote is checked, appended to a local
+journal file and acknowledged; a background thread then commits the
+buffered votes in batches through polls.ingest, every
+POLLS_WRITE_BEHIND_INTERVAL_MS or as soon as POLLS_WRITE_BEHIND_BATCH votes
+are waiting. Journal entries left by a crash are replayed when the buffer
+starts. Until a vote is committed, results and the voting form account for
+it from the buffer, so users see their own vote immediately.
+
+Each worker process journals to POLLS_WRITE_BEHIND_JOURNAL plus its pid
+and holds a lock on it while it runs. A starting worker replays its own
+leftover journal and those of workers that died (their lock is free), but
+never the journal of a live one.
+"""
+
+import atexit
+import glob
+import json
+import logging
+import os
+import re
+import threading
+from collections import Counter
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+
+from .ingest import INVALID, ingest_votes
+from .models import Vote
+
+try:
+    import fcntl
+except ImportError:  # Windows: journals of dead workers are not recovered
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+
+def lock_journal(path):
+    """
+    Open the lock file of a journal and lock it for this process,
+    or return None if another live process holds it.
+    """
+    lock_file = open(path + ".lock", "a", encoding="utf-8")
+    if fcntl is not None:
+        try:
+            fcntl.lockf(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return None
+    return lock_file
+
+
+def unlock_journal(path, lock_file):
+    """Remove a journal's lock file and release the lock."""
+    if os.path.exists(path + ".lock"):
+        os.remove(path + ".lock")
+    lock_file.close()
+
+
+class VoteBuffer:
+    """Buffered votes, their journal and the thread that commits them."""
+
+    def __init__(self, journal_path, interval_ms=200, batch_size=500, fsync=True,
+                 per_process=False):
+        # with per_process, the journal of each process is journal_path.<pid>
+        self.base_path = self.journal_path = str(journal_path)
+        self.per_process = per_process
+        self.interval = interval_ms / 1000
+        self.batch_size = batch_size
+        self.fsync = fsync
+        # (user, question) -> (buffered choice, choice it replaces)
+        self.pending = {}
+        self.in_flight = {}
+        # tally changes of the buffered votes, per question
+        self.deltas = {}
+        self.in_flight_deltas = {}
+        self._journal = None
+        self._lock_file = None
+        self._thread = None
+        self._stopping = False
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._flush_lock = threading.Lock()
+        self._start_lock = threading.Lock()
+
+    @property
+    def started(self):
+        return self._journal is not None
+
+    @property
+    def flushing_path(self):
+        """Journal of the batch being committed."""
+        return self.journal_path + ".flushing"
+
+    def start(self, thread=True):
+        """
+        Replay what previous runs left in the journals and start flushing.
+        Called on every vote, so it returns at once once started, without
+        waiting for a flush in progress.
+        """
+        if self.started:
+            return
+        with self._start_lock:
+            if self.started:
+                return
+            if self.per_process:
+                self.journal_path = f"{self.base_path}.{os.getpid()}"
+            self._lock_file = lock_journal(self.journal_path)
+            if self._lock_file is None:
+                raise RuntimeError(f"Vote journal {self.journal_path} is used by "
+                                   "another process")
+            self.replay()
+            if self.per_process:
+                self.replay_orphans()
+            self._stopping = False
+            self._journal = open(self.journal_path, "a", encoding="utf-8")
+        if thread:
+            self._thread = threading.Thread(target=self._run, name="vote-buffer",
+                                            daemon=True)
+            self._thread.start()
+            atexit.register(self.stop)
+
+    def stop(self):
+        """Commit every buffered vote and stop the background thread."""
+        with self._lock:
+            thread, self._thread = self._thread, None
+            self._stopping = True
+            self._wakeup.notify()
+        if thread is not None:
+            thread.join()
+        self.flush()
+        with self._flush_lock:
+            if self._journal is not None:
+                self._journal.close()
+                self._journal = None
+                os.remove(self.journal_path)
+                unlock_journal(self.journal_path, self._lock_file)
+                self._lock_file = None
+
+    def replay(self, journal_path=None):
+        """Commit the votes of the journals left by a previous run."""
+        journal_path = journal_path or self.journal_path
+        for path in (journal_path + ".flushing", journal_path):
+            if not os.path.exists(path):
+                continue
+            with open(path, encoding="utf-8") as journal:
+                items = [json.loads(line) for line in journal if line.strip()]
+            self._commit(items)
+            os.remove(path)
+            logger.info("Replayed %s buffered votes from %s", len(items), path)
+
+    def replay_orphans(self):
+        """Replay the journals of other worker processes that are gone."""
+        if fcntl is None:
+            return
+        owned = re.compile(re.escape(self.base_path) + r"\.\d+(?=\.flushing$|\.lock$|$)")
+        journals = {match.group() for path in glob.glob(glob.escape(self.base_path) + ".*")
+                    if (match := owned.match(path))}
+        for path in sorted(journals - {self.journal_path}):
+            lock_file = lock_journal(path)
+            if lock_file is None:
+                continue  # its worker is alive
+            try:
+                self.replay(path)
+            finally:
+                unlock_journal(path, lock_file)
+
+    def submit(self, user_id, question_id, choice_id):
+        """
+        Buffer a vote whose choice was already checked to belong to the
+        question, and return the id of the choice the user had picked
+        before (or None), buffered votes included.
+        """
+        key = (user_id, question_id)
+        with self._lock:
+            entry = self.pending.get(key)
+            if entry is None and key in self.in_flight:
+                entry = (self.in_flight[key][0],) * 2
+        if entry is None:
+            committed = (Vote.objects.filter(user_id=user_id, question_id=question_id)
+                         .values_list("choice_id", flat=True).first())
+            entry = (committed, committed)
+        previous_choice_id, replaced_choice_id = entry
+        if previous_choice_id == choice_id:
+            return previous_choice_id
+        line = json.dumps({"user": user_id, "question": question_id, "choice": choice_id})
+        with self._lock:
+            self._journal.write(line + "\n")
+            self._journal.flush()
+            if self.fsync:
+                os.fsync(self._journal.fileno())
+            self.pending[key] = (choice_id, replaced_choice_id)
+            tallies = self.deltas.setdefault(question_id, Counter())
+            tallies[choice_id] += 1
+            if previous_choice_id is not None:
+                tallies[previous_choice_id] -= 1
+            if len(self.pending) >= self.batch_size:
+                self._wakeup.notify()
+        return previous_choice_id
+
+    def pending_choice(self, user_id, question_id):
+        """The user's buffered choice in a question, or None."""
+        key = (user_id, question_id)
+        with self._lock:
+            entry = self.pending.get(key) or self.in_flight.get(key)
+        return entry[0] if entry else None
+
+    def tallies(self, question_id):
+        """The votes each choice of a question gains (or loses) once flushed."""
+        with self._lock:
+            tallies = Counter(self.in_flight_deltas.get(question_id, {}))
+            tallies.update(self.deltas.get(question_id, {}))
+        return tallies
+
+    def overlay(self, results):
+        """Return the results with the buffered votes counted in."""
+        tallies = self.tallies(results["id"])
+        if not any(tallies.values()):
+            return results
+        choices = [dict(choice, votes=choice["votes"] + tallies[choice["id"]])
+                   for choice in results["choices"]]
+        return dict(results, choices=choices,
+                    total_votes=sum(choice["votes"] for choice in choices))
+
+    def flush(self):
+        """Commit the buffered votes now and return how many there were."""
+        with self._flush_lock:
+            with self._lock:
+                if not self.pending:
+                    return 0
+                self.in_flight, self.pending = self.pending, {}
+                self.in_flight_deltas, self.deltas = self.deltas, {}
+                # votes arriving meanwhile go to a fresh journal
+                self._journal.close()
+                os.replace(self.journal_path, self.flushing_path)
+                self._journal = open(self.journal_path, "a", encoding="utf-8")
+            items = [{"user": user_id, "question": question_id, "choice": choice_id}
+                     for (user_id, question_id), (choice_id, _) in self.in_flight.items()]
+            try:
+                self._commit(items)
+            except Exception:
+                logger.exception("Could not commit %s buffered votes", len(items))
+                with self._lock:
+                    self._requeue()
+                raise
+            with self._lock:
+                self.in_flight, self.in_flight_deltas = {}, {}
+            os.remove(self.flushing_path)
+            return len(items)
+
+    def _requeue(self):
+        """Put a batch that failed to commit back in front of the pending votes."""
+        for key, (choice_id, replaced_choice_id) in self.in_flight.items():
+            if key in self.pending:
+                self.pending[key] = (self.pending[key][0], replaced_choice_id)
+            else:
+                self.pending[key] = (choice_id, replaced_choice_id)
+        for question_id, tallies in self.in_flight_deltas.items():
+            self.deltas.setdefault(question_id, Counter()).update(tallies)
+        self.in_flight, self.in_flight_deltas = {}, {}
+        # keep the failed batch's journal in front of the newer entries
+        with open(self.flushing_path, encoding="utf-8") as flushing:
+            lines = flushing.read()
+        self._journal.close()
+        with open(self.journal_path, encoding="utf-8") as journal:
+            lines += journal.read()
+        with open(self.journal_path, "w", encoding="utf-8") as journal:
+            journal.write(lines)
+        os.remove(self.flushing_path)
+        self._journal = open(self.journal_path, "a", encoding="utf-8")
+
+    @staticmethod
+    def _commit(items):
+        """Write votes to the database in one transaction."""
+        with transaction.atomic():
+            for item, result in zip(items, ingest_votes(items)):
+                if result["status"] == INVALID:
+                    logger.warning("Dropped buffered vote %s: %s", item, result['error'])
+
+    def _run(self):
+        """Flush every interval, or as soon as a batch is full."""
+        while True:
+            with self._lock:
+                if len(self.pending) < self.batch_size and not self._stopping:
+                    self._wakeup.wait(self.interval)
+                if self._stopping:
+                    return
+            try:
+                self.flush()
+            except Exception:
+                pass  # logged by flush(); the batch is retried next time
+            finally:
+                close_old_connections()
+
+
+vote_buffer = VoteBuffer(
+    getattr(settings, "POLLS_WRITE_BEHIND_JOURNAL", "votes.journal"),
+    interval_ms=getattr(settings, "POLLS_WRITE_BEHIND_INTERVAL_MS", 200),
+    batch_size=getattr(settings, "POLLS_WRITE_BEHIND_BATCH", 500),
+    fsync=getattr(settings, "POLLS_WRITE_BEHIND_FSYNC", True),
+    per_process=True,
+)
@@ -0,0 +1,291 @@
+"""
+This module caches poll results between votes, and rendered poll listings.
+
+Results are stored under the question id plus a per-question version.
+A vote bumps the version, so the next read misses and recomputes,
+and the entry of the old version is deleted. Listings work the same way
+with a single catalog version for all questions, their old entries age out.
+
+Versions must be shared by all worker processes, so with several workers
+the cache aliases need a backend shared between processes (see CACHES).
+A bump sets the version to the clock rather than incrementing it, which
+is not atomic on every backend (file-based, database).
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .models import Question, Choice
+from .results import question_results, aquestion_results
+from .routers import bounded_timeout, reads_from_replica
+
+
+def new_version():
+    """
+    A new version: the clock in nanoseconds. A version key that was evicted
+    or bumped concurrently never comes back pointing at stale entries.
+    """
+    return time.time_ns()
+
+
+class ResultsCache:
+    """
+    Versioned cache of question_results() backed by a Django cache alias.
+
+    The process keeps the ids it cached in LRU order and deletes the
+    least recently used entry once more than max_entries are held,
+    so the size is bounded on any backend (locmem, file-based, ...).
+    """
+
+    def __init__(self, alias="results", max_entries=1000, timeout=None):
+        self.alias = alias
+        self.max_entries = max_entries
+        self.timeout = timeout
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._recent = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def backend(self):
+        """The Django cache the entries are stored in."""
+        return caches[self.alias]
+
+    @staticmethod
+    def version_key(question_id):
+        """Cache key holding the current version of a question's results."""
+        return f"polls:results:version:{question_id}"
+
+    @staticmethod
+    def results_key(question_id, version):
+        """Cache key holding one version of a question's results."""
+        return f"polls:results:{question_id}:{version}"
+
+    def version(self, question_id):
+        """
+        Return the current results version of a question.
+        A missing version starts from the clock, see new_version().
+        """
+        key = self.version_key(question_id)
+        version = self.backend.get(key)
+        if version is None:
+            self.backend.add(key, new_version(), timeout=None)
+            version = self.backend.get(key)
+        return version
+
+    def bump(self, question_id):
+        """Invalidate the cached results of a question."""
+        self.backend.set(self.version_key(question_id), new_version(), timeout=None)
+
+    @classmethod
+    def readable_keys(cls, question_id, version):
+        """
+        Keys the current request may read a version's results from; a miss
+        is cached under the last one. Results read from a lagging replica
+        may predate the version, so they get a key of their own, which
+        requests pinned to the primary never read.
+        """
+        key = cls.results_key(question_id, version)
+        if reads_from_replica():
+            return [key, key + ":replica"]
+        return [key]
+
+    def get(self, question_id):
+        """
+        Return the results of a question, computing and caching them on a miss.
+        Raise Question.DoesNotExist if there is no such question.
+        """
+        version = self.version(question_id)
+        keys = self.readable_keys(question_id, version)
+        cached = self.backend.get_many(keys)
+        results = next((cached[key] for key in keys if key in cached), None)
+        hit = results is not None
+        if not hit:
+            results = question_results(question_id)
+            self.backend.set(keys[-1], results, timeout=bounded_timeout(self.timeout))
+        evicted = self._touch(question_id, version, keys[-1], hit=hit)
+        if evicted:
+            self.backend.delete_many(evicted)
+        return results
+
+    async def aversion(self, question_id):
+        """Async version of version()."""
+        key = self.version_key(question_id)
+        version = await self.backend.aget(key)
+        if version is None:
+            await self.backend.aadd(key, new_version(), timeout=None)
+            version = await self.backend.aget(key)
+        return version
+
+    async def aget(self, question_id):
+        """Async version of get(), reading the database with the async ORM."""
+        version = await self.aversion(question_id)
+        keys = self.readable_keys(question_id, version)
+        cached = await self.backend.aget_many(keys)
+        results = next((cached[key] for key in keys if key in cached), None)
+        hit = results is not None
+        if not hit:
+            results = await aquestion_results(question_id)
+            await self.backend.aset(keys[-1], results,
+                                    timeout=bounded_timeout(self.timeout))
+        evicted = self._touch(question_id, version, keys[-1], hit=hit)
+        if evicted:
+            await self.backend.adelete_many(evicted)
+        return results
+
+    def _touch(self, question_id, version, key, hit):
+        """
+        Record a hit or miss and return the keys of the least recently
+        used entries that must be evicted, and of the question's entries
+        for an older version.
+        """
+        evicted = []
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+            # (version, keys of its entries) per question
+            held_version, keys = self._recent.get(question_id, (version, ()))
+            if held_version != version:
+                superseded, keys = keys, ()
+            else:
+                superseded = ()
+            self._recent[question_id] = (version, keys if key in keys else (*keys, key))
+            self._recent.move_to_end(question_id)
+            while len(self._recent) > self.max_entries:
+                evicted.extend(self._recent.popitem(last=False)[1][1])
+                self.evictions += 1
+        evicted.extend(superseded)
+        return evicted
+
+    def stats(self):
+        """Return the hit/miss/eviction counters and current size."""
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses,
+                    "evictions": self.evictions, "size": len(self._recent)}
+
+    def clear(self):
+        """Forget all entries and reset the counters."""
+        with self._lock:
+            self._recent.clear()
+            self.hits = self.misses = self.evictions = 0
+        self.backend.clear()
+
+
+results_cache = ResultsCache(
+    alias=getattr(settings, "POLLS_RESULTS_CACHE_ALIAS", "results"),
+    max_entries=getattr(settings, "POLLS_RESULTS_CACHE_SIZE", 1000),
+    timeout=getattr(settings, "POLLS_RESULTS_CACHE_TIMEOUT", None),
+)
+
+
+class CatalogCache:
+    """
+    Cache of rendered poll listings, keyed on a catalog version.
+
+    Saving or deleting any question or choice bumps the version. Entries
+    also expire at the next time a question opens or closes, so a cached
+    listing never shows a stale open/closed status.
+    """
+
+    version_key = "polls:catalog:version"
+
+    def __init__(self, alias="default", timeout=None):
+        self.alias = alias
+        # longest time to keep entries when no question will open or close
+        self.timeout = timeout
+
+    @property
+    def backend(self):
+        """The Django cache the entries are stored in."""
+        return caches[self.alias]
+
+    def version(self):
+        """Return the current catalog version (starting from the clock)."""
+        version = self.backend.get(self.version_key)
+        if version is None:
+            self.backend.add(self.version_key, new_version(), timeout=None)
+            version = self.backend.get(self.version_key)
+        return version
+
+    def bump(self):
+        """Invalidate every cached listing."""
+        self.backend.set(self.version_key, new_version(), timeout=None)
+
+    def key(self, *parts):
+        """
+        Cache key of an entry of the current version, varying on parts.
+        Entries read from a replica are kept apart, like in ResultsCache.
+        """
+        if reads_from_replica():
+            parts += ("replica",)
+        return f"polls:catalog:{self.version()}:" + ":".join(map(str, parts))
+
+    def get(self, key):
+        """Return a cached entry, or None."""
+        return self.backend.get(key)
+
+    def set(self, key, value, now):
+        """Cache an entry until the catalog's next transition after `now`."""
+        self.backend.set(key, value, timeout=bounded_timeout(self.ttl(now)))
+
+    def ttl(self, now):
+        """
+        Seconds from `now` to the next time a question opens or closes
+        (capped by timeout).
+        """
+        transition = self.next_transition(now)
+        if not transition:
+            return self.timeout
+        seconds = transition - now.timestamp()
+        return min(seconds, self.timeout) if self.timeout else seconds
+
+    def next_transition(self, now):
+        """
+        Timestamp of the next time after `now` a question opens or closes,
+        or 0 if none will. It is looked up once per version and transition.
+        """
+        key = f"polls:catalog:transition:{self.version()}"
+        transition = self.backend.get(key)
+        if transition is None or 0 < transition <= now.timestamp():
+            next_transition = Question.objects.next_transition(now)
+            transition = next_transition.timestamp() if next_transition else 0
+            self.backend.set(key, transition, timeout=bounded_timeout(None))
+        return transition
+
+    def validator(self, now):
+        """
+        A value that changes whenever the listings do: with the catalog
+        version, and with the next transition once `now` has passed it.
+        """
+        return f"{self.version()}.{self.next_transition(now)}"
+
+
+catalog_cache = CatalogCache(
+    alias=getattr(settings, "POLLS_PAGE_CACHE_ALIAS", "default"),
+    timeout=getattr(settings, "POLLS_PAGE_CACHE_TIMEOUT", None),
+)
+
+
+@receiver(post_save, sender=Question)
+@receiver(post_delete, sender=Question)
+def invalidate_question_results(sender, instance, **kwargs):
+    """Edited or deleted questions must not be served from the cache."""
+    results_cache.bump(instance.pk)
+    catalog_cache.bump()
+
+
+@receiver(post_save, sender=Choice)
+@receiver(post_delete, sender=Choice)
+def invalidate_choice_results(sender, instance, **kwargs):
+    """Edited, added or deleted choices change their question's results."""
+    results_cache.bump(instance.question_id)
+    catalog_cache.bump()
@@ -0,0 +1,51 @@
+"""
+This module holds the cache backend of the login throttle counters.
+
+FileBasedCache shares its entries between the worker processes of a host,
+but its add() and incr() read and then write the entry, so failed logins
+counted at the same time by two workers can be lost. LockedFileBasedCache
+runs them under a lock on the cache directory held by one thread of one
+process at a time; the throttle counters only ever change through them.
+"""
+
+import os
+import threading
+from contextlib import contextmanager
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django.core.cache.backends.filebased import FileBasedCache
+
+try:
+    import fcntl
+except ImportError:  # Windows: only the threads of one process are serialized
+    fcntl = None
+
+
+class LockedFileBasedCache(FileBasedCache):
+    """FileBasedCache whose add() and incr() are atomic across processes."""
+
+    def __init__(self, dir, params):
+        super().__init__(dir, params)
+        self._thread_lock = threading.Lock()
+
+    @contextmanager
+    def locked(self):
+        """Hold the lock of the cache directory."""
+        with self._thread_lock:
+            os.makedirs(self._dir, 0o700, exist_ok=True)
+            with open(os.path.join(self._dir, ".lock"), "a", encoding="utf-8") as lock_file:
+                if fcntl is not None:
+                    fcntl.lockf(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    if fcntl is not None:
+                        fcntl.lockf(lock_file, fcntl.LOCK_UN)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        with self.locked():
+            return super().add(key, value, timeout, version)
+
+    def incr(self, key, delta=1, version=None):
+        with self.locked():
+            return super().incr(key, delta, version)
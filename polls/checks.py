@@ -0,0 +1,47 @@
+"""
+This module holds the system checks of the polls app.
+"""
+
+from django.conf import settings
+from django.core.checks import Warning, register
+
+# cache aliases all worker processes must share -> what goes wrong otherwise
+SHARED_ALIASES = {
+    "default": "a change in one of them leaves the others serving stale listings",
+    "results": "a vote in one of them leaves the others serving stale results",
+    "throttle": "each of them counts failed logins on its own",
+}
+# shared backends whose incr() reads and then writes the entry
+NON_ATOMIC_INCR = ("django.core.cache.backends.filebased.FileBasedCache",
+                   "django.core.cache.backends.db.DatabaseCache")
+
+
+@register()
+def check_shared_caches(app_configs, **kwargs):
+    """With several worker processes, the caches must not be per process."""
+    if getattr(settings, "POLLS_WORKERS", 1) <= 1:
+        return []
+    return [
+        Warning(f"The {alias!r} cache is local to each of the {settings.POLLS_WORKERS} "
+                f"worker processes, so {consequence}.",
+                hint="Use a cache shared between processes, e.g. FileBasedCache "
+                     "(the default for several workers) or Redis.",
+                id="polls.W001")
+        for alias, consequence in SHARED_ALIASES.items()
+        if settings.CACHES.get(alias, {}).get("BACKEND", "").endswith(".LocMemCache")
+    ]
+
+
+@register()
+def check_throttle_cache(app_configs, **kwargs):
+    """With several worker processes, throttle counters need an atomic incr()."""
+    if getattr(settings, "POLLS_WORKERS", 1) <= 1:
+        return []
+    alias = getattr(settings, "POLLS_LOGIN_THROTTLE_CACHE_ALIAS", "throttle")
+    if settings.CACHES.get(alias, {}).get("BACKEND") not in NON_ATOMIC_INCR:
+        return []
+    return [Warning(f"The {alias!r} cache does not increment atomically, so failed "
+                    "logins counted by two workers at once can be lost.",
+                    hint="Use polls.cache_backends.LockedFileBasedCache (the default "
+                         "for several workers), Redis or Memcached.",
+                    id="polls.W002")]
@@ -0,0 +1,82 @@
+"""
+This module answers conditional GETs of the polls pages.
+
+Their ETags are computed from the cache versions of the data they show
+(see polls/cache.py) instead of from the rendered content, so a client
+whose copy is current gets a 304 before any template is rendered or any
+choice is read: the index from the catalog version, the results from the
+question's results version plus the votes still buffered for it.
+"""
+
+import hashlib
+import time
+
+from django.conf import settings
+from django.utils.cache import get_conditional_response
+
+from .cache import catalog_cache, results_cache
+from .routers import reads_from_replica
+from .voting import pending_version
+
+# clients keep their copy but check it on every use
+REVALIDATE = "no-cache"
+# the same, for pages that greet the user by name
+PRIVATE_REVALIDATE = "private, no-cache"
+
+
+def enabled():
+    """Whether ETags are sent and checked (POLLS_CONDITIONAL_GET)."""
+    return getattr(settings, "POLLS_CONDITIONAL_GET", False)
+
+
+def etag(*parts):
+    """
+    Strong ETag over the versions a response is built from. What a lagging
+    replica returned may be older than those versions, so the tags of
+    replica reads also change every POLLS_REPLICA_STICKY_SECONDS.
+    """
+    if reads_from_replica():
+        window = max(settings.POLLS_REPLICA_STICKY_SECONDS, 1)
+        parts += ("replica", int(time.time() // window))
+    digest = hashlib.blake2b(":".join(map(str, parts)).encode(), digest_size=16)
+    return f'"{digest.hexdigest()}"'
+
+
+def page_etag(request, *parts):
+    """
+    ETag of an HTML page. Pages of signed-in users show their name and carry
+    their CSRF token, so both the user and the CSRF cookie are part of it.
+    """
+    if request.user.is_authenticated:
+        parts += (request.user.pk, request.META.get("CSRF_COOKIE", ""))
+    return etag(*parts)
+
+
+def index_version(now):
+    """Version of the poll listings as of `now` (see CatalogCache.validator)."""
+    return catalog_cache.validator(now)
+
+
+def results_version(question_id):
+    """Version of the results of a question, buffered votes included."""
+    return f"{results_cache.version(question_id)}:{pending_version(question_id)}"
+
+
+async def aresults_version(question_id):
+    """Async version of results_version()."""
+    return f"{await results_cache.aversion(question_id)}:{pending_version(question_id)}"
+
+
+def not_modified(request, tag, cache_control=PRIVATE_REVALIDATE):
+    """A 304 response if the client's copy has this ETag, else None."""
+    response = get_conditional_response(request, etag=tag)
+    if response is None:
+        return None
+    return revalidated(response, tag, cache_control)
+
+
+def revalidated(response, tag, cache_control=PRIVATE_REVALIDATE):
+    """Tag a response with its ETag and have clients revalidate it."""
+    response["ETag"] = tag
+    response["Cache-Control"] = cache_control
+    return response
@@ -0,0 +1,109 @@
+"""
+This module streams poll data out as CSV or JSONL.
+
+Rows are read in primary key order through iterator(chunk_size), so
+memory stays constant however many votes a poll has, and an export that
+was cut off can be resumed after the last id it wrote.
+"""
+
+import csv
+import json
+import zlib
+
+from .models import Choice, Vote
+
+DEFAULT_CHUNK_SIZE = 2000
+
+# kind -> (queryset, columns); the first column is the primary key
+KINDS = {
+    "votes": (lambda: Vote.objects.all(),
+              ("id", "question_id", "choice_id", "user_id")),
+    "tallies": (lambda: Choice.objects.all(),
+                ("id", "question_id", "question__question_text", "choice_text",
+                 "vote_count")),
+}
+FORMATS = ("csv", "jsonl")
+
+# column -> header in the output
+HEADERS = {
+    "question_id": "question",
+    "choice_id": "choice",
+    "user_id": "user",
+    "question__question_text": "question_text",
+    "vote_count": "votes",
+}
+
+
+def export_rows(kind, question_id=None, after=None, until=None,
+                chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Yield the rows of a kind ("votes" or "tallies") as tuples in id order,
+    optionally of one question and only ids in (after, until].
+    Raise ValueError for an unknown kind.
+    """
+    try:
+        queryset, columns = KINDS[kind]
+    except KeyError:
+        raise ValueError(f"Unknown export kind {kind!r}")
+    queryset = queryset()
+    if question_id is not None:
+        queryset = queryset.filter(question_id=question_id)
+    if after is not None:
+        queryset = queryset.filter(pk__gt=after)
+    if until is not None:
+        queryset = queryset.filter(pk__lte=until)
+    return queryset.order_by("pk").values_list(*columns).iterator(chunk_size=chunk_size)
+
+
+def header(kind):
+    """Column names of a kind."""
+    return [HEADERS.get(column, column) for column in KINDS[kind][1]]
+
+
+class Echo:
+    """File-like object whose write() returns the line, for csv.writer."""
+
+    def write(self, value):
+        return value
+
+
+def render(kind, rows, fmt):
+    """Yield the rows as text lines in a format ("csv" with a header, or "jsonl")."""
+    names = header(kind)
+    if fmt == "csv":
+        writer = csv.writer(Echo())
+        yield writer.writerow(names)
+        for row in rows:
+            yield writer.writerow(row)
+    else:
+        for row in rows:
+            yield json.dumps(dict(zip(names, row))) + "\n"
+
+
+def gzipped(lines, flush_size=64 * 1024):
+    """Compress lines on the fly; yield a gzip stream in blocks of about flush_size."""
+    compressor = zlib.compressobj(wbits=31)  # 31: gzip header and trailer
+    pending = 0
+    for line in lines:
+        data = line.encode()
+        pending += len(data)
+        block = compressor.compress(data)
+        if pending >= flush_size:
+            block += compressor.flush(zlib.Z_SYNC_FLUSH)
+            pending = 0
+        if block:
+            yield block
+    yield compressor.flush()
+
+
+def export(kind, fmt, compress=False, **filters):
+    """
+    Return the byte chunks of a whole export, see export_rows() for the filters.
+    Raise ValueError for an unknown kind or format.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown export format {fmt!r}")
+    lines = render(kind, export_rows(kind, **filters), fmt)
+    if compress:
+        return gzipped(lines)
+    return (line.encode() for line in lines)
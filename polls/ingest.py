@@ -0,0 +1,126 @@
+"""
+This module records many votes at once for kiosks and offline collection.
+
+Each chunk of (user, question, choice) items is validated with one IN
+query per table and written with one multi-row upsert, together with
+the choice tallies, in a single transaction.
+"""
+
+from collections import Counter
+
+from django.contrib.auth.models import User
+from django.db import transaction
+
+from .cache import results_cache
+from .models import Choice, Vote
+
+DEFAULT_CHUNK_SIZE = 1000
+
+CREATED = "created"
+UPDATED = "updated"
+UNCHANGED = "unchanged"
+INVALID = "invalid"
+
+
+def parse_item(item):
+    """
+    Return (user_id, question_id, choice_id) from a dict with
+    user/question/choice keys or from a 3-item list.
+    Raise ValueError if the item is malformed.
+    """
+    try:
+        if isinstance(item, dict):
+            values = (item["user"], item["question"], item["choice"])
+        else:
+            values = tuple(item)
+            if len(values) != 3:
+                raise ValueError
+        return tuple(int(value) for value in values)
+    except (KeyError, TypeError, ValueError):
+        raise ValueError("expected user, question and choice ids")
+
+
+def ingest_votes(items, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Record votes from an iterable of items and yield one result per item,
+    in order: {"status": created|updated|unchanged|invalid[, "error": ...]}.
+    Every chunk is committed in its own transaction.
+    """
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= chunk_size:
+            yield from _ingest_chunk(chunk)
+            chunk = []
+    if chunk:
+        yield from _ingest_chunk(chunk)
+
+
+def _ingest_chunk(chunk):
+    """Validate and write one chunk of votes; return its results."""
+    results = [None] * len(chunk)
+    parsed = {}
+    for index, item in enumerate(chunk):
+        try:
+            parsed[index] = parse_item(item)
+        except ValueError as error:
+            results[index] = {"status": INVALID, "error": str(error)}
+
+    user_ids = {user_id for user_id, _, _ in parsed.values()}
+    choice_ids = {choice_id for _, _, choice_id in parsed.values()}
+    known_users = set(User.objects.filter(pk__in=user_ids)
+                      .values_list("pk", flat=True))
+    choice_question = dict(Choice.objects.filter(pk__in=choice_ids)
+                           .values_list("pk", "question_id"))
+
+    valid = {}
+    for index, (user_id, question_id, choice_id) in parsed.items():
+        if user_id not in known_users:
+            results[index] = {"status": INVALID, "error": f"unknown user {user_id}"}
+        elif choice_question.get(choice_id) != question_id:
+            results[index] = {"status": INVALID,
+                              "error": f"choice {choice_id} is not in question {question_id}"}
+        else:
+            valid[index] = (user_id, question_id, choice_id)
+    if not valid:
+        return results
+
+    with transaction.atomic():
+        voters = {user_id for user_id, _, _ in valid.values()}
+        Vote.lock_voters(voters)
+        # current vote of every (user, question) pair in the chunk
+        current = {}
+        existing = (Vote.objects
+                    .filter(user_id__in=voters,
+                            question_id__in={q for _, q, _ in valid.values()})
+                    .values_list("user_id", "question_id", "choice_id"))
+        for user_id, question_id, choice_id in existing:
+            current[(user_id, question_id)] = choice_id
+
+        to_write = {}
+        tallies = Counter()
+        for index, (user_id, question_id, choice_id) in valid.items():
+            key = (user_id, question_id)
+            previous_choice_id = current.get(key)
+            if previous_choice_id == choice_id:
+                results[index] = {"status": UNCHANGED}
+                continue
+            if previous_choice_id is None:
+                results[index] = {"status": CREATED}
+            else:
+                tallies[previous_choice_id] -= 1
+                results[index] = {"status": UPDATED}
+            tallies[choice_id] += 1
+            current[key] = choice_id
+            to_write[key] = Vote(user_id=user_id, question_id=question_id,
+                                 choice_id=choice_id)
+
+        # new and changed votes in one INSERT ... ON CONFLICT DO UPDATE
+        Vote.objects.bulk_create(to_write.values(), update_conflicts=True,
+                                 unique_fields=["user", "question"],
+                                 update_fields=["choice"])
+        Choice.add_votes_many(tallies)
+        touched = {question_id for _, question_id in to_write}
+        transaction.on_commit(lambda: [results_cache.bump(question_id)
+                                       for question_id in touched])
+    return results
@@ -0,0 +1,210 @@
+"""
+This module measures the cost of each request to the polls views.
+
+InstrumentationMiddleware records, per URL name, the number of SQL
+queries, the time spent in the database, the template render time and
+the wall time into in-process histograms. render_prometheus() exposes
+them (with the results cache counters) in Prometheus text format.
+Set POLLS_INSTRUMENTATION = True to enable it; when it is off the
+middleware removes itself and costs nothing.
+"""
+
+import bisect
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+# upper bounds of the histogram buckets
+SECONDS_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+QUERIES_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 100)
+
+METRICS = {
+    # name: (help, buckets)
+    "polls_request_queries": ("SQL queries per request.", QUERIES_BUCKETS),
+    "polls_request_db_seconds": ("Time spent in the database per request.",
+                                 SECONDS_BUCKETS),
+    "polls_request_render_seconds": ("Template render time per request.",
+                                     SECONDS_BUCKETS),
+    "polls_request_seconds": ("Wall time per request.", SECONDS_BUCKETS),
+}
+
+
+class Histogram:
+    """A cumulative histogram with fixed bucket bounds, like Prometheus'."""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # the last one is +Inf
+        self.total = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        """Add one observation."""
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.total += 1
+        self.sum += value
+
+    def cumulative(self):
+        """Yield (upper bound, count of observations <= bound), ending with +Inf."""
+        running = 0
+        for bound, count in zip(self.buckets + ("+Inf",), self.counts):
+            running += count
+            yield bound, running
+
+
+class Registry:
+    """Histograms of every metric, per URL name."""
+
+    def __init__(self):
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def record(self, url_name, **values):
+        """Observe values (keyed by metric name) for a URL name."""
+        with self._lock:
+            for metric, value in values.items():
+                key = (metric, url_name)
+                if key not in self._histograms:
+                    self._histograms[key] = Histogram(METRICS[metric][1])
+                self._histograms[key].observe(value)
+
+    def histogram(self, metric, url_name):
+        """Return the histogram of a metric for a URL name, or None."""
+        return self._histograms.get((metric, url_name))
+
+    def clear(self):
+        """Forget every observation."""
+        with self._lock:
+            self._histograms.clear()
+
+    def render(self):
+        """Return every histogram in Prometheus text format."""
+        lines = []
+        with self._lock:
+            for metric, (help_text, _) in METRICS.items():
+                lines.append(f"# HELP {metric} {help_text}")
+                lines.append(f"# TYPE {metric} histogram")
+                for (name, url_name), histogram in sorted(self._histograms.items()):
+                    if name != metric:
+                        continue
+                    label = f'url_name="{url_name}"'
+                    for bound, count in histogram.cumulative():
+                        lines.append(f'{metric}_bucket{{{label},le="{bound}"}} {count}')
+                    lines.append(f"{metric}_sum{{{label}}} {histogram.sum}")
+                    lines.append(f"{metric}_count{{{label}}} {histogram.total}")
+        return lines
+
+
+registry = Registry()
+
+
+def pool_stats():
+    """Return {database alias: psycopg pool statistics} of the pooled databases."""
+    stats = {}
+    for alias in connections:
+        pool = getattr(connections[alias], "pool", None)
+        if pool is not None:
+            stats[alias] = pool.get_stats()
+    return stats
+
+
+def render_prometheus():
+    """Return the request histograms and cache and pool counters as Prometheus text."""
+    from .cache import results_cache
+
+    lines = registry.render()
+    for name, value in results_cache.stats().items():
+        kind = "gauge" if name == "size" else "counter"
+        metric = f"polls_results_cache_{name}" + ("_total" if kind == "counter" else "")
+        lines.append(f"# TYPE {metric} {kind}")
+        lines.append(f"{metric} {value}")
+    samples = {}
+    for alias, stats in pool_stats().items():
+        for name, value in stats.items():
+            samples.setdefault(name, []).append((alias, value))
+    for name, values in sorted(samples.items()):
+        # pool_* and requests_waiting are current levels, the rest count up
+        kind = "gauge" if name.startswith("pool_") or name == "requests_waiting" else "counter"
+        metric = f"polls_db_{name}" + ("_total" if kind == "counter" else "")
+        lines.append(f"# TYPE {metric} {kind}")
+        lines.extend(f'{metric}{{database="{alias}"}} {value}' for alias, value in values)
+    return "\n".join(lines) + "\n"
+
+
+class QueryTimer:
+    """Database execute wrapper counting queries and their time."""
+
+    def __init__(self):
+        self.queries = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.seconds += time.perf_counter() - start
+            self.queries += 1
+
+
+class InstrumentationMiddleware:
+    """
+    Record the cost of every request that resolves to a named URL.
+    Works in both sync and async mode, so the ASGI profile keeps its
+    async views on the event loop.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, "POLLS_INSTRUMENTATION", False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        with self.measure(request):
+            return self.get_response(request)
+
+    async def __acall__(self, request):
+        with self.measure(request):
+            return await self.get_response(request)
+
+    @contextmanager
+    def measure(self, request):
+        """Count the queries and time of the request, then record them."""
+        start = time.perf_counter()
+        timer = QueryTimer()
+        request.polls_render_seconds = 0.0
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(timer))
+            yield
+        match = request.resolver_match
+        if match is not None and match.url_name:
+            registry.record(match.view_name,
+                            polls_request_queries=timer.queries,
+                            polls_request_db_seconds=timer.seconds,
+                            polls_request_render_seconds=request.polls_render_seconds,
+                            polls_request_seconds=time.perf_counter() - start)
+
+    def process_template_response(self, request, response):
+        """
+        Render here to time it. Rendering is idempotent, so the handler
+        will not render again; list this middleware first in MIDDLEWARE
+        so every other process_template_response runs before it.
+        """
+        start = time.perf_counter()
+        response.render()
+        request.polls_render_seconds += time.perf_counter() - start
+        return response
@@ -0,0 +1,137 @@
+"""
+This module pushes live poll results to many watchers.
+
+All watchers of a question share one channel. Once per tick the channel
+checks the question's results version (a cache read) and only when it
+changed recomputes the results, once, whatever the number of votes or
+watchers. Each watcher then gets the choices whose tally changed.
+A watcher that is slow to read holds at most one merged delta, so memory
+per connection stays bounded by the number of choices.
+"""
+
+import asyncio
+import weakref
+
+from django.conf import settings
+
+from .cache import results_cache
+
+
+class Watcher:
+    """One subscriber: the merged changes it has not read yet."""
+
+    def __init__(self):
+        self.pending = {}
+        self.changed = asyncio.Event()
+
+    def push(self, delta):
+        """Merge a delta into the pending one; later tallies win."""
+        self.pending.update(delta)
+        self.changed.set()
+
+    async def next_delta(self, timeout=None):
+        """Wait for changes and return them, or None after timeout seconds."""
+        try:
+            await asyncio.wait_for(self.changed.wait(), timeout)
+        except asyncio.TimeoutError:
+            return None
+        self.changed.clear()
+        delta, self.pending = self.pending, {}
+        return delta
+
+
+class Channel:
+    """The watchers of one question and the task polling its results."""
+
+    def __init__(self, question_id, tick):
+        self.question_id = question_id
+        self.tick = tick
+        self.watchers = set()
+        self.version = None
+        self.results = None
+        self.ready = None
+        self.task = None
+
+    @staticmethod
+    def tallies(results):
+        """Flatten results into {"total_votes": n, "<choice id>": votes}."""
+        tallies = {str(choice["id"]): choice["votes"] for choice in results["choices"]}
+        tallies["total_votes"] = results["total_votes"]
+        return tallies
+
+    async def refresh(self):
+        """Recompute the results if their version changed; return the changes."""
+        version = await results_cache.aversion(self.question_id)
+        if version == self.version:
+            return {}
+        results = await results_cache.aget(self.question_id)
+        old = self.tallies(self.results) if self.results else {}
+        new = self.tallies(results)
+        self.version, self.results = version, results
+        return {key: value for key, value in new.items() if old.get(key) != value}
+
+    async def run(self):
+        """Poll once per tick and fan the changes out until nobody watches."""
+        while self.watchers:
+            await asyncio.sleep(self.tick)
+            try:
+                delta = await self.refresh()
+            except Exception:  # the question was deleted, or the database is away
+                continue
+            if delta:
+                for watcher in list(self.watchers):
+                    watcher.push(delta)
+
+
+class LiveResults:
+    """The channels of every watched question, per event loop."""
+
+    def __init__(self, tick=None):
+        self.tick = tick
+        self._channels = weakref.WeakKeyDictionary()
+
+    def channels(self):
+        """Channels of the running event loop, by question id."""
+        return self._channels.setdefault(asyncio.get_running_loop(), {})
+
+    async def subscribe(self, question_id):
+        """
+        Start watching a question; return (watcher, current results).
+        Raise Question.DoesNotExist if there is no such question.
+        """
+        channels = self.channels()
+        channel = channels.get(question_id)
+        if channel is None:
+            tick = self.tick if self.tick is not None else settings.POLLS_LIVE_TICK
+            channel = channels[question_id] = Channel(question_id, tick)
+            # watchers arriving meanwhile wait for the same first read
+            channel.ready = asyncio.ensure_future(channel.refresh())
+        try:
+            await asyncio.shield(channel.ready)
+        except Exception:
+            if channels.get(question_id) is channel:
+                del channels[question_id]
+            raise
+        watcher = Watcher()
+        channel.watchers.add(watcher)
+        if channel.task is None or channel.task.done():
+            channel.task = asyncio.ensure_future(channel.run())
+        return watcher, channel.results
+
+    def unsubscribe(self, question_id, watcher):
+        """Stop watching; the channel goes away with its last watcher."""
+        channels = self.channels()
+        channel = channels.get(question_id)
+        if channel is None:
+            return
+        channel.watchers.discard(watcher)
+        if not channel.watchers:
+            del channels[question_id]
+
+    def watcher_count(self, question_id):
+        """Number of watchers of a question in the running event loop."""
+        channel = self.channels().get(question_id)
+        return len(channel.watchers) if channel else 0
+
+
+live_results = LiveResults()
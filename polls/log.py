@@ -0,0 +1,111 @@
+"""
+This module logs polls events as JSON lines without blocking requests.
+
+log_event() attaches the event type and the ids involved to a record
+whose message is only formatted if a handler takes it. QueuedFileHandler
+puts records on a queue; a QueueListener thread formats them with
+JsonLineFormatter and writes them to a file rotated by size or by time,
+so a slow disk delays the log file rather than the response.
+"""
+
+import json
+import logging
+import queue
+from datetime import datetime, timezone
+from logging.handlers import (QueueHandler, QueueListener, RotatingFileHandler,
+                              TimedRotatingFileHandler)
+
+# record attribute -> JSON key of the event fields
+EVENT_FIELDS = {"event": "event", "user_id": "user", "question_id": "question",
+                "choice_id": "choice", "ip": "ip"}
+
+
+def get_client_ip(request):
+    """
+    Get the visitor’s IP address using request headers, for the log only:
+    the client can set X-Forwarded-For to anything (see throttle_ip()).
+    """
+    x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
+    if x_forwarded_for:
+        ip = x_forwarded_for.split(',')[0]
+    else:
+        ip = request.META.get('REMOTE_ADDR')
+    return ip
+
+
+def log_event(logger, level, event, message, *args, request=None, user=None,
+              question=None, choice=None, exc_info=False):
+    """
+    Log an event with %-style message arguments, formatted lazily.
+    user, question and choice may be objects or ids; the client IP is
+    taken from request.
+    """
+    if not logger.isEnabledFor(level):
+        return
+    extra = {"event": event,
+             "user_id": getattr(user, "pk", user),
+             "question_id": getattr(question, "pk", question),
+             "choice_id": getattr(choice, "pk", choice),
+             "ip": get_client_ip(request) if request is not None else None}
+    logger.log(level, message, *args, exc_info=exc_info, extra=extra)
+
+
+class JsonLineFormatter(logging.Formatter):
+    """Format a record as one JSON object per line, without empty fields."""
+
+    def format(self, record):
+        line = {"time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+                "level": record.levelname, "logger": record.name}
+        for attribute, key in EVENT_FIELDS.items():
+            value = getattr(record, attribute, None)
+            if value is not None:
+                line[key] = value
+        line["message"] = record.getMessage()
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            line["exc"] = record.exc_text
+        return json.dumps(line, default=str)
+
+
+class QueuedFileHandler(QueueHandler):
+    """
+    Queue records for a listener thread writing them to filename.
+    Files rotate at max_bytes, or at `when` (e.g. "midnight") if given,
+    keeping backup_count old files. Closing the handler drains the queue.
+    """
+
+    def __init__(self, filename, max_bytes=10 * 1024 * 1024, backup_count=5, when=None,
+                 encoding="utf-8"):
+        super().__init__(queue.SimpleQueue())
+        if when:
+            target = TimedRotatingFileHandler(filename, when=when, backupCount=backup_count,
+                                              encoding=encoding, delay=True)
+        else:
+            target = RotatingFileHandler(filename, maxBytes=max_bytes,
+                                         backupCount=backup_count, encoding=encoding,
+                                         delay=True)
+        self.target = target
+        self.listener = QueueListener(self.queue, target, respect_handler_level=False)
+        self.listener.start()
+
+    def setFormatter(self, fmt):
+        # the listener formats, with the formatter given in LOGGING
+        self.target.setFormatter(fmt)
+
+    def prepare(self, record):
+        """
+        Queue the record unformatted; only a traceback is rendered now,
+        while its frames are alive.
+        """
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def close(self):
+        if self.listener is not None:
+            self.listener.stop()
+            self.listener = None
+        self.target.close()
+        super().close()
@@ -0,0 +1,158 @@
+"""Benchmark the polls views against a synthetic dataset."""
+
+import json
+import os
+import platform
+import shutil
+import subprocess
+import tempfile
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import AsyncClient, override_settings
+
+from benchmarks import dataset, runner
+from benchmarks.scenarios import SCENARIOS
+
+
+class Command(BaseCommand):
+    help = ("Run benchmark scenarios against a throwaway test database "
+            "and print a JSON report of latency, throughput and queries.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("scenarios", nargs="*", metavar="scenario",
+                            help=f"Scenarios to run (default: all of {', '.join(SCENARIOS)}).")
+        parser.add_argument("--questions", type=int, default=100)
+        parser.add_argument("--choices", type=int, default=4,
+                            help="Choices per question.")
+        parser.add_argument("--users", type=int, default=1000)
+        parser.add_argument("--votes", type=int, default=10000)
+        parser.add_argument("--workers", type=int, default=4,
+                            help="Concurrent clients, one thread each.")
+        parser.add_argument("--requests", type=int, default=1000,
+                            help="Requests per scenario.")
+        parser.add_argument("--interface", choices=("wsgi", "asgi", "both"), default="wsgi",
+                            help="Drive the sync views through the WSGI handler, the "
+                                 "async views through the ASGI handler, or both.")
+        parser.add_argument("--connections", choices=("persistent", "per-request", "both"),
+                            default="persistent",
+                            help="Keep each client's database connection open, or close "
+                                 "it after every request (returned to the pool when "
+                                 "DATABASE_POOL is on), or run both (WSGI only).")
+        parser.add_argument("--session-profiles", nargs="+", metavar="PROFILE",
+                            choices=list(settings.POLLS_SESSION_PROFILES), default=[],
+                            help="Also run the scenarios under these session and message "
+                                 "storage profiles (WSGI only), e.g. db signed_cookies.")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--output", help="Write the JSON report to this file.")
+        parser.add_argument("--dump-fixtures", metavar="DIR",
+                            help="Also write the dataset as loaddata fixtures into DIR.")
+        parser.add_argument("--test-db-name",
+                            help="Name of the test database, e.g. a file for SQLite "
+                                 "(default: the backend's test database; for SQLite a "
+                                 "file in a temporary directory).")
+
+    def handle(self, *args, **options):
+        names = options["scenarios"] or list(SCENARIOS)
+        unknown = set(names) - set(SCENARIOS)
+        if unknown:
+            raise CommandError(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+        if options["workers"] > options["users"]:
+            raise CommandError("Need at least one user per worker.")
+        if settings.DEBUG:
+            self.stderr.write("DEBUG is on: expect slower, less realistic numbers.")
+
+        scratch = None
+        if (not options["test_db_name"] and connection.vendor == "sqlite"
+                and not connection.settings_dict["TEST"]["NAME"]):
+            # the in-memory test database locks whole tables: concurrent
+            # voters would fail with "database table is locked"
+            scratch = tempfile.mkdtemp(prefix="polls-benchmark-")
+            options["test_db_name"] = os.path.join(scratch, "benchmark.sqlite3")
+        if options["test_db_name"]:
+            connection.settings_dict["TEST"]["NAME"] = options["test_db_name"]
+        old_name = connection.settings_dict["NAME"]
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        # the test clients send Host: testserver
+        hosts = override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, "testserver"])
+        hosts.enable()
+        try:
+            report = {"meta": self.meta(options),
+                      "dataset": dataset.generate(options["questions"], options["choices"],
+                                                  options["users"], options["votes"],
+                                                  options["seed"]),
+                      "scenarios": {}}
+            if options["dump_fixtures"]:
+                dataset.dump_fixtures(options["dump_fixtures"])
+            if options["interface"] in ("wsgi", "both"):
+                workers = runner.make_workers(options["workers"], options["seed"])
+                if options["connections"] in ("persistent", "both"):
+                    for name in names:
+                        report["scenarios"][name] = runner.run(name, workers,
+                                                               options["requests"])
+                if options["connections"] in ("per-request", "both"):
+                    report["per_request_scenarios"] = {
+                        name: runner.run(name, workers, options["requests"], reconnect=True)
+                        for name in names}
+            for profile in options["session_profiles"]:
+                with override_settings(**settings.POLLS_SESSION_PROFILES[profile]):
+                    workers = runner.make_workers(options["workers"], options["seed"])
+                    report.setdefault("session_profiles", {})[profile] = {
+                        name: runner.run(name, workers, options["requests"])
+                        for name in names}
+            if options["interface"] in ("asgi", "both"):
+                report["asgi_scenarios"] = {}
+                workers = runner.make_workers(options["workers"], options["seed"],
+                                              AsyncClient)
+                for name in names:
+                    report["asgi_scenarios"][name] = runner.run_async(name, workers,
+                                                                      options["requests"])
+        finally:
+            hosts.disable()
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            if scratch is not None:
+                shutil.rmtree(scratch, ignore_errors=True)
+
+        self.warn_about_errors(report)
+
+        output = json.dumps(report, indent=2)
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8") as report_file:
+                report_file.write(output + "\n")
+        self.stdout.write(output)
+
+    def warn_about_errors(self, report):
+        """Name every run whose requests failed: its timings include the failures."""
+        for run, summary in self.runs(report):
+            if summary["errors"]:
+                self.stderr.write(self.style.ERROR(
+                    f"{run}: {summary['errors']} of {summary['requests']} requests "
+                    f"failed ({summary['error_rate']:.1%}); its latency and "
+                    "throughput include them."))
+
+    @staticmethod
+    def runs(report):
+        """(description, summary) of every scenario run in a report."""
+        for section in ("scenarios", "per_request_scenarios", "asgi_scenarios"):
+            for name, summary in report.get(section, {}).items():
+                yield f"{section} {name}", summary
+        for profile, scenarios in report.get("session_profiles", {}).items():
+            for name, summary in scenarios.items():
+                yield f"session_profiles {profile} {name}", summary
+
+    @staticmethod
+    def meta(options):
+        """Describe the run so reports of different commits can be compared."""
+        try:
+            revision = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True,
+                                      text=True, check=True).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            revision = None
+        return {"revision": revision, "python": platform.python_version(),
+                "database": connection.vendor,
+                "pool": bool(connection.settings_dict["OPTIONS"].get("pool")),
+                "connections": options["connections"], "interface": options["interface"],
+                "session_profile": settings.POLLS_SESSION_PROFILE,
+                "workers": options["workers"],
+                "requests": options["requests"]}
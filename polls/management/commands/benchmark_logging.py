@@ -0,0 +1,34 @@
+"""Measure what logging a vote costs the request thread, before and after queuing."""
+
+import json
+import platform
+
+from django.core.management.base import BaseCommand
+
+from benchmarks import log_overhead
+
+
+class Command(BaseCommand):
+    help = ("Log votes through the old synchronous file handler and through the "
+            "queued JSON lines handler, to a file with slow writes, and print a "
+            "JSON report of the time spent per logging call.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--records", type=int, default=2000,
+                            help="Votes to log with each setup.")
+        parser.add_argument("--delay-ms", type=float, default=1.0,
+                            help="Time every write to the log file takes.")
+        parser.add_argument("--output", help="Write the JSON report to this file.")
+
+    def handle(self, *args, **options):
+        delay = options["delay_ms"] / 1000
+        report = {"meta": {"python": platform.python_version(),
+                           "records": options["records"], "delay_ms": options["delay_ms"]}}
+        for setup in ("before", "after"):
+            report[setup] = log_overhead.measure(setup, options["records"], delay)
+
+        output = json.dumps(report, indent=2)
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8") as report_file:
+                report_file.write(output + "\n")
+        self.stdout.write(output)
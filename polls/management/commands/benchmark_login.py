@@ -0,0 +1,44 @@
+"""Measure the CPU a simulated login attack costs, with and without throttling."""
+
+import json
+import platform
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from benchmarks import dataset, login_attack
+
+
+class Command(BaseCommand):
+    help = ("Run simulated brute-force and credential-stuffing attacks against "
+            "a throwaway test database, with login throttling off and on, and "
+            "print a JSON report of the CPU time spent.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--attempts", type=int, default=100,
+                            help="Wrong guesses per attack.")
+        parser.add_argument("--output", help="Write the JSON report to this file.")
+
+    def handle(self, *args, **options):
+        old_name = connection.settings_dict["NAME"]
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            dataset.generate(questions=0, users=1, votes=0)
+            report = {"meta": {"python": platform.python_version(),
+                               "hasher": settings.PASSWORD_HASHERS[0],
+                               "max_per_username": settings.POLLS_LOGIN_FAILURES_PER_USERNAME,
+                               "max_per_ip": settings.POLLS_LOGIN_FAILURES_PER_IP},
+                      "attacks": {}}
+            for attack in login_attack.ATTACKS:
+                report["attacks"][attack] = {
+                    state: login_attack.run(attack, options["attempts"], throttle)
+                    for state, throttle in (("unthrottled", False), ("throttled", True))}
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        output = json.dumps(report, indent=2)
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8") as report_file:
+                report_file.write(output + "\n")
+        self.stdout.write(output)
@@ -0,0 +1,47 @@
+"""Stream votes or per-choice tallies out as CSV or JSONL."""
+
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from polls.export import DEFAULT_CHUNK_SIZE, FORMATS, KINDS, export
+
+
+class Command(BaseCommand):
+    help = ("Export raw votes or per-choice tallies as CSV or JSONL, in id order. "
+            "Resume a cut-off export with --after <last id written>.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("kind", choices=sorted(KINDS),
+                            help="votes (one row per vote) or tallies (one row per choice).")
+        parser.add_argument("--format", choices=FORMATS, default="csv")
+        parser.add_argument("--output", default="-",
+                            help="File to write, or - for standard output.")
+        parser.add_argument("--gzip", action="store_true",
+                            help="Compress the output with gzip.")
+        parser.add_argument("--question", type=int,
+                            help="Only export this question.")
+        parser.add_argument("--after", type=int,
+                            help="Only export rows with an id greater than this.")
+        parser.add_argument("--until", type=int,
+                            help="Only export rows with an id up to this one.")
+        parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE,
+                            help="Number of rows fetched from the database at a time.")
+
+    def handle(self, *args, **options):
+        path = options["output"]
+        try:
+            stream = sys.stdout.buffer if path == "-" else open(path, "wb")
+        except OSError as error:
+            raise CommandError(error)
+        chunks = export(options["kind"], options["format"], compress=options["gzip"],
+                        question_id=options["question"], after=options["after"],
+                        until=options["until"], chunk_size=options["chunk_size"])
+        try:
+            for chunk in chunks:
+                stream.write(chunk)
+        finally:
+            if stream is not sys.stdout.buffer:
+                stream.close()
+            else:
+                stream.flush()
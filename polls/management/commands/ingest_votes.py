@@ -0,0 +1,47 @@
+"""Record votes in bulk from a JSONL file."""
+
+import json
+import sys
+from collections import Counter
+
+from django.core.management.base import BaseCommand, CommandError
+
+from polls.ingest import DEFAULT_CHUNK_SIZE, INVALID, ingest_votes
+
+
+class Command(BaseCommand):
+    help = ("Record votes from JSONL, one {\"user\": id, \"question\": id, "
+            "\"choice\": id} object per line.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", nargs="?", default="-",
+                            help="JSONL file to read, or - for standard input.")
+        parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE,
+                            help="Number of votes committed per transaction.")
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        try:
+            stream = sys.stdin if path == "-" else open(path, encoding="utf-8")
+        except OSError as error:
+            raise CommandError(error)
+        with stream:
+            totals = Counter()
+            for number, result in enumerate(
+                    ingest_votes(self.read_items(stream), options["chunk_size"]), 1):
+                totals[result["status"]] += 1
+                if result["status"] == INVALID:
+                    self.stderr.write(f"vote {number}: {result['error']}")
+        summary = ", ".join(f"{count} {status}" for status, count in sorted(totals.items()))
+        self.stdout.write(self.style.SUCCESS(f"Ingested votes: {summary or 'none'}."))
+
+    @staticmethod
+    def read_items(stream):
+        """Yield one item per non-blank line; undecodable lines become invalid items."""
+        for line in stream:
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                yield None
@@ -0,0 +1,45 @@
+"""Load polls, users and votes from large fixture files."""
+
+from io import StringIO
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, IntegrityError
+
+from polls.cache import catalog_cache, results_cache
+from polls.loader import DEFAULT_BATCH_SIZE, FORMATS, load
+
+
+class Command(BaseCommand):
+    help = ("Load loaddata-style fixtures (JSON arrays, JSONL or single-model CSV) "
+            "with bulk inserts, then rebuild the vote tallies.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("paths", nargs="+", help="Fixture files, loaded in order.")
+        parser.add_argument("--format", choices=FORMATS,
+                            help="Format of every file (default: by file extension).")
+        parser.add_argument("--model",
+                            help="Model of the rows of CSV files, e.g. polls.vote.")
+        parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE,
+                            help="Number of rows per INSERT batch.")
+        parser.add_argument("--workers", type=int,
+                            help="Processes hashing plain-text passwords "
+                                 "(default: one per CPU).")
+        parser.add_argument("--keep-indexes", action="store_true",
+                            help="Keep the secondary indexes while loading.")
+        parser.add_argument("--database", default="default")
+
+    def handle(self, *args, **options):
+        try:
+            counts = load(options["paths"], fmt=options["format"], model=options["model"],
+                          batch_size=options["batch_size"], workers=options["workers"],
+                          keep_indexes=options["keep_indexes"],
+                          using=options["database"])
+        except (OSError, ValueError, LookupError, IntegrityError, DatabaseError) as error:
+            raise CommandError(error)
+        call_command("reconcile_votes", stdout=StringIO())
+        # bulk inserts send no signals
+        results_cache.clear()
+        catalog_cache.bump()
+        summary = ", ".join(f"{count} {label}" for label, count in counts.items())
+        self.stdout.write(self.style.SUCCESS(f"Loaded {summary or 'nothing'}."))
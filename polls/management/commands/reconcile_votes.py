@@ -0,0 +1,37 @@
+"""Rebuild the per-choice vote tallies from the polls_vote table."""
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+
+from polls.models import Choice, Vote, bump_results_on_commit
+
+
+class Command(BaseCommand):
+    help = "Rebuild Choice.vote_count from the Vote table in one grouped pass."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000,
+                            help="Number of choices written per UPDATE batch.")
+
+    def handle(self, *args, **options):
+        changed = []
+        with transaction.atomic():
+            # lock the tallies before counting: a vote committing in between
+            # waits for the rebuilt tally instead of having its +1 overwritten
+            choices = list(Choice.objects.select_for_update()
+                           .only("id", "question_id", "vote_count"))
+            # one GROUP BY over polls_vote gives every non-zero tally
+            counted = dict(Vote.objects.values("choice")
+                           .annotate(total=Count("id"))
+                           .values_list("choice", "total"))
+            for choice in choices:
+                total = counted.get(choice.pk, 0)
+                if choice.vote_count != total:
+                    choice.vote_count = total
+                    changed.append(choice)
+            Choice.objects.bulk_update(changed, ["vote_count"],
+                                       batch_size=options["batch_size"])
+            bump_results_on_commit(choice.question_id for choice in changed)
+        self.stdout.write(self.style.SUCCESS(
+            f"Reconciled {len(changed)} choice tallies."))
@@ -0,0 +1,71 @@
+"""Stress the vote path of SQLite with concurrent voting processes."""
+
+import json
+import os
+import platform
+import tempfile
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import override_settings
+
+from benchmarks import dataset, stress
+
+
+class Command(BaseCommand):
+    help = ("Vote from many processes at once into a throwaway SQLite file, "
+            "plain and with the production profile, and print a JSON report "
+            "of lock errors and votes per second.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--processes", type=int, default=8,
+                            help="Concurrent voting processes.")
+        parser.add_argument("--votes", type=int, default=200,
+                            help="Votes per process.")
+        parser.add_argument("--questions", type=int, default=20)
+        parser.add_argument("--choices", type=int, default=4,
+                            help="Choices per question.")
+        parser.add_argument("--profile", choices=(*stress.PROFILES, "both"), default="both")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--output", help="Write the JSON report to this file.")
+
+    def handle(self, *args, **options):
+        if connection.vendor != "sqlite":
+            raise CommandError("stress_votes measures SQLite locking; "
+                               f"the database is {connection.vendor}.")
+        if options["processes"] < 1:
+            raise CommandError("Need at least one process.")
+        profiles = stress.PROFILES if options["profile"] == "both" else [options["profile"]]
+
+        directory = tempfile.TemporaryDirectory()
+        old_name = connection.settings_dict["NAME"]
+        old_options = connection.settings_dict["OPTIONS"]
+        connection.settings_dict["TEST"]["NAME"] = os.path.join(directory.name, "stress.sqlite3")
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        # the test clients send Host: testserver
+        hosts = override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, "testserver"])
+        hosts.enable()
+        try:
+            report = {"meta": {"python": platform.python_version(),
+                               "processes": options["processes"],
+                               "votes_per_process": options["votes"],
+                               "retries": settings.POLLS_VOTE_RETRIES},
+                      "dataset": dataset.generate(options["questions"], options["choices"],
+                                                  users=options["processes"], votes=0,
+                                                  seed=options["seed"]),
+                      "profiles": {}}
+            for profile in profiles:
+                report["profiles"][profile] = stress.run(profile, options["processes"],
+                                                         options["votes"], options["seed"])
+        finally:
+            hosts.disable()
+            connection.settings_dict["OPTIONS"] = old_options
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            directory.cleanup()
+
+        output = json.dumps(report, indent=2)
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8") as report_file:
+                report_file.write(output + "\n")
+        self.stdout.write(output)
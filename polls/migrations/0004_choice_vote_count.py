@@ -0,0 +1,33 @@
+# Generated by Django 5.1 on 2026-10-18 02:27
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def count_existing_votes(apps, schema_editor):
+    """Fill the new tally column from the votes already recorded."""
+    Choice = apps.get_model("polls", "Choice")
+    Vote = apps.get_model("polls", "Vote")
+    counted = (Vote.objects.values("choice")
+               .annotate(total=Count("id"))
+               .values_list("choice", "total"))
+    choices = []
+    for choice_id, total in counted:
+        choices.append(Choice(pk=choice_id, vote_count=total))
+    Choice.objects.bulk_update(choices, ["vote_count"], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('polls', '0003_remove_choice_votes_vote'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='choice',
+            name='vote_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(count_existing_votes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.1 on 2026-10-18 03:05
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Max, OuterRef, Subquery
+
+
+def fill_question_and_deduplicate(apps, schema_editor):
+    """
+    Copy each vote's question from its choice, keep only the latest vote
+    of every (user, question) pair and recount the choice tallies.
+    """
+    Choice = apps.get_model("polls", "Choice")
+    Vote = apps.get_model("polls", "Vote")
+    Vote.objects.update(question_id=Subquery(
+        Choice.objects.filter(pk=OuterRef("choice_id")).values("question_id")[:1]))
+    latest = (Vote.objects.values("user", "question")
+              .annotate(last=Max("id")).values("last"))
+    Vote.objects.exclude(pk__in=Subquery(latest)).delete()
+    counted = dict(Vote.objects.values("choice")
+                   .annotate(total=Count("id"))
+                   .values_list("choice", "total"))
+    choices = []
+    for choice in Choice.objects.only("id", "vote_count"):
+        if choice.vote_count != counted.get(choice.pk, 0):
+            choice.vote_count = counted.get(choice.pk, 0)
+            choices.append(choice)
+    Choice.objects.bulk_update(choices, ["vote_count"], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('polls', '0004_choice_vote_count'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='vote',
+            name='question',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE,
+                                    to='polls.question'),
+        ),
+        migrations.RunPython(fill_question_and_deduplicate, migrations.RunPython.noop),
+    ]
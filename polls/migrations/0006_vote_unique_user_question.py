@@ -0,0 +1,29 @@
+# Generated by Django 5.1 on 2026-10-18 03:05
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # separate from 0005 so PostgreSQL does not alter polls_vote
+    # while the data migration's row updates are still pending
+
+    dependencies = [
+        ('polls', '0005_vote_question'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='vote',
+            name='question',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE,
+                                    to='polls.question'),
+        ),
+        migrations.AddConstraint(
+            model_name='vote',
+            constraint=models.UniqueConstraint(fields=('user', 'question'),
+                                               name='unique_vote_per_user_question'),
+        ),
+    ]
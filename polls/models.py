@@ -4,11 +4,85 @@ This module contains the models: Question and Choice for the polls application.
 
 import datetime
 
-from django.db import models
+from django.db import models, transaction
+from django.db.models import (BooleanField, CharField, F, Case, When, Value,
+                              Count, OuterRef, Q, Subquery)
+from django.db.models.functions import Greatest
+from django.db.models.signals import pre_delete
+from django.dispatch import receiver
 from django.utils import timezone
 from django.contrib.auth.models import User
 
 
+# statuses of a question, see QuestionQuerySet.with_status()
+SCHEDULED = "scheduled"
+OPEN = "open"
+CLOSED = "closed"
+
+
+class QuestionQuerySet(models.QuerySet):
+    """
+    Question status in SQL. A question is scheduled before its pub_date,
+    open from pub_date up to and including end_date (forever without one)
+    and closed after. Every method takes the time to evaluate against, so
+    a request reads the clock once; it defaults to now.
+    """
+
+    @staticmethod
+    def _open_q(now):
+        return Q(end_date__isnull=True) | Q(end_date__gte=now)
+
+    def published(self, now=None):
+        """Questions published at `now` (open or closed)."""
+        return self.filter(pub_date__lte=now or timezone.now())
+
+    def scheduled(self, now=None):
+        """Questions not published yet at `now`."""
+        return self.filter(pub_date__gt=now or timezone.now())
+
+    def open(self, now=None):
+        """Questions that can be voted on at `now`."""
+        now = now or timezone.now()
+        return self.published(now).filter(self._open_q(now))
+
+    def closed(self, now=None):
+        """Published questions whose voting ended before `now`."""
+        now = now or timezone.now()
+        return self.published(now).exclude(self._open_q(now))
+
+    def with_status(self, now=None):
+        """Annotate status (scheduled/open/closed) and is_open at `now`."""
+        now = now or timezone.now()
+        return self.annotate(
+            status=Case(When(pub_date__gt=now, then=Value(SCHEDULED)),
+                        When(self._open_q(now), then=Value(OPEN)),
+                        default=Value(CLOSED), output_field=CharField()),
+            is_open=Case(When(Q(pub_date__lte=now) & self._open_q(now), then=Value(True)),
+                         default=Value(False), output_field=BooleanField()))
+
+    def with_vote(self, user_id):
+        """Annotate voted_choice, the id of the user's choice (or None)."""
+        my_vote = Vote.objects.filter(user_id=user_id, question_id=OuterRef("pk"))
+        return self.annotate(voted_choice=Subquery(my_vote.values("choice_id")[:1]))
+
+    def next_transition(self, now=None):
+        """
+        Return the first time after `now` at which one of the questions
+        opens or closes, or None if none ever will. Pages listing them
+        can be cached until then.
+        """
+        now = now or timezone.now()
+        # two index seeks (pub_date, end_date) rather than one scan
+        opens = (self.filter(pub_date__gt=now).order_by("pub_date")
+                 .values_list("pub_date", flat=True).first())
+        closes = (self.filter(end_date__gte=now).order_by("end_date")
+                  .values_list("end_date", flat=True).first())
+        if closes is not None:
+            # voting is allowed up to and including end_date
+            closes += datetime.timedelta(microseconds=1)
+        return min(filter(None, (opens, closes)), default=None)
+
+
 class Question(models.Model):
     """Question Model has two attributes:
     question_text, pub_date and end_date"""
@@ -16,32 +90,52 @@ class Question(models.Model):
     pub_date = models.DateTimeField("date published", default=timezone.now)
     end_date = models.DateTimeField("end date", null=True, blank=True)
 
-    def is_published(self):
+    objects = QuestionQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # newest-first listing of published questions (IndexView)
+            models.Index(fields=["-pub_date", "-id"], name="question_pub_date_idx"),
+            # open/closed filtering by end date
+            models.Index(fields=["end_date", "pub_date"], name="question_end_date_idx"),
+        ]
+
+    def get_status(self, now=None):
         """
-        Returns True if the current date-time is on
-        or after question’s publication date by using local date/time.
+        Return the status (scheduled, open or closed) at `now`,
+        the one annotated by with_status() if the question has it.
         """
-        return timezone.localtime(timezone.now()) >= self.pub_date
+        if now is None and "status" in self.__dict__:
+            return self.status
+        now = now or timezone.now()
+        if now < self.pub_date:
+            return SCHEDULED
+        if self.end_date is None or now <= self.end_date:
+            return OPEN
+        return CLOSED
 
-    def can_vote(self):
+    def is_published(self, now=None):
+        """
+        Returns True if the current date-time (or `now`) is on
+        or after question’s publication date.
+        """
+        return self.get_status(now) != SCHEDULED
+
+    def can_vote(self, now=None):
         """
         Returns True if voting is allowed for this question.
         That means, the current date/time is between the pub_date and end_date.
         If end_date is null then can vote anytime after pub_date.
         """
-        if self.end_date is not None:
-            return (self.pub_date <= timezone.now() <= self.end_date
-                    and self.is_published())
-        # can vote anytime
-        return self.end_date is None and self.is_published()
+        return self.get_status(now) == OPEN
 
-    def was_published_recently(self):
+    def was_published_recently(self, now=None):
         """
         Check whether the publication date is within 24 hrs
         Return Boolean
         """
-        return (timezone.now() - datetime.timedelta(days=1) <=
-                self.pub_date <= timezone.now())
+        now = now or timezone.now()
+        return now - datetime.timedelta(days=1) <= self.pub_date <= now
 
     def __str__(self):
         """Return string representation of Question's model"""
@@ -52,24 +146,141 @@ class Choice(models.Model):
     """Choice model has three attributes: question, choice_text, and votes"""
     question = models.ForeignKey(Question, on_delete=models.CASCADE)
     choice_text = models.CharField(max_length=200)
-    # votes = models.IntegerField(default=0)
+    # maintained tally of Vote rows, kept in step by add_votes_many()
+    # and rebuilt from polls_vote by `manage.py reconcile_votes`
+    vote_count = models.PositiveIntegerField(default=0)
 
     @property
     def votes(self):
         """returns the votes of the choice"""
-        # self.vote_set.count() or
-        return self.vote_set.all().count()
+        return self.vote_count
+
+    @staticmethod
+    def add_votes_many(deltas):
+        """
+        Apply a {choice_id: delta} mapping to the tallies in one UPDATE.
+        Zero deltas are skipped, and no tally goes below 0.
+        """
+        deltas = {choice_id: delta for choice_id, delta in deltas.items() if delta}
+        if not deltas:
+            return
+        change = Case(*[When(pk=choice_id, then=Value(delta))
+                        for choice_id, delta in deltas.items()],
+                      default=Value(0))
+        Choice.objects.filter(pk__in=deltas).update(
+            vote_count=Greatest(F("vote_count") + change, Value(0)))
 
     def __str__(self):
         """Return string representation of Choice's model"""
         return str(self.choice_text) if self.choice_text is not None else ''
 
 
+def bump_results_on_commit(question_ids, using=None):
+    """
+    Have the cached results of the questions recomputed once the current
+    transaction commits, for tallies changed without record_vote().
+    """
+    from .cache import results_cache  # it imports the models
+
+    question_ids = set(question_ids)
+    transaction.on_commit(lambda: [results_cache.bump(question_id)
+                                   for question_id in question_ids], using=using)
+
+
+class VoteQuerySet(models.QuerySet):
+    """Votes, deleted together with their count in the choice tallies."""
+
+    def discount(self):
+        """Take the votes off their choices' tallies with one grouped UPDATE."""
+        counts = list(self.order_by().values("question_id", "choice_id")
+                      .annotate(votes=Count("id")))
+        Choice.add_votes_many({row["choice_id"]: -row["votes"] for row in counts})
+        bump_results_on_commit({row["question_id"] for row in counts}, using=self.db)
+
+    def delete(self):
+        """Delete the votes and discount them in the same transaction."""
+        with transaction.atomic(using=self.db):
+            self.discount()
+            return super().delete()
+
+
 class Vote(models.Model):
     """A vote by a user for a choice in a poll"""
     choice = models.ForeignKey(Choice, on_delete=models.CASCADE)
+    # copy of choice.question so the database can enforce
+    # one vote per user per question
+    question = models.ForeignKey(Question, on_delete=models.CASCADE)
     user = models.ForeignKey(User, on_delete=models.CASCADE)
 
+    objects = VoteQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            # also serves the (user, question) lookups of the vote and detail views
+            models.UniqueConstraint(fields=["user", "question"],
+                                    name="unique_vote_per_user_question"),
+        ]
+        indexes = [
+            # per-question tallies grouped by choice without touching the table
+            models.Index(fields=["question", "choice"], name="vote_question_choice_idx"),
+        ]
+
+    def save(self, *args, **kwargs):
+        """Fill in the question from the choice before saving."""
+        if self.question_id is None:
+            self.question_id = self.choice.question_id
+        super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        """Delete the vote and take it off its choice's tally."""
+        with transaction.atomic(using=kwargs.get("using")):
+            Choice.add_votes_many({self.choice_id: -1})
+            bump_results_on_commit([self.question_id], using=kwargs.get("using"))
+            return super().delete(*args, **kwargs)
+
+    @staticmethod
+    def lock_voters(user_ids):
+        """
+        Lock the rows of the voting users until the transaction ends, so
+        concurrent votes of a user are counted one after the other. Their
+        vote rows cannot serve as the lock: a first vote has none yet.
+        """
+        list(User.objects.select_for_update().filter(pk__in=user_ids)
+             .order_by("pk").values_list("pk", flat=True))
+
+    @staticmethod
+    def locked_choice(user_id, question_id):
+        """
+        Return the id of the choice the user voted for in a question
+        (or None), locking the user's row like lock_voters() in the same query.
+        """
+        vote = Vote.objects.filter(user_id=user_id, question_id=question_id)
+        return (User.objects.select_for_update().filter(pk=user_id)
+                .values_list(Subquery(vote.values("choice_id")[:1]), flat=True)
+                .first())
+
+    @staticmethod
+    def upsert(user_id, question_id, choice_id):
+        """
+        Record the user's choice for a question with a single
+        INSERT ... ON CONFLICT (user, question) DO UPDATE statement.
+        """
+        Vote.objects.bulk_create(
+            [Vote(user_id=user_id, question_id=question_id, choice_id=choice_id)],
+            update_conflicts=True,
+            unique_fields=["user", "question"],
+            update_fields=["choice"],
+        )
+
     def __str__(self):
         """Return string representation of Vote's model"""
         return f'{self.user.username} voted for {self.choice.choice_text}'
+
+
+# No signal receivers on Vote: they would keep Django from deleting the
+# votes of a question, choice or user in one DELETE. Votes deleted with their
+# question or choice need no discount, the tallies go with the choices.
+@receiver(pre_delete, sender=User)
+def discount_deleted_user_votes(sender, instance, **kwargs):
+    """Take the votes of a user about to be deleted off the tallies."""
+    Vote.objects.filter(user_id=instance.pk).discount()
@@ -0,0 +1,63 @@
+"""
+This module pages through questions by keyset (pub_date, id).
+
+A page starts right after the last question of the previous page, so
+fetching any page costs one index range read however deep it is.
+The position is handed to the client as an opaque cursor token.
+"""
+
+import base64
+import datetime
+
+from django.db.models import Q
+
+
+def encode_cursor(question):
+    """Return the cursor token pointing just after this question."""
+    raw = f"{question.pub_date.isoformat()}|{question.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(token):
+    """
+    Return the (pub_date, id) position encoded in a cursor token.
+    Raise ValueError if the token is malformed.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)).decode()
+        pub_date, question_id = raw.split("|")
+        return datetime.datetime.fromisoformat(pub_date), int(question_id)
+    except (ValueError, UnicodeDecodeError) as error:
+        raise ValueError(f"Invalid cursor {token!r}") from error
+
+
+def keyset_page(queryset, cursor=None, size=20):
+    """
+    Return (questions, next_cursor) for the page of a newest-first
+    queryset that starts after the cursor; next_cursor is None on the last page.
+    """
+    return _split_page(list(_page_query(queryset, cursor, size)), size)
+
+
+async def akeyset_page(queryset, cursor=None, size=20):
+    """Async version of keyset_page(), using the async ORM."""
+    return _split_page([question async for question in _page_query(queryset, cursor, size)],
+                       size)
+
+
+def _page_query(queryset, cursor, size):
+    """The questions of the page plus one more."""
+    queryset = queryset.order_by("-pub_date", "-id")
+    if cursor:
+        pub_date, question_id = decode_cursor(cursor)
+        queryset = queryset.filter(Q(pub_date__lt=pub_date)
+                                   | Q(pub_date=pub_date, id__lt=question_id))
+    # one extra row tells whether another page follows
+    return queryset[:size + 1]
+
+
+def _split_page(questions, size):
+    """Return (page, next_cursor) from the fetched questions."""
+    if len(questions) > size:
+        return questions[:size], encode_cursor(questions[size - 1])
+    return questions, None
@@ -0,0 +1,56 @@
+"""
+This module builds the results of a poll: the question and
+the tally of each of its choices, read in a single query.
+"""
+
+from .models import Question
+
+
+def question_results(question_id):
+    """
+    Return the results of a question as plain data:
+    {"id", "question_text", "total_votes", "choices": [{"id", "choice_text", "votes"}]}.
+
+    The question is LEFT JOINed to its choices so one round trip
+    returns everything, even for a question without choices.
+    Raise Question.DoesNotExist if there is no such question.
+    """
+    results = None
+    for row in _results_rows(question_id):
+        results = _add_row(results, question_id, row)
+    if results is None:
+        raise Question.DoesNotExist(f"Question {question_id} does not exist")
+    return results
+
+
+async def aquestion_results(question_id):
+    """Async version of question_results(), using the async ORM."""
+    results = None
+    async for row in _results_rows(question_id):
+        results = _add_row(results, question_id, row)
+    if results is None:
+        raise Question.DoesNotExist(f"Question {question_id} does not exist")
+    return results
+
+
+def _results_rows(question_id):
+    """The question LEFT JOINed to its choices, one row per choice."""
+    return (Question.objects.filter(pk=question_id)
+            .values_list("question_text", "choice__id",
+                         "choice__choice_text", "choice__vote_count")
+            .order_by("choice__id"))
+
+
+def _add_row(results, question_id, row):
+    """Add one joined row to the results (created on the first row)."""
+    question_text, choice_id, choice_text, votes = row
+    if results is None:
+        results = {"id": question_id, "question_text": question_text,
+                   "total_votes": 0, "choices": []}
+    if choice_id is None:
+        # question exists but has no choices
+        return results
+    results["choices"].append({"id": choice_id, "choice_text": choice_text,
+                               "votes": votes})
+    results["total_votes"] += votes
+    return results
@@ -0,0 +1,137 @@
+"""
+This module sends polls reads to read replicas and writes to the primary.
+
+Only requests read from replicas: migrations, management commands and
+other code outside a request keep using the primary. Replicas lag
+behind the primary, so a client that has just written
+(e.g. voted) keeps reading from the primary for POLLS_REPLICA_STICKY_SECONDS:
+ReadYourWritesMiddleware gives it a signed cookie after any successful
+POST, and pins every query of an unsafe request or of a request carrying
+a valid cookie to the primary.
+"""
+
+import random
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core import signing
+from django.core.exceptions import MiddlewareNotUsed
+
+PRIMARY = "default"
+COOKIE_NAME = "polls_primary"
+COOKIE_SALT = "polls.routers"
+
+# set per request by ReadYourWritesMiddleware
+_pinned = ContextVar("polls_pinned_to_primary", default=True)
+
+
+def replicas():
+    """Aliases of the read replicas, empty when there are none."""
+    return getattr(settings, "POLLS_READ_REPLICAS", ())
+
+
+def reads_from_replica():
+    """Whether polls reads of the current request may go to a replica."""
+    return bool(replicas()) and not _pinned.get()
+
+
+def bounded_timeout(timeout):
+    """
+    Cache timeout for data read by the current request. What a lagging
+    replica returns may be older than the cache version it is stored under,
+    so it is kept no longer than the sticky window.
+    """
+    if not reads_from_replica():
+        return timeout
+    window = settings.POLLS_REPLICA_STICKY_SECONDS
+    return window if timeout is None else min(timeout, window)
+
+
+class ReadReplicaRouter:
+    """
+    Route reads of polls models to a random replica, unless the
+    current request is pinned to the primary, and every write to the primary.
+    Other apps (auth, sessions, admin) only use the primary.
+    """
+
+    route_app_labels = {"polls"}
+
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label in self.route_app_labels and reads_from_replica():
+            return random.choice(replicas())
+        return PRIMARY
+
+    def db_for_write(self, model, **hints):
+        # also for objects read from a replica, which would be saved there
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {PRIMARY, *replicas()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+
+class ReadYourWritesMiddleware:
+    """
+    Pin the queries of writers to the primary, see the module docstring.
+    Without replicas it removes itself; it works in sync and async mode, so
+    the ASGI profile keeps its async views on the event loop.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not replicas():
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        token = self.pin(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            _pinned.reset(token)
+        return self.stick(request, response)
+
+    async def __acall__(self, request):
+        token = self.pin(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _pinned.reset(token)
+        return self.stick(request, response)
+
+    def pin(self, request):
+        """Pin the request to the primary if it writes or its client just wrote."""
+        return _pinned.set(self.is_unsafe(request) or self.is_sticky(request))
+
+    def stick(self, request, response):
+        """Keep a client that wrote successfully on the primary for a while."""
+        if self.is_unsafe(request) and response.status_code < 400:
+            response.set_signed_cookie(COOKIE_NAME, "1", salt=COOKIE_SALT,
+                                       max_age=settings.POLLS_REPLICA_STICKY_SECONDS,
+                                       httponly=True, samesite="Lax")
+        return response
+
+    @staticmethod
+    def is_unsafe(request):
+        """Whether the request may write."""
+        return request.method not in ("GET", "HEAD", "OPTIONS")
+
+    @staticmethod
+    def is_sticky(request):
+        """Whether the client wrote within the last POLLS_REPLICA_STICKY_SECONDS."""
+        try:
+            request.get_signed_cookie(COOKIE_NAME, salt=COOKIE_SALT,
+                                      max_age=settings.POLLS_REPLICA_STICKY_SECONDS)
+        except (KeyError, signing.BadSignature):
+            return False
+        return True
@@ -0,0 +1,59 @@
+"""
+This module holds the static files storage of the production profile.
+
+CompressedManifestStaticFilesStorage names every file after a hash of its
+content like ManifestStaticFilesStorage, and writes a .gz variant (and a
+.br one when the brotli package is installed) of the text files next to
+it at collectstatic time, so they can be served compressed without
+compressing them per request (see polls/assets.py).
+"""
+
+import gzip
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files.base import ContentFile
+
+try:
+    import brotli
+except ImportError:  # optional: pip install brotli
+    brotli = None
+
+# files worth compressing; images and fonts are compressed already
+COMPRESSIBLE = (".css", ".js", ".mjs", ".map", ".svg", ".txt", ".html", ".json", ".xml")
+# smaller files are not worth a separate variant
+MIN_SIZE = 256
+
+ENCODINGS = {"br": ".br", "gzip": ".gz"}
+
+
+def compress(content, encoding):
+    """Content compressed with an encoding of ENCODINGS."""
+    if encoding == "br":
+        return brotli.compress(content, mode=brotli.MODE_TEXT)
+    return gzip.compress(content, compresslevel=9, mtime=0)
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """Hashed file names plus precompressed variants of the hashed files."""
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+        encodings = [encoding for encoding in ENCODINGS if encoding != "br" or brotli]
+        for name in self.hashed_files.values():
+            if not name.endswith(COMPRESSIBLE):
+                continue
+            with self.open(name) as original:
+                content = original.read()
+            if len(content) < MIN_SIZE:
+                continue
+            for encoding in encodings:
+                compressed = compress(content, encoding)
+                if len(compressed) >= len(content):
+                    continue
+                variant = name + ENCODINGS[encoding]
+                if self.exists(variant):
+                    self.delete(variant)
+                self._save(variant, ContentFile(compressed))
+                yield name, variant, True
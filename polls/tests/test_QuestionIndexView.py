@@ -4,15 +4,21 @@ This module contains Unittests for the polls application Index view.
 
 import datetime
 
-from django.test import TestCase
+from django.test import TestCase, override_settings
 from django.utils import timezone
 from django.urls import reverse
 
-from polls.models import Question
+from polls.cache import catalog_cache
+from polls.models import Question, User
 
 
 class QuestionIndexViewTests(TestCase):
     """Test to check the poll with client environment (no record yet)"""
+
+    def setUp(self):
+        """Rows rolled back by other tests sent no signal, so start a new catalog."""
+        catalog_cache.bump()
+
     def test_no_questions(self):
         """
         If no questions exist, an appropriate message is displayed.
@@ -75,6 +81,90 @@ class QuestionIndexViewTests(TestCase):
         self.assertNotContains(response, [question.question_text, question2.question_text])
 
 
+@override_settings(POLLS_INDEX_PAGE_SIZE=2)
+class QuestionIndexPaginationTests(TestCase):
+    """The index is paged by cursor and can be filtered by status."""
+
+    def setUp(self):
+        """Create five past questions, the oldest one closed."""
+        self.questions = [create_question(f"Question {n}", days=-n) for n in range(1, 6)]
+        closed = self.questions[-1]
+        closed.end_date = timezone.now() - datetime.timedelta(hours=1)
+        closed.save()
+
+    def test_pages_follow_cursor(self):
+        """Following next_cursor walks every question exactly once, newest first."""
+        seen = []
+        url = reverse("polls:index")
+        while url:
+            response = self.client.get(url)
+            seen.extend(response.context["latest_question_list"])
+            cursor = response.context["next_cursor"]
+            url = f"{reverse('polls:index')}?cursor={cursor}" if cursor else None
+        self.assertEqual(seen, self.questions)
+
+    def test_status_filter(self):
+        """Only open or only closed questions can be listed."""
+        response = self.client.get(reverse("polls:index"), {"status": "closed"})
+        self.assertQuerySetEqual(response.context["latest_question_list"],
+                                 [self.questions[-1]])
+        response = self.client.get(reverse("polls:index"), {"status": "open"})
+        self.assertTrue(all(question.is_open
+                            for question in response.context["latest_question_list"]))
+
+    def test_invalid_cursor(self):
+        """A malformed cursor is a 404."""
+        response = self.client.get(reverse("polls:index"), {"cursor": "not-a-cursor"})
+        self.assertEqual(response.status_code, 404)
+
+
+class QuestionIndexCacheTests(TestCase):
+    """The poll list is cached until the catalog changes or a poll opens or closes."""
+
+    def setUp(self):
+        """Create a past question and a user."""
+        catalog_cache.bump()
+        self.question = create_question("Cached question", days=-1)
+        self.user = User.objects.create_user(username='reader', password='12345')
+
+    def test_anonymous_page_cached(self):
+        """The second anonymous visit is served without any query."""
+        first = self.client.get(reverse("polls:index"))
+        with self.assertNumQueries(0):
+            second = self.client.get(reverse("polls:index"))
+        self.assertEqual(first.content, second.content)
+
+    def test_saved_question_invalidates(self):
+        """Editing a question shows up on the next visit."""
+        self.client.get(reverse("polls:index"))
+        self.question.question_text = "Edited question"
+        self.question.save()
+        self.assertContains(self.client.get(reverse("polls:index")), "Edited question")
+
+    def test_signed_in_page_uses_cached_list(self):
+        """Signed-in users get their own page around the shared poll list."""
+        self.client.get(reverse("polls:index"))
+        self.client.login(username='reader', password='12345')
+        response = self.client.get(reverse("polls:index"))
+        self.assertContains(response, "Welcome back,  reader")
+        self.assertContains(response, "Cached question")
+
+    def test_ttl_until_next_transition(self):
+        """Entries expire when the next scheduled question opens."""
+        now = timezone.now()
+        scheduled = create_question("Scheduled question", days=1)
+        self.assertAlmostEqual(catalog_cache.ttl(now),
+                               (scheduled.pub_date - now).total_seconds(), places=3)
+        self.assertIsNone(catalog_cache.ttl(scheduled.pub_date))
+
+    @override_settings(POLLS_PAGE_CACHE=False)
+    def test_cache_disabled(self):
+        """With POLLS_PAGE_CACHE off every visit reads the questions."""
+        self.client.get(reverse("polls:index"))
+        with self.assertNumQueries(1):
+            self.client.get(reverse("polls:index"))
+
+
 def create_question(question_text, days):
     """
     Create a question with the given `question_text` and published the
@@ -66,3 +66,53 @@ class QuestionModelTests(TestCase):
         """
         question = Question.objects.create(question_text='default_pub')
         self.assertTrue(question.is_published())
+
+
+class QuestionStatusQuerySetTests(TestCase):
+    """Question status is evaluated in SQL against a single point in time."""
+
+    def setUp(self):
+        """Create a scheduled, an open, an open-ended and a closed question."""
+        self.now = timezone.now()
+        day = datetime.timedelta(days=1)
+        self.scheduled = Question.objects.create(question_text="scheduled",
+                                                 pub_date=self.now + day)
+        self.open = Question.objects.create(question_text="open", pub_date=self.now - day,
+                                            end_date=self.now + 2 * day)
+        self.forever = Question.objects.create(question_text="forever",
+                                               pub_date=self.now - day)
+        self.closed = Question.objects.create(question_text="closed",
+                                              pub_date=self.now - 2 * day,
+                                              end_date=self.now - day)
+
+    def test_status_filters(self):
+        """open(), closed() and scheduled() split the questions by status."""
+        questions = Question.objects.order_by("id")
+        self.assertQuerySetEqual(questions.open(self.now), [self.open, self.forever])
+        self.assertQuerySetEqual(questions.closed(self.now), [self.closed])
+        self.assertQuerySetEqual(questions.scheduled(self.now), [self.scheduled])
+        self.assertQuerySetEqual(questions.published(self.now),
+                                 [self.open, self.forever, self.closed])
+
+    def test_with_status_matches_model_methods(self):
+        """The annotated status agrees with get_status() and needs no clock read."""
+        questions = Question.objects.with_status(self.now).order_by("id")
+        self.assertEqual([question.status for question in questions],
+                         ["scheduled", "open", "open", "closed"])
+        for question in questions:
+            self.assertEqual(question.get_status(self.now), question.status)
+            self.assertEqual(question.is_open, question.can_vote())
+
+    def test_end_date_is_still_open(self):
+        """A question can be voted on up to and including its end date."""
+        self.assertTrue(self.open.can_vote(self.open.end_date))
+        self.assertTrue(Question.objects.open(self.open.end_date).filter(pk=self.open.pk))
+
+    def test_next_transition(self):
+        """The next transition is the earliest opening or closing after now."""
+        self.assertEqual(Question.objects.next_transition(self.now), self.scheduled.pub_date)
+        after_opening = self.scheduled.pub_date
+        self.assertEqual(Question.objects.next_transition(after_opening),
+                         self.open.end_date + datetime.timedelta(microseconds=1))
+        after_closing = self.open.end_date + datetime.timedelta(seconds=1)
+        self.assertIsNone(Question.objects.next_transition(after_closing))
@@ -0,0 +1,65 @@
+"""
+This module contains Unittests for the polls application results views.
+"""
+
+from django.test import TestCase
+from django.urls import reverse
+
+from polls.cache import results_cache
+from polls.models import Question, Choice
+
+
+class QuestionResultsViewTests(TestCase):
+    """Results page and its JSON variant read the tallies in one query."""
+
+    def setUp(self):
+        """Create a question with two tallied choices."""
+        results_cache.clear()
+        self.question = Question.objects.create(question_text="Results question")
+        self.first = Choice.objects.create(question=self.question,
+                                           choice_text="First", vote_count=3)
+        self.second = Choice.objects.create(question=self.question,
+                                            choice_text="Second", vote_count=1)
+
+    def test_results_page_shows_tallies(self):
+        """The results page lists every choice with its votes."""
+        response = self.client.get(reverse("polls:results", args=(self.question.id,)))
+        self.assertEqual(response.status_code, 200)
+        self.assertTemplateUsed(response, "polls/results.html")
+        self.assertContains(response, self.question.question_text)
+        self.assertContains(response, "First")
+        self.assertContains(response, "Second")
+
+    def test_results_page_single_query(self):
+        """Rendering the results needs a single query."""
+        with self.assertNumQueries(1):
+            self.client.get(reverse("polls:results", args=(self.question.id,)))
+
+    def test_results_json(self):
+        """The JSON variant returns the question, choices and totals."""
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse("polls:results_json",
+                                               args=(self.question.id,)))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {
+            "id": self.question.id,
+            "question_text": "Results question",
+            "total_votes": 4,
+            "choices": [
+                {"id": self.first.id, "choice_text": "First", "votes": 3},
+                {"id": self.second.id, "choice_text": "Second", "votes": 1},
+            ],
+        })
+
+    def test_question_without_choices(self):
+        """A question without choices still has (empty) results."""
+        question = Question.objects.create(question_text="Empty")
+        response = self.client.get(reverse("polls:results_json", args=(question.id,)))
+        self.assertEqual(response.json()["choices"], [])
+
+    def test_missing_question(self):
+        """Results for an unknown question are a 404."""
+        response = self.client.get(reverse("polls:results", args=(9999,)))
+        self.assertEqual(response.status_code, 404)
+        response = self.client.get(reverse("polls:results_json", args=(9999,)))
+        self.assertEqual(response.status_code, 404)
@@ -0,0 +1,73 @@
+"""
+This module contains Unittests for the async variants of the polls views.
+"""
+
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from polls import async_views
+from polls.cache import results_cache
+from polls.models import Question, Choice, Vote, User
+
+
+@override_settings(ROOT_URLCONF="mysite.async_urls")
+class AsyncViewsTests(TestCase):
+    """The async views behave like the sync ones."""
+
+    def setUp(self):
+        """Log a user in and create a question with two choices."""
+        results_cache.clear()
+        self.user = User.objects.create_user(username='async', password='12345')
+        self.async_client.force_login(self.user)
+        self.question = Question.objects.create(question_text="Async question")
+        self.first = Choice.objects.create(question=self.question, choice_text="First")
+        self.second = Choice.objects.create(question=self.question, choice_text="Second")
+
+    def test_routes_use_async_views(self):
+        """The ASGI profile URLconf resolves to the async views."""
+        response = self.client.get(reverse("polls:index"))
+        self.assertIs(response.resolver_match.func, async_views.index)
+
+    async def test_index(self):
+        """The index lists the published question."""
+        response = await self.async_client.get(reverse("polls:index"))
+        self.assertContains(response, "Async question")
+        self.assertEqual(response.context["latest_question_list"], [self.question])
+
+    async def test_detail_and_vote(self):
+        """Voting records the vote and the detail page shows it as checked."""
+        response = await self.async_client.post(
+            reverse("polls:vote", args=(self.question.id,)), {"choice": self.second.id})
+        self.assertRedirects(response, reverse("polls:results", args=(self.question.id,)),
+                             fetch_redirect_response=False)
+        self.assertEqual(await Vote.objects.filter(user=self.user).acount(), 1)
+        response = await self.async_client.get(reverse("polls:detail",
+                                                       args=(self.question.id,)))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context["voted_choice"], self.second.id)
+
+    async def test_vote_without_choice(self):
+        """Posting without a choice redisplays the form with an error."""
+        response = await self.async_client.post(
+            reverse("polls:vote", args=(self.question.id,)), {})
+        self.assertContains(response, "You didn&#x27;t select a choice.")
+
+    async def test_results(self):
+        """Results are rendered from the cache through the async ORM."""
+        await Choice.objects.filter(pk=self.first.pk).aupdate(vote_count=2)
+        response = await self.async_client.get(reverse("polls:results",
+                                                       args=(self.question.id,)))
+        self.assertEqual(response.context["question"]["total_votes"], 2)
+        response = await self.async_client.get(reverse("polls:results", args=(9999,)))
+        self.assertEqual(response.status_code, 404)
+
+    async def test_not_modified(self):
+        """Unchanged index and results pages are answered with 304."""
+        # the first page sets the CSRF cookie the ETags of later pages depend on
+        await self.async_client.get(reverse("polls:index"))
+        for url in (reverse("polls:index"),
+                    reverse("polls:results", args=(self.question.id,))):
+            response = await self.async_client.get(url)
+            response = await self.async_client.get(url, headers={"If-None-Match":
+                                                                 response["ETag"]})
+            self.assertEqual(response.status_code, 304, url)
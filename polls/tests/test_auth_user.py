@@ -94,3 +94,26 @@ class UserAuthTest(django.test.TestCase):
         # How to fix it?
         login_with_next = f"{reverse('login')}?next={vote_url}"
         self.assertRedirects(response, login_with_next)
+
+
+@django.test.override_settings(**settings.POLLS_SESSION_PROFILES["signed_cookies"])
+class CachedUserTest(django.test.TestCase):
+    """Users are looked up from the cache until they change."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="cached", password="FatChance!")
+        self.client.login(username="cached", password="FatChance!")
+        self.client.get(reverse("polls:index"))
+
+    def test_user_served_from_cache(self):
+        """A logged-in request loads neither its session nor its user."""
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse("polls:index"))
+        self.assertEqual(response.wsgi_request.user, self.user)
+
+    def test_changed_user_is_reloaded(self):
+        """Deactivating a user logs them out on their next request."""
+        self.user.is_active = False
+        self.user.save()
+        response = self.client.get(reverse("polls:index"))
+        self.assertFalse(response.wsgi_request.user.is_authenticated)
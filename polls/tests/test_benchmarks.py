@@ -0,0 +1,64 @@
+"""
+This module smoke-tests the benchmark dataset generator and runner.
+"""
+
+from io import StringIO
+from unittest import mock
+
+from django.test import AsyncClient, TestCase
+
+from benchmarks import dataset, runner
+from benchmarks.scenarios import SCENARIOS
+from polls.management.commands.benchmark import Command
+from polls.models import Choice, Vote
+
+
+class BenchmarkSmokeTests(TestCase):
+    """A tiny dataset can be generated and every scenario runs on it."""
+
+    def test_generate_and_run(self):
+        """Votes never repeat a (user, question) pair and tallies match."""
+        summary = dataset.generate(questions=3, choices=2, users=4, votes=100)
+        self.assertEqual(summary["votes"], 12)
+        self.assertEqual(Vote.objects.count(), 12)
+        self.assertEqual(sum(Choice.objects.values_list("vote_count", flat=True)), 12)
+        workers = runner.make_workers(1)
+        for name in SCENARIOS:
+            report = runner.run(name, workers, requests=3)
+            self.assertEqual(report["requests"], 3)
+            self.assertEqual(report["errors"], 0, name)
+
+    def test_errors_are_reported(self):
+        """Runs with failed requests are named on stderr with their error rate."""
+        ok = runner.summarize([0.01] * 4, [], 0, 1.0)
+        failing = runner.summarize([0.01] * 4, [], 1, 1.0)
+        self.assertEqual(failing["error_rate"], 0.25)
+        stderr = StringIO()
+        Command(stderr=stderr).warn_about_errors(
+            {"scenarios": {"index": ok, "vote": failing},
+             "session_profiles": {"db": {"vote_flow": failing}}})
+        lines = stderr.getvalue().splitlines()
+        self.assertEqual(len(lines), 2)
+        self.assertIn("scenarios vote: 1 of 4 requests failed (25.0%)", lines[0])
+        self.assertIn("session_profiles db vote_flow", lines[1])
+
+
+class AsyncScenarioTests(TestCase):
+    """Scenarios run by run_async() await every request they make."""
+
+    def setUp(self):
+        """Generate a tiny dataset and one AsyncClient worker."""
+        dataset.generate(questions=2, choices=2, users=1, votes=0)
+        self.worker = runner.make_workers(1, client_class=AsyncClient)[0]
+
+    async def test_vote_flow(self):
+        """The voting form is awaited before the vote is posted and followed."""
+        client = self.worker.client
+        with mock.patch.object(client, "get", mock.AsyncMock(wraps=client.get)) as get:
+            response = await SCENARIOS["vote_flow"](self.worker)
+        # the form, then the results page the vote redirects to
+        self.assertEqual(get.await_count, 2)
+        self.assertEqual(get.call_count, 2)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.redirect_chain), 1)
+        self.assertEqual(await Vote.objects.acount(), 1)
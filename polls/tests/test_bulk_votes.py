@@ -0,0 +1,91 @@
+"""
+This module contains Unittests for bulk vote ingestion.
+"""
+
+import json
+import tempfile
+from io import StringIO
+
+from django.contrib.auth.models import Permission
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+
+from polls.ingest import ingest_votes
+from polls.models import Question, Choice, Vote, User
+
+
+class BulkVoteTests(TestCase):
+    """Votes recorded in bulk behave like votes cast one at a time."""
+
+    def setUp(self):
+        """Create two voters and a question with two choices."""
+        self.alice = User.objects.create_user(username='alice', password='12345')
+        self.bob = User.objects.create_user(username='bob', password='12345')
+        self.question = Question.objects.create(question_text="Bulk question")
+        self.first = Choice.objects.create(question=self.question, choice_text="First")
+        self.second = Choice.objects.create(question=self.question, choice_text="Second")
+
+    def item(self, user, choice):
+        """Build an ingestion item for a user's vote."""
+        return {"user": user.id, "question": self.question.id, "choice": choice.id}
+
+    def test_ingest_creates_updates_and_tallies(self):
+        """New, changed and repeated votes are reported and tallied."""
+        Vote.objects.create(user=self.bob, choice=self.first)
+        Choice.objects.filter(pk=self.first.pk).update(vote_count=1)
+        results = list(ingest_votes([
+            self.item(self.alice, self.first),
+            self.item(self.bob, self.second),
+            self.item(self.alice, self.first),
+        ]))
+        self.assertEqual([result["status"] for result in results],
+                         ["created", "updated", "unchanged"])
+        self.first.refresh_from_db()
+        self.second.refresh_from_db()
+        self.assertEqual((self.first.votes, self.second.votes), (1, 1))
+        self.assertEqual(Vote.objects.count(), 2)
+
+    def test_invalid_items(self):
+        """Malformed items, unknown users and foreign choices are rejected."""
+        other = Question.objects.create(question_text="Other")
+        results = list(ingest_votes([
+            {"user": self.alice.id},
+            {"user": 9999, "question": self.question.id, "choice": self.first.id},
+            {"user": self.alice.id, "question": other.id, "choice": self.first.id},
+        ]))
+        self.assertEqual([result["status"] for result in results], ["invalid"] * 3)
+        self.assertEqual(Vote.objects.count(), 0)
+
+    def test_chunk_queries_do_not_grow_with_votes(self):
+        """A chunk costs the same number of queries for 1 or many votes."""
+        users = User.objects.bulk_create(
+            [User(username=f"voter{n}") for n in range(50)])
+        with self.assertNumQueries(8):
+            list(ingest_votes([self.item(user, self.first) for user in users]))
+        self.first.refresh_from_db()
+        self.assertEqual(self.first.votes, 50)
+
+    def test_endpoint_requires_permission(self):
+        """Only users allowed to add votes may use the bulk endpoint."""
+        url = reverse("polls:bulk_vote")
+        body = json.dumps({"votes": [self.item(self.alice, self.first)]})
+        response = self.client.post(url, body, content_type="application/json")
+        self.assertEqual(response.status_code, 401)
+        self.client.login(username='alice', password='12345')
+        response = self.client.post(url, body, content_type="application/json")
+        self.assertEqual(response.status_code, 403)
+        self.alice.user_permissions.add(Permission.objects.get(codename="add_vote"))
+        response = self.client.post(url, body, content_type="application/json")
+        self.assertEqual(response.json(), {"results": [{"status": "created"}]})
+
+    def test_ingest_votes_command(self):
+        """The management command reads votes from a JSONL file."""
+        with tempfile.NamedTemporaryFile("w", suffix=".jsonl") as jsonl:
+            jsonl.write(json.dumps(self.item(self.alice, self.first)) + "\n")
+            jsonl.write(json.dumps(self.item(self.bob, self.second)) + "\n")
+            jsonl.flush()
+            out = StringIO()
+            call_command("ingest_votes", jsonl.name, stdout=out)
+        self.assertIn("2 created", out.getvalue())
+        self.assertEqual(Vote.objects.count(), 2)
@@ -0,0 +1,139 @@
+"""
+This module contains Unittests for conditional GETs of the polls pages.
+"""
+
+import datetime
+import os
+import tempfile
+from unittest import mock
+
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from polls.buffer import VoteBuffer
+from polls.cache import catalog_cache, results_cache
+from polls.models import Question, Choice, User
+from polls.voting import record_vote
+
+
+class ConditionalGetTests(TestCase):
+    """Unchanged pages are answered with 304 from their cache versions alone."""
+
+    def setUp(self):
+        """Create a question with two choices."""
+        results_cache.clear()
+        catalog_cache.bump()
+        self.question = Question.objects.create(question_text="Revalidated question")
+        self.first = Choice.objects.create(question=self.question, choice_text="First")
+        self.second = Choice.objects.create(question=self.question, choice_text="Second")
+        self.results_url = reverse("polls:results", args=(self.question.id,))
+
+    def revalidate(self, url, response):
+        """GET url again with the ETag of an earlier response."""
+        return self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"])
+
+    def test_index_not_modified(self):
+        """A current copy of the index is confirmed without rendering or queries."""
+        url = reverse("polls:index")
+        response = self.client.get(url)
+        self.assertEqual(response["Cache-Control"], "private, no-cache")
+        with self.assertNumQueries(0):
+            revalidated = self.revalidate(url, response)
+        self.assertEqual(revalidated.status_code, 304)
+        self.assertEqual(revalidated["ETag"], response["ETag"])
+        self.assertTemplateNotUsed(revalidated, "polls/index.html")
+
+    def test_index_varies_on_catalog_status_and_user(self):
+        """Another question, status filter or user gets another ETag."""
+        url = reverse("polls:index")
+        anonymous = self.client.get(url)
+        self.assertNotEqual(self.client.get(url, {"status": "open"})["ETag"],
+                            anonymous["ETag"])
+        user = User.objects.create_user(username="reader", password="12345")
+        self.client.force_login(user)
+        self.assertEqual(self.revalidate(url, anonymous).status_code, 200)
+        Question.objects.create(question_text="Another question")
+        self.client.logout()
+        response = self.revalidate(url, anonymous)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "Another question")
+
+    def test_index_changes_when_a_question_closes(self):
+        """The catalog validator moves on once a question opens or closes."""
+        now = timezone.now()
+        self.question.end_date = now + datetime.timedelta(hours=1)
+        self.question.save()
+        validator = catalog_cache.validator(now)
+        self.assertEqual(catalog_cache.validator(now + datetime.timedelta(minutes=1)),
+                         validator)
+        self.assertNotEqual(catalog_cache.validator(now + datetime.timedelta(hours=2)),
+                            validator)
+
+    def test_results_not_modified_until_a_vote(self):
+        """Results are confirmed without reading the choices until someone votes."""
+        response = self.client.get(self.results_url)
+        with self.assertNumQueries(0):
+            revalidated = self.revalidate(self.results_url, response)
+        self.assertEqual(revalidated.status_code, 304)
+        self.assertTemplateNotUsed(revalidated, "polls/results.html")
+        user = User.objects.create_user(username="voter", password="12345")
+        self.client.force_login(user)
+        self.client.post(reverse("polls:vote", args=(self.question.id,)),
+                         {"choice": self.first.id})
+        # the page showing the vote's message is never tagged
+        response = self.client.get(self.results_url)
+        self.assertContains(response, "You voted for First.")
+        self.assertNotIn("ETag", response)
+        response = self.revalidate(self.results_url, self.client.get(self.results_url))
+        self.assertEqual(response.status_code, 304)
+
+    def test_results_json_not_modified(self):
+        """Dashboards polling the JSON results get 304 while nothing changed."""
+        url = reverse("polls:results_json", args=(self.question.id,))
+        response = self.client.get(url)
+        self.assertEqual(response["Cache-Control"], "no-cache")
+        with self.assertNumQueries(0):
+            self.assertEqual(self.revalidate(url, response).status_code, 304)
+        user = User.objects.create_user(username="voter", password="12345")
+        with self.captureOnCommitCallbacks(execute=True):
+            record_vote(user.id, self.question.id, self.second.id)
+        response = self.revalidate(url, response)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["total_votes"], 1)
+
+    @override_settings(POLLS_CONDITIONAL_GET=False)
+    def test_disabled(self):
+        """Without POLLS_CONDITIONAL_GET no ETag is sent."""
+        self.assertNotIn("ETag", self.client.get(reverse("polls:index")))
+        self.assertNotIn("ETag", self.client.get(self.results_url))
+
+
+class WriteBehindConditionalGetTests(TestCase):
+    """Votes still buffered change the results' ETag before they are committed."""
+
+    def setUp(self):
+        """Create a question with a choice, a logged in user and a buffer."""
+        results_cache.clear()
+        self.user = User.objects.create_user(username='voter', password='12345')
+        self.client.force_login(self.user)
+        self.question = Question.objects.create(question_text="Buffered question")
+        self.choice = Choice.objects.create(question=self.question, choice_text="First")
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.buffer = VoteBuffer(os.path.join(directory.name, "votes.journal"), fsync=False)
+        self.buffer.start(thread=False)
+        patcher = mock.patch("polls.voting.vote_buffer", self.buffer)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    @override_settings(POLLS_WRITE_BEHIND=True)
+    def test_buffered_vote_changes_etag(self):
+        url = reverse("polls:results_json", args=(self.question.id,))
+        before = self.client.get(url)
+        self.buffer.submit(self.user.id, self.question.id, self.choice.id)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=before["ETag"])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["total_votes"], 1)
+        self.buffer.flush()
+        self.assertNotEqual(self.client.get(url)["ETag"], response["ETag"])
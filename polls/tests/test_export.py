@@ -0,0 +1,87 @@
+"""
+This module contains Unittests for exporting votes and tallies.
+"""
+
+import csv
+import gzip
+import io
+import json
+import os
+import tempfile
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+
+from polls.models import Question, Choice, Vote, User
+
+
+class ExportTests(TestCase):
+    """Votes and tallies stream out as CSV or JSONL, resumable by id."""
+
+    def setUp(self):
+        """Create three voters on a question with two choices."""
+        self.question = Question.objects.create(question_text="Export question")
+        self.first = Choice.objects.create(question=self.question, choice_text="First")
+        self.second = Choice.objects.create(question=self.question, choice_text="Second")
+        self.users = [User.objects.create_user(username=f"user{n}", password='12345')
+                      for n in range(3)]
+        self.votes = [Vote.objects.create(user=user, choice=choice) for user, choice
+                      in zip(self.users, (self.first, self.second, self.second))]
+        Choice.objects.filter(pk=self.first.pk).update(vote_count=1)
+        Choice.objects.filter(pk=self.second.pk).update(vote_count=2)
+
+    def export(self, *args):
+        """Run export_results into a file and return its bytes."""
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "export")
+            call_command("export_results", *args, "--output", path, "--chunk-size", "2")
+            with open(path, "rb") as output:
+                return output.read()
+
+    def test_votes_csv(self):
+        """Every vote is one CSV row after the header, in id order."""
+        rows = list(csv.reader(io.StringIO(self.export("votes").decode())))
+        self.assertEqual(rows[0], ["id", "question", "choice", "user"])
+        self.assertEqual([int(row[0]) for row in rows[1:]], [vote.id for vote in self.votes])
+        self.assertEqual(rows[1][2:], [str(self.first.id), str(self.users[0].id)])
+
+    def test_tallies_jsonl(self):
+        """Tallies hold one line per choice with its question and votes."""
+        lines = [json.loads(line) for line in self.export("tallies", "--format", "jsonl")
+                 .decode().splitlines()]
+        self.assertEqual([(line["choice_text"], line["votes"]) for line in lines],
+                         [("First", 1), ("Second", 2)])
+        self.assertEqual(lines[0]["question_text"], "Export question")
+
+    def test_resume_after_id(self):
+        """--after and --until restrict the export to an id range."""
+        content = self.export("votes", "--format", "jsonl", "--after", str(self.votes[0].id),
+                              "--until", str(self.votes[1].id))
+        self.assertEqual([json.loads(line)["id"] for line in content.decode().splitlines()],
+                         [self.votes[1].id])
+
+    def test_gzip(self):
+        """--gzip writes a gzip stream of the same export."""
+        self.assertEqual(gzip.decompress(self.export("votes", "--gzip")),
+                         self.export("votes"))
+
+    def test_endpoint_is_staff_only(self):
+        """The streaming endpoint redirects anyone but staff to the admin login."""
+        url = reverse("polls:export_results", args=("votes", "csv"))
+        self.client.force_login(self.users[0])
+        self.assertEqual(self.client.get(url).status_code, 302)
+
+    def test_endpoint_streams(self):
+        """Staff download the same export over HTTP, optionally compressed."""
+        staff = User.objects.create_user(username='staff', password='12345', is_staff=True)
+        self.client.force_login(staff)
+        url = reverse("polls:export_results", args=("votes", "jsonl"))
+        response = self.client.get(url, {"question": self.question.id, "gzip": "1"})
+        self.assertTrue(response.streaming)
+        self.assertEqual(response["Content-Disposition"],
+                         'attachment; filename="votes.jsonl.gz"')
+        lines = gzip.decompress(b"".join(response.streaming_content)).splitlines()
+        self.assertEqual(len(lines), 3)
+        url = reverse("polls:export_results", args=("votes", "xml"))
+        self.assertEqual(self.client.get(url).status_code, 404)
@@ -0,0 +1,80 @@
+"""
+This module checks that the hot polls queries are served by indexes.
+"""
+
+import unittest
+
+from django.db import connection
+from django.db.models import Count
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from polls.models import Question, Vote
+from polls.pagination import _page_query, encode_cursor
+from polls.results import _results_rows
+from polls.views import IndexView, published_questions, questions_with_vote
+
+
+@unittest.skipUnless(connection.vendor == "sqlite", "EXPLAIN output is SQLite specific")
+class QueryPlanTests(TestCase):
+    """
+    EXPLAIN the querysets the views build and make sure none of them scans
+    a table.
+    """
+
+    def assertUsesIndex(self, queryset, index=None):
+        """Assert the query plan searches an index (optionally a given one)."""
+        plan = queryset.explain()
+        self.assertNotRegex(plan, r"SCAN polls_\w+\b(?! USING)", plan)
+        self.assertIn("USING", plan)
+        if index is not None:
+            self.assertIn(index, plan)
+
+    def test_index_view_pages(self):
+        """
+        Every page of the index, for every status filter, is read newest
+        first from the pub_date index without sorting.
+        """
+        now = timezone.now()
+        question = Question.objects.create(question_text="Listed question")
+        for status in (None, *IndexView.statuses):
+            for cursor in (None, encode_cursor(question)):
+                with self.subTest(status=status, cursor=cursor):
+                    queryset = _page_query(published_questions(now, status), cursor, 20)
+                    self.assertUsesIndex(queryset, "question_pub_date_idx")
+                    self.assertNotIn("TEMP B-TREE", queryset.explain())
+
+    def test_detail_view_question(self):
+        """The detail view finds the question by key and the user's vote by index."""
+        plan = questions_with_vote(1, timezone.now()).filter(pk=1).explain()
+        self.assertNotRegex(plan, r"SCAN polls_\w+\b(?! USING)", plan)
+        self.assertIn("PRIMARY KEY", plan)
+        self.assertRegex(plan, r"USING (COVERING )?INDEX \w+ \(user_id=\? AND question_id=\?\)")
+
+    def test_vote_lookup(self):
+        """The user's vote for a question is found by the unique constraint."""
+        self.assertUsesIndex(
+            Vote.objects.filter(user_id=1, question_id=1).values_list("choice_id"))
+
+    def test_tally_by_question(self):
+        """Counting a question's votes per choice only reads the covering index."""
+        plan = (Vote.objects.filter(question_id=1).values("choice")
+                .annotate(total=Count("id")).explain())
+        self.assertIn("COVERING INDEX vote_question_choice_idx", plan)
+
+    def test_results_query(self):
+        """The results query joins choices through the question_id index."""
+        self.assertUsesIndex(_results_rows(1))
+
+    def test_next_transition(self):
+        """The next opening and closing are each found by an index seek."""
+        with CaptureQueriesContext(connection) as queries:
+            Question.objects.next_transition(timezone.now())
+        self.assertEqual(len(queries), 2)
+        for query in queries:
+            with connection.cursor() as cursor:
+                cursor.execute("EXPLAIN QUERY PLAN " + query["sql"])
+                plan = "\n".join(row[-1] for row in cursor.fetchall())
+            self.assertNotIn("SCAN", plan)
+            self.assertIn("SEARCH polls_question USING", plan)
@@ -0,0 +1,84 @@
+"""
+This module contains Unittests for the request instrumentation middleware.
+"""
+
+from unittest import mock
+
+from asgiref.sync import iscoroutinefunction
+from django.db import connections
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from polls.instrumentation import (Histogram, InstrumentationMiddleware, registry,
+                                   render_prometheus)
+from polls.models import Question, User
+
+
+@override_settings(POLLS_INSTRUMENTATION=True)
+class InstrumentationTests(TestCase):
+    """Requests are recorded per URL name and exposed to staff."""
+
+    def setUp(self):
+        """Start from empty histograms."""
+        registry.clear()
+        self.question = Question.objects.create(question_text="Measured")
+
+    def test_records_per_url_name(self):
+        """Query count and timings are recorded under the view name."""
+        self.client.get(reverse("polls:index"))
+        self.client.get(reverse("polls:index"))
+        queries = registry.histogram("polls_request_queries", "polls:index")
+        self.assertEqual(queries.total, 2)
+        self.assertEqual(queries.sum, 3)
+        self.assertGreater(registry.histogram("polls_request_render_seconds",
+                                              "polls:index").sum, 0)
+        self.assertGreater(registry.histogram("polls_request_seconds",
+                                              "polls:index").sum, 0)
+
+    def test_metrics_endpoint(self):
+        """Staff can scrape the histograms in Prometheus text format."""
+        self.client.get(reverse("polls:results", args=(self.question.id,)))
+        User.objects.create_user(username='staff', password='12345', is_staff=True)
+        self.client.login(username='staff', password='12345')
+        response = self.client.get(reverse("polls:metrics"))
+        self.assertContains(response, 'polls_request_seconds_count{url_name="polls:results"} 1')
+        self.assertContains(response, "# TYPE polls_request_queries histogram")
+
+    @override_settings(ROOT_URLCONF="mysite.async_urls")
+    async def test_async_views(self):
+        """Under ASGI the async views are measured too, without a thread hop."""
+        async def get_response(request):
+            pass
+
+        self.assertTrue(iscoroutinefunction(InstrumentationMiddleware(get_response)))
+        await self.async_client.get(reverse("polls:index"))
+        self.assertEqual(registry.histogram("polls_request_seconds", "polls:index").total, 1)
+
+    @override_settings(POLLS_INSTRUMENTATION=False)
+    def test_disabled(self):
+        """Nothing is recorded when instrumentation is off."""
+        self.client.get(reverse("polls:index"))
+        self.assertIsNone(registry.histogram("polls_request_seconds", "polls:index"))
+
+
+class HistogramTests(TestCase):
+    """Histogram buckets are cumulative like Prometheus'."""
+
+    def test_cumulative_buckets(self):
+        """Each bucket counts the observations at or below its bound."""
+        histogram = Histogram((1, 5))
+        for value in (0, 1, 3, 10):
+            histogram.observe(value)
+        self.assertEqual(list(histogram.cumulative()), [(1, 2), (5, 3), ("+Inf", 4)])
+        self.assertEqual(histogram.sum, 14)
+
+    def test_pool_metrics(self):
+        """The statistics of a database connection pool are exported per alias."""
+        pool = mock.Mock()
+        pool.get_stats.return_value = {"pool_size": 4, "pool_available": 3,
+                                       "requests_num": 12}
+        with mock.patch.object(connections["default"], "pool", pool, create=True):
+            output = render_prometheus()
+        self.assertIn('polls_db_pool_size{database="default"} 4', output)
+        self.assertIn("# TYPE polls_db_requests_num_total counter", output)
+        self.assertIn('polls_db_requests_num_total{database="default"} 12', output)
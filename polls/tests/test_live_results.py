@@ -0,0 +1,73 @@
+"""
+This module contains Unittests for the live results stream.
+"""
+
+import asyncio
+import json
+
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from polls.cache import results_cache
+from polls.live import LiveResults
+from polls.models import Question, Choice
+
+
+class LiveResultsTests(TestCase):
+    """Watchers share one recompute per tick and receive deltas."""
+
+    def setUp(self):
+        """Create a question with two choices and an empty cache."""
+        results_cache.clear()
+        self.question = Question.objects.create(question_text="Live question")
+        self.first = Choice.objects.create(question=self.question, choice_text="First")
+        self.second = Choice.objects.create(question=self.question, choice_text="Second")
+
+    async def test_watchers_get_coalesced_deltas(self):
+        """Many votes within a tick become one recompute and one delta."""
+        live = LiveResults(tick=0.05)
+        watchers = [await live.subscribe(self.question.id) for _ in range(3)]
+        self.assertEqual(watchers[0][1]["total_votes"], 0)
+        misses = results_cache.stats()["misses"]
+        for _ in range(5):
+            await Choice.objects.filter(pk=self.first.pk).aupdate(vote_count=5)
+            results_cache.bump(self.question.id)
+        deltas = [await watcher.next_delta(timeout=1) for watcher, _ in watchers]
+        self.assertEqual(deltas, [{str(self.first.id): 5, "total_votes": 5}] * 3)
+        self.assertEqual(results_cache.stats()["misses"], misses + 1)
+        for watcher, _ in watchers:
+            live.unsubscribe(self.question.id, watcher)
+        self.assertEqual(live.watcher_count(self.question.id), 0)
+
+    async def test_unknown_question(self):
+        """Watching a question that does not exist fails."""
+        with self.assertRaises(Question.DoesNotExist):
+            await LiveResults(tick=0.05).subscribe(9999)
+
+    async def assertStreamsSnapshot(self):
+        """The SSE endpoint sends the full results first, then heartbeats."""
+        response = await self.async_client.get(
+            reverse("polls:results_stream", args=(self.question.id,)))
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        events = aiter(response.streaming_content)
+        snapshot = (await anext(events)).decode()
+        self.assertTrue(snapshot.startswith("event: snapshot\n"))
+        data = json.loads(snapshot.split("data: ", 1)[1])
+        self.assertEqual(data["question_text"], "Live question")
+        self.assertEqual(await asyncio.wait_for(anext(events), 1), b": heartbeat\n\n")
+        await events.aclose()
+
+    @override_settings(POLLS_LIVE_HEARTBEAT=0.05)
+    async def test_stream_starts_with_snapshot(self):
+        """Under ASGI the stream is served with the default URLconf."""
+        await self.assertStreamsSnapshot()
+
+    @override_settings(POLLS_LIVE_HEARTBEAT=0.05, ROOT_URLCONF="mysite.async_urls")
+    async def test_stream_with_async_views(self):
+        """The stream is served the same way in the ASGI profile."""
+        await self.assertStreamsSnapshot()
+
+    def test_stream_needs_asgi(self):
+        """Under WSGI the stream is refused instead of buffered forever."""
+        response = self.client.get(reverse("polls:results_stream", args=(self.question.id,)))
+        self.assertEqual(response.status_code, 501)
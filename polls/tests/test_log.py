@@ -0,0 +1,97 @@
+"""
+This module contains Unittests for the structured polls event log.
+"""
+
+import json
+import logging
+import os
+import tempfile
+
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+
+from polls.log import JsonLineFormatter, QueuedFileHandler, log_event
+from polls.models import Question, Choice, User
+
+
+class QueuedFileHandlerTests(SimpleTestCase):
+    """Events are written as JSON lines by the listener thread."""
+
+    def setUp(self):
+        """A logger with only a queued handler on a scratch file."""
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "events.log")
+        self.logger = logging.getLogger("polls.tests.log")
+        self.logger.propagate = False
+        self.addCleanup(setattr, self.logger, "propagate", True)
+
+    def handler(self, **kwargs):
+        """Attach a QueuedFileHandler writing JSON lines."""
+        handler = QueuedFileHandler(self.path, **kwargs)
+        handler.setFormatter(JsonLineFormatter())
+        self.logger.addHandler(handler)
+        self.addCleanup(self.logger.removeHandler, handler)
+        return handler
+
+    def lines(self, path=None):
+        """The JSON objects of a log file."""
+        with open(path or self.path) as log:
+            return [json.loads(line) for line in log]
+
+    def test_event_fields(self):
+        """Event type, ids, IP and message are fields of the JSON line."""
+        handler = self.handler()
+        log_event(self.logger, logging.WARNING, "vote", "User %s voted for %s", "alice", 7,
+                  user=1, question=2, choice=7)
+        handler.close()
+        [line] = self.lines()
+        self.assertEqual(line["event"], "vote")
+        self.assertEqual((line["user"], line["question"], line["choice"]), (1, 2, 7))
+        self.assertEqual(line["message"], "User alice voted for 7")
+        self.assertNotIn("ip", line)
+
+    def test_exception_is_kept(self):
+        """A traceback is rendered before the record is queued."""
+        handler = self.handler()
+        try:
+            raise ValueError("bad choice")
+        except ValueError:
+            self.logger.exception("Invalid vote")
+        handler.close()
+        self.assertIn("ValueError: bad choice", self.lines()[0]["exc"])
+
+    def test_rotates_by_size(self):
+        """The file is rolled over once it would exceed max_bytes."""
+        handler = self.handler(max_bytes=300, backup_count=2)
+        for n in range(10):
+            self.logger.warning("event %s", n)
+        handler.close()
+        self.assertTrue(os.path.exists(self.path + ".1"))
+        self.assertEqual(self.lines()[-1]["message"], "event 9")
+
+    def test_lazy_formatting(self):
+        """Nothing is formatted for a level that is not logged."""
+        class Exploding:
+            def __str__(self):
+                raise AssertionError("formatted")
+        self.handler()
+        self.logger.setLevel(logging.WARNING)
+        self.addCleanup(self.logger.setLevel, logging.NOTSET)
+        log_event(self.logger, logging.INFO, "vote", "%s", Exploding())
+
+
+class VoteEventTests(TestCase):
+    """The vote view logs a vote event with its ids and the client IP."""
+
+    def test_vote_event(self):
+        user = User.objects.create_user(username='voter', password='12345')
+        self.client.login(username='voter', password='12345')
+        question = Question.objects.create(question_text="Logged question")
+        choice = Choice.objects.create(question=question, choice_text="First")
+        with self.assertLogs("polls.views", "INFO") as logs:
+            self.client.post(reverse("polls:vote", args=(question.id,)),
+                             {"choice": choice.id}, REMOTE_ADDR="10.0.0.7")
+        [record] = [record for record in logs.records if record.event == "vote"]
+        self.assertEqual((record.user_id, record.question_id, record.choice_id, record.ip),
+                         (user.id, question.id, choice.id, "10.0.0.7"))
@@ -0,0 +1,105 @@
+"""
+This module pins the number of SQL queries each polls view may run.
+"""
+
+from django.conf import settings
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from polls.backends import CachedModelBackend
+from polls.cache import catalog_cache, results_cache
+from polls.models import Question, Choice, Vote, User
+
+# every authenticated request loads its session and its user
+AUTH_QUERIES = 2
+
+
+@override_settings(**settings.POLLS_SESSION_PROFILES["db"])
+class QueryBudgetTests(TestCase):
+    """Regression tests for the query budget of every polls view."""
+
+    auth_queries = AUTH_QUERIES
+
+    def setUp(self):
+        """Log a user in and create a question with a few choices."""
+        results_cache.clear()
+        catalog_cache.bump()
+        self.user = User.objects.create_user(username='budget', password='12345')
+        self.client.login(username='budget', password='12345')
+        # as after the first request of a session (CachedModelBackend)
+        CachedModelBackend().get_user(self.user.pk)
+        self.question = Question.objects.create(question_text="Budget question")
+        self.choices = [Choice.objects.create(question=self.question, choice_text=f"C{n}")
+                        for n in range(5)]
+        for n in range(5):
+            Question.objects.create(question_text=f"Other {n}")
+
+    def test_index(self):
+        """
+        The index reads a whole page of questions in one query, plus the
+        next opening and closing (for the cache expiry), and none once cached.
+        """
+        with self.assertNumQueries(self.auth_queries + 3):
+            self.client.get(reverse("polls:index"))
+        with self.assertNumQueries(self.auth_queries):
+            self.client.get(reverse("polls:index"))
+
+    def test_index_anonymous(self):
+        """Anonymous visitors have no session to load, and get cached pages."""
+        self.client.logout()
+        with self.assertNumQueries(3):
+            self.client.get(reverse("polls:index"))
+        with self.assertNumQueries(0):
+            self.client.get(reverse("polls:index"))
+
+    def test_detail(self):
+        """Question plus previous vote, then the choices."""
+        with self.assertNumQueries(self.auth_queries + 2):
+            self.client.get(reverse("polls:detail", args=(self.question.id,)))
+
+    def test_detail_with_previous_vote(self):
+        """A previous vote does not cost an extra query."""
+        Vote.objects.create(user=self.user, choice=self.choices[2])
+        with self.assertNumQueries(self.auth_queries + 2):
+            response = self.client.get(reverse("polls:detail", args=(self.question.id,)))
+        self.assertEqual(response.context["voted_choice"], self.choices[2].id)
+
+    def test_results(self):
+        """Results are one query on a cache miss and none on a hit."""
+        url = reverse("polls:results", args=(self.question.id,))
+        with self.assertNumQueries(self.auth_queries + 1):
+            self.client.get(url)
+        with self.assertNumQueries(self.auth_queries):
+            self.client.get(url)
+
+    def test_vote(self):
+        """
+        Choice lookup, then in one transaction (savepoint and release in tests):
+        previous vote, upsert and tally update.
+        """
+        url = reverse("polls:vote", args=(self.question.id,))
+        with self.assertNumQueries(self.auth_queries + 6):
+            self.client.post(url, {"choice": self.choices[0].id})
+        with self.assertNumQueries(self.auth_queries + 6):
+            self.client.post(url, {"choice": self.choices[1].id})
+
+    def test_same_vote_again(self):
+        """Re-submitting the same choice skips the writes."""
+        url = reverse("polls:vote", args=(self.question.id,))
+        self.client.post(url, {"choice": self.choices[0].id})
+        with self.assertNumQueries(self.auth_queries + 4):
+            self.client.post(url, {"choice": self.choices[0].id})
+
+
+@override_settings(**settings.POLLS_SESSION_PROFILES["signed_cookies"])
+class SignedCookieQueryBudgetTests(QueryBudgetTests):
+    """With sessions and messages in cookies and cached users, auth is free."""
+
+    auth_queries = 0
+
+
+@override_settings(**settings.POLLS_SESSION_PROFILES["cached_db"])
+class CachedSessionQueryBudgetTests(QueryBudgetTests):
+    """Cached sessions are only read from the database on a cache miss."""
+
+    auth_queries = 0
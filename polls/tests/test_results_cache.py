@@ -0,0 +1,158 @@
+"""
+This module contains Unittests for the versioned poll results cache.
+"""
+
+import tempfile
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from polls.cache import ResultsCache, results_cache
+from polls.checks import check_shared_caches
+from polls.models import Question, Choice, Vote, User
+
+
+class ResultsCacheTests(TestCase):
+    """Results are cached per question version and invalidated by votes."""
+
+    def setUp(self):
+        """Create a question with a choice and an empty cache."""
+        results_cache.clear()
+        self.question = Question.objects.create(question_text="Cached question")
+        self.choice = Choice.objects.create(question=self.question, choice_text="Only")
+
+    def test_second_read_is_a_hit(self):
+        """Reading the same results twice only queries the database once."""
+        with self.assertNumQueries(1):
+            results_cache.get(self.question.id)
+            results_cache.get(self.question.id)
+        self.assertEqual(results_cache.stats()["hits"], 1)
+        self.assertEqual(results_cache.stats()["misses"], 1)
+
+    def test_vote_invalidates_results(self):
+        """A committed vote bumps the version so the new tally is read."""
+        self.assertEqual(results_cache.get(self.question.id)["total_votes"], 0)
+        User.objects.create_user(username='voter', password='12345')
+        self.client.login(username='voter', password='12345')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse("polls:vote", args=(self.question.id,)),
+                             {"choice": self.choice.id})
+        self.assertEqual(results_cache.get(self.question.id)["total_votes"], 1)
+
+    def voted(self):
+        """A user who voted for the choice, with the results cached."""
+        user = User.objects.create_user(username='voter', password='12345')
+        with self.captureOnCommitCallbacks(execute=True):
+            Vote.objects.create(user=user, choice=self.choice)
+            Choice.add_votes_many({self.choice.id: 1})
+        self.assertEqual(results_cache.get(self.question.id)["total_votes"], 1)
+        return user
+
+    def test_deleted_vote_invalidates_results(self):
+        """Deleting a vote is visible on the next read."""
+        user = self.voted()
+        with self.captureOnCommitCallbacks(execute=True):
+            Vote.objects.get(user=user).delete()
+        self.assertEqual(results_cache.get(self.question.id)["total_votes"], 0)
+
+    def test_deleted_votes_invalidate_results(self):
+        """Deleting votes in bulk is visible on the next read."""
+        user = self.voted()
+        with self.captureOnCommitCallbacks(execute=True):
+            Vote.objects.filter(user=user).delete()
+        self.assertEqual(results_cache.get(self.question.id)["total_votes"], 0)
+
+    def test_deleted_user_invalidates_results(self):
+        """The votes of a deleted user are gone from the next read."""
+        user = self.voted()
+        with self.captureOnCommitCallbacks(execute=True):
+            user.delete()
+        self.assertEqual(results_cache.get(self.question.id)["total_votes"], 0)
+
+    def test_reconcile_invalidates_results(self):
+        """Tallies rebuilt by reconcile_votes are visible on the next read."""
+        self.voted()
+        Choice.objects.filter(pk=self.choice.pk).update(vote_count=5)
+        results_cache.bump(self.question.id)
+        self.assertEqual(results_cache.get(self.question.id)["total_votes"], 5)
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command("reconcile_votes", stdout=StringIO())
+        self.assertEqual(results_cache.get(self.question.id)["total_votes"], 1)
+
+    def test_choice_edit_invalidates_results(self):
+        """Renaming a choice is visible on the next read."""
+        results_cache.get(self.question.id)
+        self.choice.choice_text = "Renamed"
+        self.choice.save()
+        results = results_cache.get(self.question.id)
+        self.assertEqual(results["choices"][0]["choice_text"], "Renamed")
+
+    def test_lru_eviction(self):
+        """The least recently used question is evicted past max_entries."""
+        cache = ResultsCache(max_entries=2)
+        other = Question.objects.create(question_text="Other")
+        third = Question.objects.create(question_text="Third")
+        cache.get(self.question.id)
+        cache.get(other.id)
+        cache.get(self.question.id)
+        cache.get(third.id)
+        self.assertEqual(cache.stats()["evictions"], 1)
+        self.assertEqual(cache.stats()["size"], 2)
+        # `other` was the least recently used, so it is read again
+        with self.assertNumQueries(1):
+            cache.get(other.id)
+
+    def test_superseded_entry_is_deleted(self):
+        """Once a vote bumps the version, the entry of the old one is deleted."""
+        results_cache.get(self.question.id)
+        old_key = results_cache.results_key(self.question.id,
+                                            results_cache.version(self.question.id))
+        results_cache.bump(self.question.id)
+        results_cache.get(self.question.id)
+        self.assertIsNone(results_cache.backend.get(old_key))
+        self.assertEqual(results_cache.stats()["evictions"], 0)
+
+    def test_local_cache_with_several_workers(self):
+        """A per-process cache is reported when several workers share the app."""
+        self.assertEqual(check_shared_caches(None), [])
+        with override_settings(POLLS_WORKERS=2):
+            warnings = check_shared_caches(None)
+        self.assertEqual([warning.id for warning in warnings], ["polls.W001"] * 3)
+
+    def test_metrics_require_staff(self):
+        """Cache counters are only exposed to staff."""
+        response = self.client.get(reverse("polls:metrics"))
+        self.assertEqual(response.status_code, 302)
+        User.objects.create_user(username='staff', password='12345', is_staff=True)
+        self.client.login(username='staff', password='12345')
+        response = self.client.get(reverse("polls:metrics"))
+        self.assertContains(response, "polls_results_cache_hits_total")
+
+
+class FileBasedResultsCacheTests(TestCase):
+    """The results cache also works on the file-based backend."""
+
+    def setUp(self):
+        """Point the results alias at a temporary cache directory."""
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings = override_settings(CACHES={
+            "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+            "results": {"BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+                        "LOCATION": directory.name},
+        })
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.question = Question.objects.create(question_text="File cached")
+
+    def test_hit_and_invalidate(self):
+        """Entries survive between reads and a bump invalidates them."""
+        cache = ResultsCache()
+        cache.get(self.question.id)
+        with self.assertNumQueries(0):
+            cache.get(self.question.id)
+        cache.bump(self.question.id)
+        with self.assertNumQueries(1):
+            cache.get(self.question.id)
@@ -0,0 +1,165 @@
+"""
+This module contains Unittests for read-replica routing.
+"""
+
+import os
+import sqlite3
+import tempfile
+import unittest
+from unittest import mock
+
+from asgiref.sync import iscoroutinefunction
+from django.contrib.auth.models import User as AuthUser
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection, connections
+from django.http import HttpResponse
+from django.test import (Client, RequestFactory, SimpleTestCase, TransactionTestCase,
+                         override_settings)
+from django.urls import reverse
+
+from polls.cache import results_cache
+from polls.conditional import etag
+from polls.models import Question, Choice, Vote, User
+from polls.routers import (COOKIE_NAME, ReadReplicaRouter, ReadYourWritesMiddleware,
+                           bounded_timeout)
+
+
+@override_settings(POLLS_READ_REPLICAS=["replica1"], POLLS_REPLICA_STICKY_SECONDS=5)
+class ReadReplicaRouterTests(SimpleTestCase):
+    """Polls reads go to a replica unless the client just wrote."""
+
+    def setUp(self):
+        """A router and a middleware reporting where Question reads go."""
+        self.router = ReadReplicaRouter()
+        self.factory = RequestFactory()
+        self.middleware = ReadYourWritesMiddleware(
+            lambda request: HttpResponse(self.router.db_for_read(Question)))
+
+    def read_database(self, request):
+        """The alias a Question read goes to during the request, and the response."""
+        response = self.middleware(request)
+        return response.content.decode(), response
+
+    def test_reads_and_writes(self):
+        """Polls reads of a request use the replica; anything else uses the primary."""
+        self.assertEqual(self.read_database(self.factory.get("/polls/"))[0], "replica1")
+        middleware = ReadYourWritesMiddleware(lambda request: HttpResponse(
+            self.router.db_for_read(AuthUser) + " " + self.router.db_for_write(Vote)))
+        self.assertEqual(middleware(self.factory.get("/polls/")).content, b"default default")
+        # e.g. migrations and management commands
+        self.assertEqual(self.router.db_for_read(Question), "default")
+
+    @override_settings(POLLS_READ_REPLICAS=[])
+    def test_no_replicas(self):
+        """Without replicas the middleware is not used and everything uses the primary."""
+        with self.assertRaises(MiddlewareNotUsed):
+            ReadYourWritesMiddleware(HttpResponse)
+        self.assertEqual(self.router.db_for_read(Question), "default")
+
+    async def test_async_mode(self):
+        """In front of async views the middleware is async itself and still pins."""
+        async def get_response(request):
+            return HttpResponse(self.router.db_for_read(Question))
+
+        middleware = ReadYourWritesMiddleware(get_response)
+        self.assertTrue(iscoroutinefunction(middleware))
+        response = await middleware(self.factory.post("/polls/1/vote/"))
+        self.assertEqual(response.content, b"default")
+        self.assertIn(COOKIE_NAME, response.cookies)
+        response = await middleware(self.factory.get("/polls/"))
+        self.assertEqual(response.content, b"replica1")
+
+    def test_replica_etags_expire(self):
+        """Tags of replica reads differ from the primary's and change every window."""
+        middleware = ReadYourWritesMiddleware(lambda request: HttpResponse(etag("v1")))
+        with mock.patch("polls.conditional.time.time", return_value=1000.0):
+            tag = middleware(self.factory.get("/polls/")).content
+            self.assertNotEqual(tag.decode(), etag("v1"))
+        with mock.patch("polls.conditional.time.time", return_value=1004.0):
+            self.assertEqual(middleware(self.factory.get("/polls/")).content, tag)
+        with mock.patch("polls.conditional.time.time", return_value=1005.0):
+            self.assertNotEqual(middleware(self.factory.get("/polls/")).content, tag)
+
+    def test_read_your_writes(self):
+        """After a POST the client reads from the primary within the window."""
+        database, response = self.read_database(self.factory.post("/polls/1/vote/"))
+        self.assertEqual(database, "default")
+        cookie = response.cookies[COOKIE_NAME]
+        self.assertEqual(cookie["max-age"], 5)
+        request = self.factory.get("/polls/1/results/")
+        request.COOKIES[COOKIE_NAME] = cookie.value
+        self.assertEqual(self.read_database(request)[0], "default")
+
+    def test_expired_or_forged_cookie(self):
+        """A cookie older than the window, or not signed by us, is ignored."""
+        database, response = self.read_database(self.factory.post("/polls/1/vote/"))
+        request = self.factory.get("/polls/1/results/")
+        request.COOKIES[COOKIE_NAME] = response.cookies[COOKIE_NAME].value
+        with override_settings(POLLS_REPLICA_STICKY_SECONDS=-1):
+            self.assertEqual(self.read_database(request)[0], "replica1")
+        request.COOKIES[COOKIE_NAME] = "1"
+        self.assertEqual(self.read_database(request)[0], "replica1")
+
+    def test_failed_write_is_not_sticky(self):
+        """A rejected POST reads from the primary but does not set the cookie."""
+        middleware = ReadYourWritesMiddleware(lambda request: HttpResponse(status=403))
+        response = middleware(self.factory.post("/polls/1/vote/"))
+        self.assertNotIn(COOKIE_NAME, response.cookies)
+
+    def test_replica_reads_are_cached_briefly(self):
+        """Data read from a replica is cached no longer than the sticky window."""
+        middleware = ReadYourWritesMiddleware(lambda request: HttpResponse(
+            f"{bounded_timeout(None)} {bounded_timeout(2)}"))
+        self.assertEqual(middleware(self.factory.get("/polls/")).content, b"5 2")
+        self.assertEqual(middleware(self.factory.post("/polls/1/vote/")).content, b"None 2")
+
+
+@unittest.skipUnless(connection.vendor == "sqlite", "the replica is a SQLite snapshot")
+class LaggingReplicaTests(TransactionTestCase):
+    """
+    Read-your-writes against a real second SQLite database, a snapshot of
+    the primary that does not see later writes, like a lagging replica.
+    """
+
+    def setUp(self):
+        """Snapshot the primary into a replica file and route reads to it."""
+        results_cache.clear()
+        self.question = Question.objects.create(question_text="Replicated question")
+        self.choice = Choice.objects.create(question=self.question, choice_text="Only")
+        User.objects.create_user(username="voter", password="12345")
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, "replica.sqlite3")
+        connection.ensure_connection()
+        with sqlite3.connect(path) as replica:
+            connection.connection.backup(replica)
+        replica.close()
+        connections.settings["replica1"] = dict(connections.settings["default"], NAME=path)
+        self.addCleanup(self.remove_replica)
+        # the test may use the alias it just added
+        patcher = mock.patch.object(type(self), "databases", {"default", "replica1"})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        settings = override_settings(POLLS_READ_REPLICAS=["replica1"])
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    @staticmethod
+    def remove_replica():
+        """Close and forget the replica connection."""
+        connections["replica1"].close()
+        del connections["replica1"]
+        del connections.settings["replica1"]
+
+    def test_voter_reads_own_vote(self):
+        """
+        Other clients read the lagging replica and cache what they read,
+        but the voter's results come from the primary and count the vote.
+        """
+        url = reverse("polls:results_json", args=(self.question.id,))
+        voter, reader = Client(), Client()
+        voter.login(username="voter", password="12345")
+        voter.post(reverse("polls:vote", args=(self.question.id,)), {"choice": self.choice.id})
+        self.assertEqual(reader.get(url).json()["total_votes"], 0)
+        self.assertEqual(voter.get(url).json()["total_votes"], 1)
+        self.assertEqual(reader.get(url).json()["total_votes"], 1)
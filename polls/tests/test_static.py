@@ -0,0 +1,100 @@
+"""
+This module contains Unittests for the static files pipeline.
+"""
+
+import gzip
+import os
+import tempfile
+
+from asgiref.sync import iscoroutinefunction
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.management import call_command
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import reverse
+
+from polls.assets import StaticFilesMiddleware
+from polls.cache import catalog_cache
+from polls.models import Question, Choice
+
+MANIFEST_STORAGES = {
+    "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+    "staticfiles": {"BACKEND": "polls.storage.CompressedManifestStaticFilesStorage"},
+}
+
+
+class StaticPipelineTests(TestCase):
+    """collectstatic writes hashed, precompressed files the app can serve."""
+
+    def setUp(self):
+        """Collect the static files into a scratch STATIC_ROOT."""
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.root = directory.name
+        settings = override_settings(STATIC_ROOT=self.root, STORAGES=MANIFEST_STORAGES,
+                                     POLLS_SERVE_STATIC=True)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        call_command("collectstatic", interactive=False, verbosity=0)
+        catalog_cache.bump()
+        self.css = staticfiles_storage.url("polls/style.css")
+
+    def test_hashed_and_compressed(self):
+        """The stylesheet gets a content hash and a gzip variant of the same bytes."""
+        self.assertRegex(self.css, r"^/static/polls/style\.[0-9a-f]{12}\.css$")
+        path = os.path.join(self.root, self.css[len("/static/"):])
+        with open(path, "rb") as original, gzip.open(path + ".gz") as compressed:
+            self.assertEqual(original.read(), compressed.read())
+
+    def test_pages_link_hashed_stylesheet(self):
+        """Templates link the hashed name, which is cached for good."""
+        response = self.client.get(reverse("polls:index"))
+        self.assertContains(response, self.css)
+        response = self.client.get(self.css, HTTP_ACCEPT_ENCODING="gzip, deflate")
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertEqual(response["Cache-Control"], "public, max-age=31536000, immutable")
+        self.assertEqual(response["Vary"], "Accept-Encoding")
+        self.assertEqual(gzip.decompress(b"".join(response.streaming_content))[:2], b"h1")
+
+    def test_etag_revalidation(self):
+        """Unhashed names are revalidated; a matching ETag gets a 304."""
+        response = self.client.get("/static/polls/style.css")
+        self.assertEqual(response["Cache-Control"], "public, no-cache")
+        self.assertNotIn("Content-Encoding", response)
+        response = self.client.get("/static/polls/style.css",
+                                   HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response["Cache-Control"], "public, no-cache")
+
+    def test_missing_and_outside_files(self):
+        """Unknown files and paths outside STATIC_ROOT are not found."""
+        self.assertEqual(self.client.get("/static/polls/missing.css").status_code, 404)
+        self.assertEqual(self.client.get("/static/../manage.py").status_code, 404)
+
+    async def test_async_mode(self):
+        """In front of async views the middleware is async and still serves files."""
+        async def get_response(request):
+            return HttpResponse("view")
+
+        middleware = StaticFilesMiddleware(get_response)
+        self.assertTrue(iscoroutinefunction(middleware))
+        factory = RequestFactory()
+        response = await middleware(factory.get("/static/polls/style.css"))
+        self.addCleanup(response.close)
+        self.assertEqual(response["Cache-Control"], "public, no-cache")
+        response = await middleware(factory.get("/polls/"))
+        self.assertEqual(response.content, b"view")
+
+
+class InlineStyleTests(TestCase):
+    """Styling lives in the stylesheet, not in the pages."""
+
+    def test_no_inline_styles(self):
+        question = Question.objects.create(question_text="Styled question")
+        Choice.objects.create(question=question, choice_text="First")
+        for url in (reverse("polls:index"), reverse("polls:detail", args=(question.id,)),
+                    reverse("polls:results", args=(question.id,))):
+            content = self.client.get(url, follow=True).content.decode()
+            self.assertNotIn("style=", content, url)
+            self.assertNotIn("bgcolor", content, url)
+            self.assertNotIn("<style", content, url)
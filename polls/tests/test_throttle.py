@@ -0,0 +1,174 @@
+"""
+This module contains Unittests for login throttling.
+"""
+
+import tempfile
+import threading
+from unittest import mock
+
+from django.contrib.auth import authenticate
+from django.core.cache import cache, caches
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+
+from polls.cache_backends import LockedFileBasedCache
+from polls.checks import check_throttle_cache
+from polls.models import User
+from polls.throttle import SlidingWindowCounter, login_throttle, throttle_ip
+
+
+class SlidingWindowCounterTests(SimpleTestCase):
+    """Events are counted over the last window seconds, bucket by bucket."""
+
+    def setUp(self):
+        caches["throttle"].clear()
+        self.counter = SlidingWindowCounter("test", window=100, buckets=10, alias="throttle")
+
+    def test_counts_within_window(self):
+        """Events older than the window no longer count."""
+        for now in (1000, 1005, 1050):
+            self.counter.add("key", now=now)
+        self.assertEqual(self.counter.count("key", now=1050), 3)
+        self.assertEqual(self.counter.count("other", now=1050), 0)
+        self.assertEqual(self.counter.count("key", now=1120), 1)
+
+    def test_oldest_bucket_is_weighted(self):
+        """The bucket sliding out of the window counts for what still overlaps."""
+        self.counter.add("key", now=1000)
+        self.counter.add("key", now=1001)
+        # window (1005, 1105]: half of bucket [1000, 1010)
+        self.assertAlmostEqual(self.counter.count("key", now=1105), 1)
+
+    def test_clear(self):
+        self.counter.add("key", now=1000)
+        self.counter.clear("key", now=1000)
+        self.assertEqual(self.counter.count("key", now=1000), 0)
+
+
+class LoginThrottleTests(TestCase):
+    """Logins are refused without checking the password once throttled."""
+
+    def setUp(self):
+        caches["throttle"].clear()
+        self.user = User.objects.create_user(username='target', password='right-password')
+        self.factory = RequestFactory()
+
+    def login(self, password, username="target", ip="10.0.0.1", **headers):
+        request = self.factory.post("/accounts/login/", REMOTE_ADDR=ip, headers=headers)
+        return authenticate(request, username=username, password=password)
+
+    def test_throttled_before_hashing(self):
+        """After 5 failures even the right password is refused, without hashing."""
+        for _ in range(5):
+            self.assertIsNone(self.login("wrong"))
+        with mock.patch.object(User, "check_password") as check_password, \
+                mock.patch.object(User, "set_password") as set_password:
+            self.assertIsNone(self.login("right-password"))
+        check_password.assert_not_called()
+        set_password.assert_not_called()
+        # refused attempts do not extend the lockout
+        self.assertEqual(login_throttle.usernames.count("target"), 5)
+
+    def test_success_clears_failures(self):
+        """Failures before a successful login are forgotten."""
+        for _ in range(4):
+            self.login("wrong")
+        self.client.login(username="target", password="right-password")
+        self.assertEqual(login_throttle.usernames.count("target"), 0)
+
+    def test_throttled_by_ip(self):
+        """Failures over many usernames from one IP throttle that IP only."""
+        with mock.patch.object(login_throttle, "max_per_ip", 3):
+            for n in range(3):
+                self.login("wrong", username=f"guess{n}")
+            self.assertIsNone(self.login("right-password"))
+            self.assertEqual(self.login("right-password", ip="10.0.0.2"), self.user)
+
+    def test_counters_survive_a_full_page_cache(self):
+        """Entries anyone can add to the other caches do not evict the counters."""
+        for _ in range(5):
+            self.login("wrong")
+        cache.set_many({f"polls:page:{n}": n for n in range(400)})
+        self.assertIsNone(self.login("right-password"))
+
+    def test_forwarded_for_is_not_trusted(self):
+        """A new X-Forwarded-For address on every attempt does not dodge the limit."""
+        with mock.patch.object(login_throttle, "max_per_ip", 3):
+            for n in range(3):
+                self.login("wrong", username=f"guess{n}", x_forwarded_for=f"192.0.2.{n}")
+            self.assertIsNone(self.login("right-password", x_forwarded_for="192.0.2.99"))
+
+    @override_settings(POLLS_TRUSTED_PROXIES=1)
+    def test_trusted_proxy(self):
+        """Behind a proxy, the address it appended is counted, not the ones before it."""
+        with mock.patch.object(login_throttle, "max_per_ip", 3):
+            for n in range(3):
+                self.login("wrong", username=f"guess{n}", ip="10.0.0.9",
+                           x_forwarded_for=f"192.0.2.{n}, 198.51.100.7")
+            self.assertIsNone(self.login("right-password", ip="10.0.0.9",
+                                         x_forwarded_for="192.0.2.99, 198.51.100.7"))
+            self.assertEqual(self.login("right-password", ip="10.0.0.9",
+                                        x_forwarded_for="198.51.100.8"), self.user)
+
+    @override_settings(POLLS_LOGIN_THROTTLE=False)
+    def test_disabled(self):
+        for _ in range(6):
+            self.login("wrong")
+        self.assertEqual(self.login("right-password"), self.user)
+
+
+class ThrottleIpTests(SimpleTestCase):
+    """The throttled IP is the one set by the server or a trusted proxy."""
+
+    def setUp(self):
+        self.factory = RequestFactory()
+
+    def test_remote_addr(self):
+        request = self.factory.get("/", REMOTE_ADDR="10.0.0.1",
+                                   headers={"x-forwarded-for": "192.0.2.1"})
+        self.assertEqual(throttle_ip(request), "10.0.0.1")
+
+    @override_settings(POLLS_TRUSTED_PROXIES=2)
+    def test_trusted_proxies(self):
+        """With two proxies, the second entry from the right is the client."""
+        request = self.factory.get(
+            "/", REMOTE_ADDR="10.0.0.1",
+            headers={"x-forwarded-for": "192.0.2.1, 198.51.100.7, 10.0.0.2"})
+        self.assertEqual(throttle_ip(request), "198.51.100.7")
+        # fewer hops than proxies: the header did not come through them
+        request = self.factory.get("/", REMOTE_ADDR="10.0.0.1",
+                                   headers={"x-forwarded-for": "192.0.2.1"})
+        self.assertEqual(throttle_ip(request), "10.0.0.1")
+
+
+class LockedFileBasedCacheTests(SimpleTestCase):
+    """Counters in the shared throttle cache are never lost to a race."""
+
+    def test_concurrent_increments(self):
+        """Eight threads counting at once reach the exact total."""
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        backend = LockedFileBasedCache(directory.name, {})
+        counter = SlidingWindowCounter("test", window=100, buckets=10)
+
+        def count():
+            for _ in range(25):
+                counter.add("key", now=1000)
+
+        with mock.patch.object(SlidingWindowCounter, "backend", backend):
+            threads = [threading.Thread(target=count) for _ in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            self.assertEqual(counter.count("key", now=1000), 200)
+
+    def test_checks(self):
+        """Several workers need a throttle cache that increments atomically."""
+        caches = {"throttle": {"BACKEND": "django.core.cache.backends.filebased."
+                                          "FileBasedCache"}}
+        with override_settings(POLLS_WORKERS=2, CACHES=caches):
+            self.assertEqual([warning.id for warning in check_throttle_cache(None)],
+                             ["polls.W002"])
+        caches["throttle"]["BACKEND"] = "polls.cache_backends.LockedFileBasedCache"
+        with override_settings(POLLS_WORKERS=2, CACHES=caches):
+            self.assertEqual(check_throttle_cache(None), [])
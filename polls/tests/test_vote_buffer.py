@@ -0,0 +1,196 @@
+"""
+This module contains Unittests for the write-behind vote buffer.
+"""
+
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from polls.buffer import VoteBuffer, fcntl
+from polls.models import Question, Choice, Vote, User
+
+
+class VoteBufferTests(TestCase):
+    """Votes are acknowledged from the journal and committed in batches."""
+
+    def setUp(self):
+        """Create a user, a question with two choices and a started buffer."""
+        self.user = User.objects.create_user(username='voter', password='12345')
+        self.question = Question.objects.create(question_text="Buffered question")
+        self.first = Choice.objects.create(question=self.question, choice_text="First")
+        self.second = Choice.objects.create(question=self.question, choice_text="Second")
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.journal = os.path.join(directory.name, "votes.journal")
+        self.buffer = self.make_buffer()
+
+    def make_buffer(self):
+        """A started buffer whose thread is not run (flush() is called instead)."""
+        buffer = VoteBuffer(self.journal, fsync=False)
+        buffer.start(thread=False)
+        return buffer
+
+    def results(self):
+        """Committed results with the buffered votes counted in."""
+        results = {"id": self.question.id, "total_votes": 0, "choices": [
+            {"id": choice.id, "votes": choice.votes}
+            for choice in Choice.objects.filter(question=self.question).order_by("id")]}
+        results["total_votes"] = sum(choice["votes"] for choice in results["choices"])
+        return self.buffer.overlay(results)
+
+    def test_submit_does_not_write_votes(self):
+        """A buffered vote is journaled but not committed."""
+        self.assertIsNone(self.buffer.submit(self.user.id, self.question.id, self.first.id))
+        self.assertFalse(Vote.objects.exists())
+        with open(self.journal) as journal:
+            self.assertEqual(json.loads(journal.read()), {
+                "user": self.user.id, "question": self.question.id, "choice": self.first.id})
+
+    def test_overlay_counts_buffered_votes(self):
+        """Results and the user's choice include buffered votes, changed ones moved."""
+        self.buffer.submit(self.user.id, self.question.id, self.first.id)
+        self.assertEqual([c["votes"] for c in self.results()["choices"]], [1, 0])
+        self.assertEqual(self.buffer.submit(self.user.id, self.question.id, self.second.id),
+                         self.first.id)
+        self.assertEqual([c["votes"] for c in self.results()["choices"]], [0, 1])
+        self.assertEqual(self.results()["total_votes"], 1)
+        self.assertEqual(self.buffer.pending_choice(self.user.id, self.question.id),
+                         self.second.id)
+
+    def test_flush_commits_latest_vote(self):
+        """Flushing commits the last choice per user and empties the overlay."""
+        self.buffer.submit(self.user.id, self.question.id, self.first.id)
+        self.buffer.submit(self.user.id, self.question.id, self.second.id)
+        self.assertEqual(self.buffer.flush(), 1)
+        self.assertEqual(Vote.objects.get(user=self.user).choice, self.second)
+        self.assertEqual([c["votes"] for c in self.results()["choices"]], [0, 1])
+        self.assertFalse(os.path.exists(self.buffer.flushing_path))
+        self.assertEqual(os.path.getsize(self.journal), 0)
+
+    def test_change_after_flush_moves_committed_vote(self):
+        """A buffered change of a committed vote replaces it in the overlay."""
+        self.buffer.submit(self.user.id, self.question.id, self.first.id)
+        self.buffer.flush()
+        self.assertEqual(self.buffer.submit(self.user.id, self.question.id, self.second.id),
+                         self.first.id)
+        self.assertEqual([c["votes"] for c in self.results()["choices"]], [0, 1])
+
+    def test_failed_flush_keeps_votes(self):
+        """Votes of a batch that fails to commit stay buffered and journaled."""
+        self.buffer.submit(self.user.id, self.question.id, self.first.id)
+        with mock.patch.object(VoteBuffer, "_commit", side_effect=RuntimeError), \
+                self.assertLogs("polls.buffer", "ERROR"), self.assertRaises(RuntimeError):
+            self.buffer.flush()
+        self.assertEqual([c["votes"] for c in self.results()["choices"]], [1, 0])
+        self.assertEqual(self.buffer.flush(), 1)
+        self.assertEqual(Vote.objects.get(user=self.user).choice, self.first)
+
+    def test_journal_replayed_on_start(self):
+        """Votes journaled before a crash are committed when a new buffer starts."""
+        self.buffer.submit(self.user.id, self.question.id, self.first.id)
+        self.assertFalse(Vote.objects.exists())
+        self.make_buffer()
+        self.assertEqual(Vote.objects.get(user=self.user).choice, self.first)
+
+    def test_started_buffer_does_not_wait_for_flush(self):
+        """Votes do not queue behind a batch commit in progress."""
+        with self.buffer._flush_lock:
+            thread = threading.Thread(target=self.buffer.start)
+            thread.start()
+            thread.join(timeout=1)
+        self.assertFalse(thread.is_alive())
+
+
+@unittest.skipIf(fcntl is None, "journal locks need fcntl")
+class PerProcessJournalTests(TestCase):
+    """Every worker journals to its own file and only replays those of dead ones."""
+
+    def setUp(self):
+        """Create a user and a question with a choice."""
+        self.user = User.objects.create_user(username='voter', password='12345')
+        self.question = Question.objects.create(question_text="Buffered question")
+        self.choice = Choice.objects.create(question=self.question, choice_text="First")
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.base = os.path.join(directory.name, "votes.journal")
+
+    def orphan_journal(self, pid):
+        """Write the journal of another worker, holding one vote."""
+        path = f"{self.base}.{pid}"
+        with open(path, "w") as journal:
+            journal.write(json.dumps({"user": self.user.id, "question": self.question.id,
+                                      "choice": self.choice.id}) + "\n")
+        return path
+
+    def test_journal_path_has_pid(self):
+        """The process id is appended to the configured journal path."""
+        buffer = VoteBuffer(self.base, fsync=False, per_process=True)
+        buffer.start(thread=False)
+        self.addCleanup(buffer.stop)
+        self.assertEqual(buffer.journal_path, f"{self.base}.{os.getpid()}")
+
+    def test_dead_worker_journal_replayed(self):
+        """A journal whose lock is free belonged to a dead worker and is replayed."""
+        path = self.orphan_journal(4000000)
+        buffer = VoteBuffer(self.base, fsync=False, per_process=True)
+        buffer.start(thread=False)
+        self.addCleanup(buffer.stop)
+        self.assertEqual(Vote.objects.get(user=self.user).choice, self.choice)
+        self.assertFalse(os.path.exists(path))
+
+    def test_live_worker_journal_left_alone(self):
+        """The journal of a worker that still holds its lock is not touched."""
+        path = self.orphan_journal(4000001)
+        holder = subprocess.Popen(
+            [sys.executable, "-c", "import fcntl, sys, time\n"
+             "lock = open(sys.argv[1], 'a'); fcntl.lockf(lock, fcntl.LOCK_EX)\n"
+             "print('locked', flush=True); time.sleep(60)", path + ".lock"],
+            stdout=subprocess.PIPE, text=True)
+        self.addCleanup(holder.wait)
+        self.addCleanup(holder.kill)
+        self.assertEqual(holder.stdout.readline().strip(), "locked")
+        holder.stdout.close()
+        buffer = VoteBuffer(self.base, fsync=False, per_process=True)
+        buffer.start(thread=False)
+        self.addCleanup(buffer.stop)
+        self.assertFalse(Vote.objects.exists())
+        self.assertTrue(os.path.exists(path))
+
+
+class WriteBehindVoteViewTests(TestCase):
+    """In write-behind mode the vote view buffers the vote."""
+
+    def setUp(self):
+        """Create a user, a question with a choice and log in."""
+        self.user = User.objects.create_user(username='voter', password='12345')
+        self.client.login(username='voter', password='12345')
+        self.question = Question.objects.create(question_text="Buffered question")
+        self.choice = Choice.objects.create(question=self.question, choice_text="First")
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.buffer = VoteBuffer(os.path.join(directory.name, "votes.journal"), fsync=False)
+        self.buffer.start(thread=False)
+        patcher = mock.patch("polls.voting.vote_buffer", self.buffer)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    @override_settings(POLLS_WRITE_BEHIND=True)
+    def test_vote_is_seen_before_commit(self):
+        """The user's vote shows in the results and the form before it is committed."""
+        response = self.client.post(reverse("polls:vote", args=(self.question.id,)),
+                                    {"choice": self.choice.id}, follow=True)
+        self.assertContains(response, "You voted for First.")
+        self.assertFalse(Vote.objects.exists())
+        self.assertEqual(response.context["question"]["choices"][0]["votes"], 1)
+        response = self.client.get(reverse("polls:detail", args=(self.question.id,)))
+        self.assertEqual(response.context["voted_choice"], self.choice.id)
+        self.buffer.flush()
+        self.assertEqual(Vote.objects.get(user=self.user).choice, self.choice)
@@ -0,0 +1,208 @@
+"""
+This module contains Unittests for the maintained per-choice vote tallies.
+"""
+
+import threading
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.db import IntegrityError, OperationalError, connection, transaction
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from polls.models import Question, Choice, Vote, User
+from polls.voting import cast_vote, retry_locked
+
+
+class VoteTallyTests(TestCase):
+    """Choice.vote_count stays equal to the number of Vote rows."""
+
+    def setUp(self):
+        """Create a user, a question with two choices and log in."""
+        self.user = User.objects.create_user(username='voter', password='12345')
+        self.client.login(username='voter', password='12345')
+        self.question = Question.objects.create(question_text="Tally question")
+        self.first = Choice.objects.create(question=self.question, choice_text="First")
+        self.second = Choice.objects.create(question=self.question, choice_text="Second")
+
+    def vote_for(self, choice):
+        """Submit a vote for the given choice."""
+        return self.client.post(reverse("polls:vote", args=(self.question.id,)),
+                                {"choice": choice.id})
+
+    def test_new_vote_increments_tally(self):
+        """Voting for the first time adds one to the chosen choice."""
+        self.vote_for(self.first)
+        self.first.refresh_from_db()
+        self.assertEqual(self.first.votes, 1)
+
+    def test_changed_vote_moves_tally(self):
+        """Changing a vote moves the count from the old choice to the new one."""
+        self.vote_for(self.first)
+        self.vote_for(self.second)
+        self.first.refresh_from_db()
+        self.second.refresh_from_db()
+        self.assertEqual(self.first.votes, 0)
+        self.assertEqual(self.second.votes, 1)
+
+    def test_same_vote_twice_is_counted_once(self):
+        """Re-submitting the same choice does not change the tally."""
+        self.vote_for(self.first)
+        self.vote_for(self.first)
+        self.first.refresh_from_db()
+        self.assertEqual(self.first.votes, 1)
+
+    def test_deleted_vote_decrements_tally(self):
+        """Deleting a vote removes it from the tally."""
+        self.vote_for(self.first)
+        Vote.objects.get(user=self.user).delete()
+        self.first.refresh_from_db()
+        self.assertEqual(self.first.votes, 0)
+
+    def test_deleted_user_discounts_votes(self):
+        """Deleting a user takes their votes off the tallies in one UPDATE."""
+        other = Question.objects.create(question_text="Other question")
+        other_choice = Choice.objects.create(question=other, choice_text="Other")
+        self.vote_for(self.first)
+        self.client.post(reverse("polls:vote", args=(other.id,)), {"choice": other_choice.id})
+        with CaptureQueriesContext(connection) as queries:
+            self.user.delete()
+        updates = [query["sql"] for query in queries.captured_queries
+                   if query["sql"].startswith('UPDATE "polls_choice"')]
+        self.assertEqual(len(updates), 1)
+        self.first.refresh_from_db()
+        other_choice.refresh_from_db()
+        self.assertEqual((self.first.votes, other_choice.votes), (0, 0))
+
+    def test_deleting_a_question_does_not_load_votes(self):
+        """The votes of a deleted question go in one DELETE, however many there are."""
+        users = User.objects.bulk_create([User(username=f"bulk{n}") for n in range(50)])
+        Vote.objects.bulk_create([Vote(user=user, question=self.question, choice=self.first)
+                                  for user in users])
+        with CaptureQueriesContext(connection) as queries:
+            self.question.delete()
+        self.assertLess(len(queries), 10)
+        self.assertFalse(Vote.objects.exists())
+
+    def test_discount_never_goes_below_zero(self):
+        """Deleting votes a drifted tally never counted leaves it at 0."""
+        Vote.objects.create(user=self.user, choice=self.first)
+        Vote.objects.filter(user=self.user).delete()
+        self.first.refresh_from_db()
+        self.assertEqual(self.first.votes, 0)
+
+    def test_reconcile_rebuilds_tallies(self):
+        """reconcile_votes fixes tallies that drifted from the Vote table."""
+        Vote.objects.create(user=self.user, choice=self.first)
+        Choice.objects.filter(pk=self.second.pk).update(vote_count=7)
+        call_command("reconcile_votes", stdout=StringIO())
+        self.first.refresh_from_db()
+        self.second.refresh_from_db()
+        self.assertEqual(self.first.votes, 1)
+        self.assertEqual(self.second.votes, 0)
+
+    def test_reconcile_counts_under_lock(self):
+        """The votes are counted inside the transaction, after locking the tallies."""
+        with CaptureQueriesContext(connection) as queries:
+            call_command("reconcile_votes", stdout=StringIO())
+        tables = [query["sql"].split(" FROM ")[1].split()[0] for query in queries
+                  if query["sql"].startswith("SELECT")]
+        self.assertEqual(tables, ['"polls_choice"', '"polls_vote"'])
+
+    def test_one_vote_per_user_per_question(self):
+        """The database rejects a second vote row for the same question."""
+        Vote.objects.create(user=self.user, choice=self.first)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Vote.objects.create(user=self.user, choice=self.second)
+
+    def test_vote_is_a_single_write(self):
+        """Casting or changing a vote writes polls_vote with one statement."""
+        for choice in (self.first, self.second):
+            with CaptureQueriesContext(connection) as queries:
+                self.vote_for(choice)
+            writes = [query["sql"] for query in queries.captured_queries
+                      if query["sql"].startswith(("INSERT INTO \"polls_vote\"",
+                                                  "UPDATE \"polls_vote\""))]
+            self.assertEqual(len(writes), 1)
+            self.assertIn("ON CONFLICT", writes[0])
+        self.assertEqual(Vote.objects.get(user=self.user).choice, self.second)
+
+
+class ConcurrentVoteTests(TransactionTestCase):
+    """Simultaneous first votes of a user are counted once, on a real database."""
+
+    def test_double_submission_counted_once(self):
+        """Ten users each submit two choices from two threads at once."""
+        question = Question.objects.create(question_text="Raced question")
+        choices = [Choice.objects.create(question=question, choice_text=text)
+                   for text in ("First", "Second")]
+        users = [User.objects.create_user(username=f"racer{n}") for n in range(10)]
+        errors = []
+
+        def submit(barrier, user, choice):
+            try:
+                barrier.wait()
+                cast_vote(user.pk, question.pk, choice.pk)
+            except OperationalError as error:
+                # the database refused the vote; it must not be counted either
+                errors.append(error)
+            finally:
+                connection.close()
+
+        for user in users:
+            # a double-click that changed the choice in between
+            barrier = threading.Barrier(len(choices))
+            threads = [threading.Thread(target=submit, args=(barrier, user, choice))
+                       for choice in choices]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertLess(len(errors), len(users))
+        for choice in choices:
+            choice.refresh_from_db()
+            self.assertEqual(choice.votes, Vote.objects.filter(choice=choice).count())
+        self.assertEqual(sum(choice.votes for choice in choices), Vote.objects.count())
+
+
+@override_settings(POLLS_VOTE_RETRIES=2, POLLS_VOTE_RETRY_BACKOFF_MS=1)
+class RetryLockedTests(SimpleTestCase):
+    """Vote writes are retried while SQLite reports the database locked."""
+
+    def setUp(self):
+        """Retry outside a transaction, without sleeping."""
+        for patcher in (mock.patch("polls.voting.time.sleep"),
+                        mock.patch("polls.voting.connection", in_atomic_block=False)):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_retried_until_it_succeeds(self):
+        """A write that was locked twice succeeds on the third attempt."""
+        locked = OperationalError("database is locked")
+        write = mock.Mock(__name__="write", side_effect=[locked, locked, 7])
+        self.assertEqual(retry_locked(write, 1, 2), 7)
+        self.assertEqual(write.call_count, 3)
+        write.assert_called_with(1, 2)
+
+    def test_gives_up(self):
+        """The lock error is raised once the retries are used up."""
+        write = mock.Mock(__name__="write",
+                          side_effect=OperationalError("database is locked"))
+        with self.assertRaises(OperationalError):
+            retry_locked(write)
+        self.assertEqual(write.call_count, 3)
+
+    def test_other_errors_are_not_retried(self):
+        """Only lock errors are retried, and never inside a transaction."""
+        write = mock.Mock(__name__="write", side_effect=OperationalError("no such table"))
+        with self.assertRaises(OperationalError):
+            retry_locked(write)
+        self.assertEqual(write.call_count, 1)
+        write = mock.Mock(__name__="write",
+                          side_effect=OperationalError("database is locked"))
+        with mock.patch("polls.voting.connection", in_atomic_block=True), \
+                self.assertRaises(OperationalError):
+            retry_locked(write)
+        self.assertEqual(write.call_count, 1)
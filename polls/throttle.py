@@ -0,0 +1,127 @@
+"""
+This module counts failed logins per username and per client IP in a
+sliding window, so that credential stuffing can be turned away before
+any password is hashed (see polls.backends.LoginThrottleBackend).
+
+A window of W seconds is split into B buckets of W/B seconds, each a
+cache counter that expires on its own once it has left the window, so a
+key never holds more than B + 1 counters. The count at time t is the sum
+of the buckets inside the window plus the share of the oldest partial
+bucket that still overlaps it.
+"""
+
+import hashlib
+import math
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+
+class SlidingWindowCounter:
+    """Approximate count of events per key over the last `window` seconds."""
+
+    def __init__(self, prefix, window=300, buckets=10, alias="default"):
+        self.prefix = prefix
+        self.window = window
+        self.buckets = buckets
+        self.alias = alias
+
+    @property
+    def backend(self):
+        """The Django cache the buckets are stored in."""
+        return caches[self.alias]
+
+    @property
+    def bucket_seconds(self):
+        return self.window / self.buckets
+
+    def bucket_key(self, key, index):
+        """Cache key of one bucket; the key is hashed to be safe on any cache."""
+        digest = hashlib.sha256(str(key).encode()).hexdigest()[:32]
+        return f"polls:throttle:{self.prefix}:{digest}:{index}"
+
+    def add(self, key, now=None):
+        """Count one event for key."""
+        now = time.time() if now is None else now
+        bucket_key = self.bucket_key(key, math.floor(now / self.bucket_seconds))
+        timeout = math.ceil(self.window + self.bucket_seconds)
+        if not self.backend.add(bucket_key, 1, timeout=timeout):
+            try:
+                self.backend.incr(bucket_key)
+            except ValueError:
+                # expired between add() and incr()
+                self.backend.add(bucket_key, 1, timeout=timeout)
+
+    def count(self, key, now=None):
+        """Events for key within the last window seconds."""
+        now = time.time() if now is None else now
+        position = now / self.bucket_seconds
+        current = math.floor(position)
+        indexes = range(current - self.buckets, current + 1)
+        counts = self.backend.get_many([self.bucket_key(key, index) for index in indexes])
+        total = 0.0
+        for index in indexes:
+            value = counts.get(self.bucket_key(key, index), 0)
+            if index == current - self.buckets:
+                # only the newest part of the oldest bucket is in the window
+                value *= 1 - (position - current)
+            total += value
+        return total
+
+    def clear(self, key, now=None):
+        """Forget the events of key."""
+        now = time.time() if now is None else now
+        current = math.floor(now / self.bucket_seconds)
+        self.backend.delete_many([self.bucket_key(key, index)
+                                  for index in range(current - self.buckets, current + 1)])
+
+
+def throttle_ip(request):
+    """
+    Client IP whose failed logins are counted: REMOTE_ADDR, or behind
+    POLLS_TRUSTED_PROXIES reverse proxies the address the outermost of
+    them appended to X-Forwarded-For. The entries left of it come from
+    the client, which could pick a new one for every attempt.
+    """
+    proxies = getattr(settings, "POLLS_TRUSTED_PROXIES", 0)
+    if proxies:
+        hops = [hop.strip() for hop in request.META.get("HTTP_X_FORWARDED_FOR", "").split(",")]
+        if len(hops) >= proxies and hops[-proxies]:
+            return hops[-proxies]
+    return request.META.get("REMOTE_ADDR")
+
+
+class LoginThrottle:
+    """Failed logins per username and per IP, each with its own limit."""
+
+    def __init__(self, window=300, max_per_username=5, max_per_ip=50, alias="default"):
+        self.max_per_username = max_per_username
+        self.max_per_ip = max_per_ip
+        self.usernames = SlidingWindowCounter("username", window, alias=alias)
+        self.ips = SlidingWindowCounter("ip", window, alias=alias)
+
+    def is_throttled(self, username, ip):
+        """Whether a login for username from ip must be refused unchecked."""
+        if username is not None and self.usernames.count(username) >= self.max_per_username:
+            return True
+        return ip is not None and self.ips.count(ip) >= self.max_per_ip
+
+    def failed(self, username, ip):
+        """Count a failed login."""
+        if username is not None:
+            self.usernames.add(username)
+        if ip is not None:
+            self.ips.add(ip)
+
+    def succeeded(self, username):
+        """A successful login clears the failures of the username."""
+        self.usernames.clear(username)
+
+
+login_throttle = LoginThrottle(
+    window=getattr(settings, "POLLS_LOGIN_THROTTLE_WINDOW", 300),
+    max_per_username=getattr(settings, "POLLS_LOGIN_FAILURES_PER_USERNAME", 5),
+    max_per_ip=getattr(settings, "POLLS_LOGIN_FAILURES_PER_IP", 50),
+    alias=getattr(settings, "POLLS_LOGIN_THROTTLE_CACHE_ALIAS", "default"),
+)
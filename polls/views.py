@@ -1,68 +1,169 @@
 """This module contains views of polls app."""
 
+import json
 import logging
-from django.http import HttpResponseRedirect, Http404
+from django.conf import settings
+from django.http import (HttpResponse, HttpResponseRedirect, Http404, JsonResponse,
+                         StreamingHttpResponse)
 from django.shortcuts import render, get_object_or_404, redirect
+from django.template.loader import render_to_string
 from django.urls import reverse
 from django.views import generic
 from django.utils import timezone
+from django.utils.safestring import mark_safe
 from django.contrib import messages
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.signals import (user_logged_in,
                                          user_logged_out, user_login_failed)
 from django.dispatch import receiver
-
-from .models import Question, Choice, Vote
+from django.views.decorators.http import require_POST
+
+from . import conditional
+from .models import Question, Choice
+from .cache import catalog_cache, results_cache
+from .export import export
+from .ingest import ingest_votes
+from .instrumentation import render_prometheus
+from .log import log_event
+from .pagination import decode_cursor, keyset_page
+from .voting import cast_vote, pending_choice, pending_results
 
 logger = logging.getLogger(__name__)
 
 
-def get_client_ip(request):
-    """Get the visitor’s IP address using request headers."""
-    x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
-    if x_forwarded_for:
-        ip = x_forwarded_for.split(',')[0]
-    else:
-        ip = request.META.get('REMOTE_ADDR')
-    return ip
-
-
 @receiver(user_logged_in)
 def log_user_login(sender, request, user, **kwargs):
     """Log information when a user logs in."""
-    logger.info(f"User: {user.username} successfully login"
-                f" from IP address {get_client_ip(request)}")
+    log_event(logger, logging.INFO, "login", "User: %s successfully login",
+              user.username, request=request, user=user)
 
 
 @receiver(user_logged_out)
 def log_user_logout(sender, request, user, **kwargs):
     """Log information when a user logs out."""
-    logger.info(f"User: {user.username} logout"
-                f" from IP address {get_client_ip(request)}")
+    log_event(logger, logging.INFO, "logout", "User: %s logout",
+              getattr(user, "username", None), request=request, user=user)
 
 
 @receiver((user_login_failed))
 def log_user_login_failed(sender, credentials, request, **kwargs):
     """Log gives warning when a user attempts to log in but failed."""
-    logger.warning(f"Failed login attempt for user: {credentials.get('username')}"
-                   f" from IP address {get_client_ip(request)}")
+    log_event(logger, logging.WARNING, "login_failed", "Failed login attempt for user: %s",
+              credentials.get('username'), request=request)
+
+
+def published_questions(now, status=None):
+    """
+    Return the questions published at `now`, annotated with their status,
+    optionally only the "open" or "closed" ones.
+    """
+    questions = Question.objects.published(now).with_status(now)
+    if status is not None:
+        return getattr(questions, status)(now)
+    return questions
+
+
+def questions_with_vote(user_id, now):
+    """
+    Return the questions published at `now` with their status, each carrying
+    the id of the choice the user already voted for (voted_choice),
+    read in the same query.
+    """
+    return (Question.objects.published(now).with_status(now).with_vote(user_id)
+            .only("id", "question_text", "pub_date", "end_date"))
 
 
 class IndexView(generic.ListView):
-    """Take request to index.html which displays all questions."""
+    """
+    Take request to index.html which displays all questions.
+
+    The poll list is cached per catalog version (see CatalogCache) and
+    shared by everybody; anonymous visitors get the whole page from the
+    cache, signed-in users their own page around the cached list.
+    """
 
     template_name = "polls/index.html"
+    list_template_name = "polls/question_list.html"
     # Originally, the context name would be question_list.
 
     context_object_name = "latest_question_list"
+    statuses = ("open", "closed")
+
+    def get(self, request, *args, **kwargs):
+        """
+        Answer 304 if the client's copy is current (see polls/conditional.py),
+        else serve the page.
+        """
+        self.now = timezone.now()
+        self.status = request.GET.get("status")
+        if self.status not in self.statuses:
+            self.status = None
+        self.cursor = request.GET.get("cursor")
+        if self.cursor:
+            try:
+                decode_cursor(self.cursor)
+            except ValueError:
+                raise Http404("Invalid page cursor.")
+        # messages are per user, so a page showing some is never cached
+        has_messages = bool(messages.get_messages(request))
+        if has_messages or not conditional.enabled():
+            return self.get_page(request, has_messages, *args, **kwargs)
+        tag = conditional.page_etag(request, conditional.index_version(self.now),
+                                    self.status, self.cursor)
+        response = conditional.not_modified(request, tag)
+        if response is None:
+            response = conditional.revalidated(
+                self.get_page(request, has_messages, *args, **kwargs), tag)
+        return response
+
+    def get_page(self, request, has_messages, *args, **kwargs):
+        """Serve the page, or the poll list, from the page cache if possible."""
+        self.list_key = self.question_list = None
+        if not settings.POLLS_PAGE_CACHE:
+            return super().get(request, *args, **kwargs)
+        self.list_key = catalog_cache.key("index", "list", self.status, self.cursor)
+        self.question_list = catalog_cache.get(self.list_key)
+        if request.user.is_authenticated or has_messages:
+            return super().get(request, *args, **kwargs)
+        page_key = catalog_cache.key("index", "anonymous", self.status, self.cursor)
+        content = catalog_cache.get(page_key)
+        if content is not None:
+            return HttpResponse(content)
+        response = super().get(request, *args, **kwargs).render()
+        catalog_cache.set(page_key, response.content, self.now)
+        return response
 
     def get_queryset(self):
         """
-        Return all published questions
-        (not including those set to be published in the future).
+        Return one page of published questions
+        (not including those set to be published in the future),
+        optionally only the open or closed ones (?status=open|closed).
+        Each question is annotated with its status, evaluated in SQL
+        against a single clock read for the whole request.
+        No query is run when the poll list comes from the cache.
         """
+        self.next_cursor = None
+        if self.question_list is not None:
+            return Question.objects.none()
+        questions = published_questions(self.now, self.status)
+        page, self.next_cursor = keyset_page(questions, self.cursor,
+                                             settings.POLLS_INDEX_PAGE_SIZE)
+        return page
 
-        return Question.objects.filter(pub_date__lte=timezone.now()).order_by("-pub_date")
+    def get_context_data(self, **kwargs):
+        """Add the cursors, the status filter and the rendered poll list."""
+        context = super().get_context_data(**kwargs)
+        context["cursor"] = self.cursor
+        context["next_cursor"] = self.next_cursor
+        context["status"] = self.status
+        context["statuses"] = self.statuses
+        if self.question_list is None:
+            self.question_list = render_to_string(self.list_template_name, context)
+            if self.list_key is not None:
+                catalog_cache.set(self.list_key, self.question_list, self.now)
+        context["question_list"] = mark_safe(self.question_list)
+        return context
 
 
 class DetailView(generic.DetailView):
@@ -73,8 +174,12 @@ class DetailView(generic.DetailView):
     # context var is question
 
     def get_queryset(self):
-        """Excludes any questions that aren't published yet."""
-        return Question.objects.filter(pub_date__lte=timezone.now())
+        """
+        Excludes any questions that aren't published yet.
+        Each question carries the id of the choice the user
+        already voted for (voted_choice), read in the same query.
+        """
+        return questions_with_vote(self.request.user.pk, timezone.now())
 
     def get(self, request, *args, **kwargs):
         """
@@ -87,96 +192,191 @@ class DetailView(generic.DetailView):
             return redirect(reverse("login"))
         try:
             # This will use the default get_queryset filtering
-            question = self.get_object()
+            self.object = question = self.get_object()
         except Http404:
             messages.warning(request, "This poll is not available")
-            logger.warning(f"{request.user}"
-                           f" tried to access unavailable poll ID {kwargs.get('pk')}")
+            log_event(logger, logging.WARNING, "poll_unavailable",
+                      "%s tried to access unavailable poll ID %s",
+                      request.user.get_username(), kwargs.get('pk'),
+                      request=request, user=request.user, question=kwargs.get('pk'))
             return redirect(reverse("polls:index"))
             # if not Question.objects.filter(id=question.id):
+        # status was evaluated in SQL; unpublished polls were filtered out
         if not question.can_vote():
             messages.warning(request, "This poll is already closed.")
-            logger.warning(f"{request.user}"
-                           f" tried to access closed poll ID {question.pk}")
+            log_event(logger, logging.WARNING, "poll_closed",
+                      "%s tried to access closed poll ID %s",
+                      request.user.get_username(), question.pk,
+                      request=request, user=request.user, question=question.pk)
             return redirect(reverse("polls:index"))
-        if not question.is_published():
-            messages.warning(request, 'This poll is not available.')
-            logger.warning(f"{request.user}"
-                           f" tried to access future poll ID {question.pk}")
-            return redirect(reverse("polls:index"))
-        # render the page
-        return super(DetailView, self).get(request, *args, **kwargs)
+        # render the page without fetching the question again
+        context = self.get_context_data(object=question)
+        return self.render_to_response(context)
 
     def get_context_data(self, **kwargs):
-        """Adding additional context to template"""
+        """Adding the choices and the user's previous choice to template"""
 
         # Call the base implementation first to get the context
         context = super(DetailView, self).get_context_data(**kwargs)
-        question_id = self.get_object().id
-        my_user = self.request.user
-        check_previous_vote = my_user.vote_set.all().filter(choice__question__id=question_id)
-        if check_previous_vote:
-            first_vote = check_previous_vote[0]
-            picked_choice_id = first_vote.choice.pk
-            context['voted_choice'] = picked_choice_id
+        context['choices'] = self.object.choice_set.only("id", "choice_text", "question_id")
+        voted_choice = pending_choice(self.request.user.pk, self.object.pk,
+                                      self.object.voted_choice)
+        if voted_choice is not None:
+            context['voted_choice'] = voted_choice
         return context
 
 
-class ResultsView(generic.DetailView):
+def get_results_or_404(question_id):
+    """
+    Return the (cached) results of a question, buffered votes
+    included, or raise Http404.
+    """
+    try:
+        return pending_results(results_cache.get(question_id))
+    except Question.DoesNotExist:
+        raise Http404("No poll matches the given query.")
+
+
+class ResultsView(generic.TemplateView):
     """
     Take request to results.html
     which displays results for a particular question.
     """
 
-    model = Question
     template_name = "polls/results.html"
-    # context var is question
+    # context var is question (plain results data, see polls/results.py)
+
+    def get(self, request, *args, **kwargs):
+        """Answer 304 if the client's copy of the results is current."""
+        if messages.get_messages(request) or not conditional.enabled():
+            return super().get(request, *args, **kwargs)
+        tag = conditional.page_etag(request, conditional.results_version(kwargs["pk"]))
+        response = conditional.not_modified(request, tag)
+        if response is None:
+            response = conditional.revalidated(super().get(request, *args, **kwargs), tag)
+        return response
+
+    def get_context_data(self, **kwargs):
+        """Add the question and its tallies, read in a single query."""
+        context = super().get_context_data(**kwargs)
+        context["question"] = get_results_or_404(self.kwargs["pk"])
+        return context
+
+
+def results_json(request, pk):
+    """
+    Return the results of a question as JSON for dashboards,
+    or 304 if the dashboard's copy is current.
+    """
+    if not conditional.enabled():
+        return JsonResponse(get_results_or_404(pk))
+    tag = conditional.etag(conditional.results_version(pk))
+    response = conditional.not_modified(request, tag, conditional.REVALIDATE)
+    if response is None:
+        response = conditional.revalidated(JsonResponse(get_results_or_404(pk)), tag,
+                                           conditional.REVALIDATE)
+    return response
 
 
 @login_required
 def vote(request, question_id):
     """Handles voting for a particular choice in a particular question."""
 
-    question = get_object_or_404(Question, pk=question_id)
-
     try:
         # find the selected choice from form
         # in polls/templates/polls/detail.html
-        selected_choice = question.choice_set.get(pk=request.POST['choice'])
-        logger.info(f"User {request.user} voted for choice id:{request.POST['choice']}"
-                    f" in polls {question_id}")
-    except (KeyError, Choice.DoesNotExist):  # didn't pick any
+        # (filtering on question_id checks it belongs to this question)
+        selected_choice = (Choice.objects.only("id", "choice_text", "question_id")
+                           .get(pk=request.POST['choice'], question_id=question_id))
+        log_event(logger, logging.INFO, "vote", "User %s voted for choice id:%s in polls %s",
+                  request.user.get_username(), selected_choice.pk, question_id,
+                  request=request, user=request.user, question=question_id,
+                  choice=selected_choice.pk)
+    except (KeyError, ValueError, Choice.DoesNotExist):  # didn't pick any
+        question = get_object_or_404(Question, pk=question_id)
         # Redisplay the question voting form
         # and inform that they didn't select the choice
         context = {
                 "question": question,
+                "choices": question.choice_set.all(),
                 "error_message": "You didn't select a choice.",
             }
         # when they search for templates, they already in template dir
         # only let them vote by some conditions
-        logger.exception(f"Invalid question id:{question_id}"
-                         f" or choice not selected for user: {request.user}")
+        log_event(logger, logging.ERROR, "invalid_vote",
+                  "Invalid question id:%s or choice not selected for user: %s",
+                  question_id, request.user.get_username(), request=request,
+                  user=request.user, question=question_id, exc_info=True)
         return render(request, "polls/detail.html", context)
 
     # Reference to the current user
     my_user = request.user
 
-    # Get the user's vote
-    try:
-        vote = Vote.objects.get(user=my_user, choice__question=question)
-        # user alr has a vote for this question!Update his choice.
-        # check if select same choice
-        if vote.choice.pk != selected_choice.pk:
-            vote.choice = selected_choice
-            vote.save()
-            messages.success(request,
-                             f"You changed your vote to {selected_choice.choice_text}.")
-    except Vote.DoesNotExist:
-        # does not have a vote yet
-        # automatically saved
-        Vote.objects.create(user=my_user, choice=selected_choice)
+    # Record the user's vote; one vote per user per question
+    # is enforced by the database, so re-voting updates it
+    previous_choice_id = cast_vote(my_user.pk, question_id, selected_choice.pk)
+    if previous_choice_id is None:
         messages.success(request,
                          f"You voted for {selected_choice.choice_text}.")
+    elif previous_choice_id != selected_choice.pk:
+        messages.success(request,
+                         f"You changed your vote to {selected_choice.choice_text}.")
 
     # After voted redirects to the "results" page for the question
-    return HttpResponseRedirect(reverse("polls:results", args=(question.id,)))
+    return HttpResponseRedirect(reverse("polls:results", args=(question_id,)))
+
+
+@require_POST
+def bulk_vote(request):
+    """
+    Record many votes at once from a JSON body
+    {"votes": [{"user": id, "question": id, "choice": id}, ...]}
+    and return one result per vote. Needs the polls.add_vote permission.
+    """
+    if not request.user.is_authenticated:
+        return JsonResponse({"error": "Authentication required."}, status=401)
+    if not request.user.has_perm("polls.add_vote"):
+        return JsonResponse({"error": "Permission denied."}, status=403)
+    try:
+        votes = json.loads(request.body)["votes"]
+        if not isinstance(votes, list):
+            raise TypeError
+    except (ValueError, KeyError, TypeError):
+        return JsonResponse({"error": "Expected a JSON object with a list of votes."},
+                            status=400)
+    results = list(ingest_votes(votes))
+    log_event(logger, logging.INFO, "bulk_vote", "User %s submitted %s votes in bulk",
+              request.user.get_username(), len(results), request=request, user=request.user)
+    return JsonResponse({"results": results})
+
+
+@staff_member_required
+def export_results(request, kind, fmt):
+    """
+    Stream votes or per-choice tallies (kind) as CSV or JSONL (fmt), in id order.
+    Query parameters: question, after and until (id range, to resume),
+    gzip=1 to download a compressed file.
+    """
+    try:
+        filters = {name: int(request.GET[param]) if request.GET.get(param) else None
+                   for name, param in (("question_id", "question"), ("after", "after"),
+                                       ("until", "until"))}
+        compress = request.GET.get("gzip") == "1"
+        chunks = export(kind, fmt, compress=compress, **filters)
+    except ValueError as error:
+        raise Http404(str(error))
+    filename = f"{kind}.{fmt}" + (".gz" if compress else "")
+    content_type = ("application/gzip" if compress
+                    else "text/csv" if fmt == "csv" else "application/jsonl")
+    response = StreamingHttpResponse(chunks, content_type=content_type)
+    response["Content-Disposition"] = f'attachment; filename="{filename}"'
+    log_event(logger, logging.INFO, "export", "User %s exported %s",
+              request.user.get_username(), filename, request=request, user=request.user)
+    return response
+
+
+@staff_member_required
+def metrics(request):
+    """Expose request histograms and cache counters in Prometheus text format."""
+    return HttpResponse(render_prometheus(),
+                        content_type="text/plain; version=0.0.4")
@@ -0,0 +1,95 @@
+"""
+This module records a single vote: the Vote row, the choice tallies
+and the results cache invalidation, in one transaction.
+"""
+
+import logging
+import random
+import time
+
+from django.conf import settings
+from django.db import OperationalError, connection, transaction
+
+from .buffer import vote_buffer
+from .cache import results_cache
+from .models import Choice, Vote
+
+logger = logging.getLogger(__name__)
+
+
+def record_vote(user_id, question_id, choice_id):
+    """
+    Record that a user picked a choice in a question and
+    return the id of the choice they had picked before (or None).
+    The vote itself is written by a single upsert on (user, question).
+    """
+    with transaction.atomic():
+        previous_choice_id = Vote.locked_choice(user_id, question_id)
+        if previous_choice_id == choice_id:
+            return previous_choice_id
+        Vote.upsert(user_id, question_id, choice_id)
+        tallies = {choice_id: 1}
+        if previous_choice_id is not None:
+            tallies[previous_choice_id] = -1
+        Choice.add_votes_many(tallies)
+        # cached results of this question are stale once the vote commits
+        transaction.on_commit(lambda: results_cache.bump(question_id))
+    return previous_choice_id
+
+
+def cast_vote(user_id, question_id, choice_id):
+    """
+    Record a vote like record_vote(), or only buffer it when
+    POLLS_WRITE_BEHIND is on (see polls/buffer.py).
+    """
+    if not settings.POLLS_WRITE_BEHIND:
+        return retry_locked(record_vote, user_id, question_id, choice_id)
+    vote_buffer.start()
+    return vote_buffer.submit(user_id, question_id, choice_id)
+
+
+def retry_locked(write, *args):
+    """
+    Call write(*args), retrying up to POLLS_VOTE_RETRIES times with
+    jittered exponential backoff while SQLite reports the database locked
+    (its busy timeout ran out). Inside an outer transaction the error is
+    raised at once, since only the whole transaction can be retried.
+    """
+    retries = getattr(settings, "POLLS_VOTE_RETRIES", 0)
+    backoff = getattr(settings, "POLLS_VOTE_RETRY_BACKOFF_MS", 20) / 1000
+    for attempt in range(retries + 1):
+        try:
+            return write(*args)
+        except OperationalError as error:
+            if (attempt == retries or connection.in_atomic_block
+                    or "locked" not in str(error)):
+                raise
+            delay = backoff * 2 ** attempt * random.uniform(0.5, 1.5)
+            logger.debug("Database locked, retrying %s in %.3fs", write.__name__, delay)
+            time.sleep(delay)
+
+
+def pending_results(results):
+    """Return the results with the votes still buffered counted in."""
+    if not settings.POLLS_WRITE_BEHIND:
+        return results
+    return vote_buffer.overlay(results)
+
+
+def pending_choice(user_id, question_id, voted_choice):
+    """Return the user's buffered choice in a question, else voted_choice."""
+    if not settings.POLLS_WRITE_BEHIND:
+        return voted_choice
+    return vote_buffer.pending_choice(user_id, question_id) or voted_choice
+
+
+def pending_version(question_id):
+    """
+    Return a string that changes with the votes still buffered for a
+    question, to tell apart the results pending_results() shows between flushes.
+    """
+    if not settings.POLLS_WRITE_BEHIND:
+        return ""
+    tallies = vote_buffer.tallies(question_id)
+    return ",".join(f"{choice_id}{votes:+d}" for choice_id, votes in sorted(tallies.items())
+                    if votes)